@@ -3,10 +3,8 @@ from urllib.parse import parse_qs
 from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
 from django.contrib.auth.models import AnonymousUser
-from django.utils import timezone
 
-from asr.models import ApiToken
-from asr.utils.auth import HumanJWTAuthentication, hash_api_token
+from asr.utils.auth import HumanJWTAuthentication, hash_api_token, lookup_api_token, touch_api_token
 
 
 @database_sync_to_async
@@ -19,15 +17,10 @@ def _get_user_from_jwt(raw_token: str):
 
 @database_sync_to_async
 def _get_api_token(raw_token: str):
-    token_hash = hash_api_token(raw_token)
-    token_obj = ApiToken.objects.select_related("application", "application__owner").filter(
-        token_hash=token_hash,
-        revoked_at__isnull=True,
-    ).first()
+    token_obj = lookup_api_token(hash_api_token(raw_token))
     if not token_obj:
         return None
-    token_obj.last_used_at = timezone.now()
-    token_obj.save(update_fields=["last_used_at"])
+    touch_api_token(token_obj)
     return token_obj
 
 
@@ -1,8 +1,27 @@
+import asyncio
 import json
+import time
+from urllib.parse import parse_qs
+
+import msgpack
+import redis
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
 from .models import ASRJob
+from .tasks import _calc_cost, push_job
+from .utils import map_exception
+from .utils.backend import transcribe
+from .utils.events import job_group, owner_group, read_job_events
+from .utils.plan import resolve_plan_from_code, resolve_user_plan
+from .utils.search import index_transcript
+from .utils.usage import (
+    MonthlyLimitExceeded, monthly_usage_seconds, record_usage, refund_usage, reserve_usage, top_up_usage, usage_subject,
+)
+from .utils.vad import UtteranceSegmenter, pcm_to_wav
 
 @database_sync_to_async
 def _check_owner(job_id: int, user, jwt_payload, application):
@@ -19,10 +38,44 @@ def _check_owner(job_id: int, user, jwt_payload, application):
             return True
     return False
 
-class JobConsumer(AsyncWebsocketConsumer):
+
+class EventEncodingMixin:
+    """
+    Event framing negotiated via Sec-WebSocket-Protocol: `asr.msgpack.v1`
+    sends binary msgpack frames, `asr.json.v1` (or none) sends JSON text.
+    ?preview=0 drops the inline `text_preview` of large transcripts.
+    Compression is permessage-deflate, negotiated by the ASGI server.
+    """
+    MSGPACK_SUBPROTOCOL = "asr.msgpack.v1"
+    JSON_SUBPROTOCOL = "asr.json.v1"
+
+    def negotiate_encoding(self) -> str | None:
+        offered = self.scope.get("subprotocols") or []
+        params = parse_qs(self.scope.get("query_string", b"").decode("utf-8"))
+        self.include_preview = params.get("preview", ["1"])[0] != "0"
+        self.use_msgpack = self.MSGPACK_SUBPROTOCOL in offered
+        if self.use_msgpack:
+            return self.MSGPACK_SUBPROTOCOL
+        return self.JSON_SUBPROTOCOL if self.JSON_SUBPROTOCOL in offered else None
+
+    def decode_message(self, text_data=None, bytes_data=None):
+        if bytes_data is not None and self.use_msgpack:
+            return msgpack.unpackb(bytes_data, raw=False)
+        return json.loads(text_data or "")
+
+    async def send_event(self, data: dict):
+        if not self.include_preview and "text_preview" in data:
+            data = {k: v for k, v in data.items() if k != "text_preview"}
+        if self.use_msgpack:
+            await self.send(bytes_data=msgpack.packb(data, use_bin_type=True))
+        else:
+            await self.send(text_data=json.dumps(data))
+
+
+class JobConsumer(EventEncodingMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.job_id = self.scope["url_route"]["kwargs"]["job_id"]
-        self.group_name = f"job_{self.job_id}"
+        self.group_name = job_group(self.job_id)
 
         user = self.scope.get("user") or AnonymousUser()
         jwt_payload = self.scope.get("token") or None
@@ -32,11 +85,367 @@ class JobConsumer(AsyncWebsocketConsumer):
             await self.close(code=4403)
             return
 
+        params = parse_qs(self.scope.get("query_string", b"").decode("utf-8"))
+        try:
+            self.last_seq = int(params.get("last_seq", ["0"])[0])
+        except ValueError:
+            self.last_seq = 0
+
+        # join before replaying: live events queue up until connect() returns,
+        # and job_event() drops the ones the replay already covered
         await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        await self.accept(subprotocol=self.negotiate_encoding())
+        try:
+            missed = await read_job_events(self.job_id, self.last_seq)
+        except redis.RedisError:
+            missed = []
+        for data in missed:
+            await self._send_event(data)
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
+    async def _send_event(self, data):
+        seq = data.get("seq")
+        if seq is not None:
+            if seq <= self.last_seq:
+                return
+            self.last_seq = seq
+        await self.send_event(data)
+
+    async def job_event(self, event):
+        await self._send_event(event["data"])
+
+
+class JobStreamConsumer(EventEncodingMixin, AsyncWebsocketConsumer):
+    """
+    One socket for all of the caller's jobs. Ownership is implied by the
+    owner group, so subscribing to individual jobs needs no DB lookup.
+
+    Client messages:
+      {"action": "subscribe", "job_ids": ["<uuid>", ...]}
+      {"action": "unsubscribe", "job_ids": ["<uuid>", ...]}
+      {"action": "subscribe", "job_ids": ["*"]}   # back to all jobs (default)
+
+    Unsubscribing while following all jobs mutes those jobs; the reply lists
+    them as `excluded`. Subscribing to specific jobs narrows to just those.
+    """
+
+    async def connect(self):
+        user = self.scope.get("user") or AnonymousUser()
+        jwt_payload = self.scope.get("token") or {}
+        application = self.scope.get("application")
+        self.group_name = owner_group(
+            application_id=application.id if application else None,
+            user_id=user.id if getattr(user, "is_authenticated", False) else None,
+            session_key=jwt_payload.get("sid"),
+        )
+        if not self.group_name:
+            await self.close(code=4403)
+            return
+        # None means every job of the owner except the excluded ones
+        self.job_ids = None
+        self.excluded = set()
+
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept(subprotocol=self.negotiate_encoding())
+
+    async def disconnect(self, close_code):
+        if getattr(self, "group_name", None):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = self.decode_message(text_data, bytes_data)
+            action = message["action"]
+            job_ids = [str(j) for j in message.get("job_ids") or [message["job_id"]]]
+        except (ValueError, KeyError, TypeError, msgpack.UnpackException):
+            await self.send_event({"type": "error", "code": "INVALID_MESSAGE"})
+            return
+
+        if action == "subscribe":
+            if "*" in job_ids:
+                self.job_ids = None
+            else:
+                self.job_ids = (self.job_ids or set()) | set(job_ids)
+            self.excluded = set()
+        elif action == "unsubscribe":
+            if self.job_ids is not None:
+                self.job_ids -= set(job_ids)
+            else:
+                self.excluded |= set(job_ids)
+        else:
+            await self.send_event({"type": "error", "code": "UNKNOWN_ACTION"})
+            return
+        await self.send_event({
+            "type": "subscriptions",
+            "job_ids": sorted(self.job_ids) if self.job_ids is not None else ["*"],
+            "excluded": sorted(self.excluded),
+        })
+
     async def job_event(self, event):
-        await self.send(text_data=json.dumps(event["data"]))
+        if self.job_ids is not None and event["job_id"] not in self.job_ids:
+            return
+        if event["job_id"] in self.excluded:
+            return
+        await self.send_event({"job_id": event["job_id"], **event["data"]})
+
+
+@database_sync_to_async
+def _open_stream_job(user, application, session_key, sample_rate: int):
+    """
+    Create the job backing a streaming session and reserve a first chunk of its
+    quota; returns (job, plan, seconds reserved or None when unlimited).
+    """
+    if application:
+        user = application.owner
+        plan = resolve_user_plan(user)
+        subject = usage_subject(application_id=application.id)
+    elif user and user.is_authenticated:
+        plan = resolve_user_plan(user)
+        subject = usage_subject(user_id=user.pk)
+    else:
+        user = None
+        plan = resolve_plan_from_code("anon")
+        subject = usage_subject(session_key=session_key)
+
+    reserved = None
+    if plan and plan.monthly_seconds_limit:
+        remaining = float(plan.monthly_seconds_limit) - monthly_usage_seconds(subject)
+        if remaining <= 0:
+            return None, plan, 0.0
+        reserved = min(settings.ASR_STREAM_QUOTA_CHUNK_SEC, remaining)
+
+    try:
+        with transaction.atomic():
+            job = ASRJob.objects.create(
+                user=user,
+                application=application,
+                session_key=None if user else session_key,
+                status="processing",
+                audio_mime="audio/pcm",
+                audio_format="pcm_s16le",
+                audio_sample_rate=sample_rate,
+                audio_channels=1,
+                audio_duration_sec=0,
+            )
+            if reserved:
+                reserve_usage(job, reserved, plan.monthly_seconds_limit)
+    except MonthlyLimitExceeded:
+        return None, plan, 0.0
+    return job, plan, reserved
+
+
+@database_sync_to_async
+def _top_up_stream_quota(job, plan, needed: float) -> float:
+    """Reserve another chunk (at least `needed` seconds) of the session's quota; returns the seconds held, 0 if none left."""
+    for seconds in dict.fromkeys((max(settings.ASR_STREAM_QUOTA_CHUNK_SEC, needed), needed)):
+        try:
+            top_up_usage(job, seconds, plan.monthly_seconds_limit)
+        except MonthlyLimitExceeded:
+            continue
+        return seconds
+    return 0.0
+
+
+@database_sync_to_async
+def _bill_utterance(job, plan, duration_sec: float, text: str):
+    """Accumulate one utterance into the session's ledger row."""
+    words = len(text.split()) if text else 0
+    record_usage(
+        job,
+        plan,
+        audio_duration_sec=duration_sec,
+        words_count=words,
+        chars_count=len(text),
+        cost_units=_calc_cost(duration_sec, words),
+        accumulate=True,
+    )
+
+
+@database_sync_to_async
+def _complete_stream_job(job, text: str, duration_sec: float, processing_sec: float):
+    job.text = text
+    job.words_count = len(text.split()) if text else 0
+    job.chars_count = len(text)
+    job.audio_duration_sec = duration_sec
+    job.processing_time_sec = processing_sec
+    job.status = "done"
+    job.save(update_fields=["text", "words_count", "chars_count", "audio_duration_sec", "processing_time_sec", "status"])
+    refund_usage(job)
+    index_transcript(job)
+
+
+@database_sync_to_async
+def _fail_stream_job(job, exc: Exception, domain_error, processing_sec: float):
+    job.status = "error"
+    job.processing_time_sec = processing_sec
+    job.error_message = f"{type(exc).__name__}: {exc}"
+    job.error_code = domain_error.error_code
+    job.error_message_public = domain_error.public_message
+    job.save(update_fields=["status", "processing_time_sec", "error_message", "error_code", "error_message_public"])
+    refund_usage(job)
+    push_job(job, {"status": "error", "code": domain_error.error_code, "message": domain_error.public_message})
+
+
+class TranscribeConsumer(AsyncWebsocketConsumer):
+    """
+    Live transcription. The client streams mono 16-bit little-endian PCM as
+    binary frames (?sample_rate=16000&language=fa); a VAD cuts it into
+    utterances, each forwarded to the ASR core as soon as it closes.
+
+    Server messages:
+      {"type": "ready", "job_id": ...}
+      {"type": "partial", "segment": n, "text": ..., "start_sec": ..., "end_sec": ...}
+      {"type": "final", "job_id": ..., "text": ..., "audio_duration_sec": ...}
+      {"type": "error", "code": ..., "message": ...}
+    Send {"action": "stop"} to flush the last utterance and get the final text.
+    """
+
+    async def connect(self):
+        self.finished = True
+        params = parse_qs(self.scope.get("query_string", b"").decode("utf-8"))
+        try:
+            self.sample_rate = int(params.get("sample_rate", [settings.ASR_STREAM_DEFAULT_SAMPLE_RATE])[0])
+        except ValueError:
+            self.sample_rate = 0
+        if not 8000 <= self.sample_rate <= 48000:
+            await self.close(code=4400)
+            return
+        self.language = params.get("language", ["fa"])[0]
+
+        user = self.scope.get("user") or AnonymousUser()
+        application = self.scope.get("application")
+        sid = (self.scope.get("token") or {}).get("sid")
+        if not application and not getattr(user, "is_authenticated", False) and not sid:
+            await self.close(code=4403)
+            return
+
+        self.job, self.plan, self.reserved_sec = await _open_stream_job(user, application, sid, self.sample_rate)
+        await self.accept()
+        if not self.job:
+            await self._send_error("MONTHLY_LIMIT_EXCEEDED", "Monthly seconds limit reached for your plan.")
+            await self.close(code=4403)
+            return
+
+        self.finished = False
+        # set once the worker stops taking utterances (quota reached or failure); later frames are dropped
+        self.stopped = False
+        self.failed = False
+        self.notify = True
+        self.segmenter = UtteranceSegmenter(
+            self.sample_rate,
+            threshold=settings.ASR_STREAM_VAD_THRESHOLD,
+            silence_ms=settings.ASR_STREAM_SILENCE_MS,
+            max_utterance_sec=settings.ASR_STREAM_MAX_UTTERANCE_SEC,
+        )
+        self.segments = []
+        self.billed_sec = 0.0
+        self.started = time.monotonic()
+        self.utterances = asyncio.Queue()
+        # utterances are transcribed in order, off the receive path
+        self.worker = asyncio.create_task(self._transcribe_utterances())
+        await self.send(text_data=json.dumps({"type": "ready", "job_id": str(self.job.id)}))
+
+    async def disconnect(self, close_code):
+        await self._finish(notify=False)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if self.finished or self.stopped:
+            return
+        if bytes_data:
+            for utterance in self.segmenter.feed(bytes_data):
+                await self.utterances.put(utterance)
+            if self.segmenter.received_sec > settings.ASR_STREAM_MAX_SESSION_SEC:
+                await self._send_error("SESSION_TOO_LONG", "Streaming session exceeded its maximum length.")
+                await self._finish()
+                await self.close()
+            return
+        try:
+            action = json.loads(text_data or "").get("action")
+        except (ValueError, AttributeError):
+            action = None
+        if action == "stop":
+            await self._finish()
+            await self.close()
+        else:
+            await self._send_error("UNKNOWN_ACTION", "Expected binary audio or {\"action\": \"stop\"}.")
+
+    async def _send_error(self, code: str, message: str, **extra):
+        await self.send(text_data=json.dumps({"type": "error", "code": code, "message": message, **extra}))
+
+    async def _finish(self, notify: bool = True):
+        if self.finished:
+            return
+        self.finished = True
+        self.notify = notify
+        tail = self.segmenter.flush()
+        if tail:
+            await self.utterances.put(tail)
+        await self.utterances.put(None)
+        await self.worker
+        if self.failed:
+            return
+
+        text = " ".join(t for t in self.segments if t)
+        await _complete_stream_job(self.job, text, self.billed_sec, time.monotonic() - self.started)
+        if notify:
+            await self.send(text_data=json.dumps({
+                "type": "final",
+                "job_id": str(self.job.id),
+                "text": text,
+                "audio_duration_sec": self.billed_sec,
+            }))
+
+    async def _transcribe_utterances(self):
+        """Run the worker; if it fails, mark the job failed rather than leave it processing."""
+        try:
+            await self._transcribe_loop()
+        except Exception as e:
+            self.stopped = self.failed = True
+            domain_error = map_exception(e)
+            await _fail_stream_job(self.job, e, domain_error, time.monotonic() - self.started)
+            if self.notify:
+                await self._send_error(domain_error.error_code, domain_error.public_message)
+                await self.close(code=4500)
+
+    async def _transcribe_loop(self):
+        index = 0
+        while True:
+            utterance = await self.utterances.get()
+            if utterance is None:
+                return
+            needed = self.billed_sec + utterance.duration_sec - (self.reserved_sec or 0)
+            if self.reserved_sec is not None and needed > 0:
+                held = await _top_up_stream_quota(self.job, self.plan, needed)
+                if not held:
+                    self.stopped = True
+                    if self.notify:
+                        await self._send_error("MONTHLY_LIMIT_EXCEEDED", "Monthly seconds limit reached for your plan.")
+                        await self.close(code=4403)
+                    return
+                self.reserved_sec += held
+            try:
+                payload = await sync_to_async(transcribe, thread_sensitive=False)(
+                    pcm_to_wav(utterance.pcm, self.sample_rate), "audio/wav", self.language, utterance.duration_sec,
+                )
+            except Exception as e:
+                domain_error = map_exception(e)
+                if self.notify:
+                    await self._send_error(domain_error.error_code, domain_error.public_message, segment=index)
+                index += 1
+                continue
+
+            text = (payload.get("asr") or payload.get("text") or "").strip()
+            await _bill_utterance(self.job, self.plan, utterance.duration_sec, text)
+            self.billed_sec += utterance.duration_sec
+            self.segments.append(text)
+            if self.notify:
+                await self.send(text_data=json.dumps({
+                    "type": "partial",
+                    "segment": index,
+                    "text": text,
+                    "start_sec": round(utterance.start_sec, 2),
+                    "end_sec": round(utterance.end_sec, 2),
+                }))
+            index += 1
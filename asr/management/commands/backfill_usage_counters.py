@@ -0,0 +1,79 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from asr.models import UsageCounter, UsageLedger
+from asr.utils.usage import COUNTER_FIELDS, usage_period, usage_subject
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild UsageCounter rows from UsageLedger, reading the ledger in primary-key chunks. "
+        "Counters are overwritten with the recomputed totals, so run it while no jobs are being billed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Only rebuild periods starting at this month (YYYY-MM).")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--dry-run", action="store_true", help="Report differences without writing them.")
+
+    def handle(self, *args, since=None, chunk_size=5000, dry_run=False, **options):
+        ledger = UsageLedger.objects.order_by("pk")
+        since_period = None
+        if since:
+            year, month = (int(part) for part in since.split("-"))
+            since_period = usage_period().replace(year=year, month=month)
+            # periods are UTC months, so the slice must start at the UTC month boundary too
+            ledger = ledger.filter(created_at__gte=datetime(year, month, 1, tzinfo=timezone.utc))
+
+        totals = defaultdict(lambda: dict.fromkeys((*COUNTER_FIELDS, "jobs_count"), 0))
+        last_pk = None
+        rows = 0
+        while True:
+            chunk = ledger if last_pk is None else ledger.filter(pk__gt=last_pk)
+            chunk = list(chunk.values("pk", "user_id", "application_id", "session_key", "created_at", *COUNTER_FIELDS)[:chunk_size])
+            if not chunk:
+                break
+            for row in chunk:
+                subject = usage_subject(row["user_id"], row["application_id"], row["session_key"])
+                if not subject:
+                    continue
+                counter = totals[(subject, usage_period(row["created_at"]))]
+                for field in COUNTER_FIELDS:
+                    counter[field] += row[field] or 0
+                counter["jobs_count"] += 1
+            last_pk = chunk[-1]["pk"]
+            rows += len(chunk)
+
+        existing = UsageCounter.objects.all()
+        if since_period:
+            existing = existing.filter(period__gte=since_period)
+        counters = {(c.subject, c.period): c for c in existing}
+        stale = [c.pk for key, c in counters.items() if key not in totals]
+
+        to_create, to_update = [], []
+        for (subject, period), values in totals.items():
+            counter = counters.get((subject, period))
+            if counter is None:
+                to_create.append(UsageCounter(subject=subject, period=period, **values))
+                continue
+            if all(abs(getattr(counter, f) - v) < 1e-6 for f, v in values.items()):
+                continue
+            if dry_run:
+                self.stdout.write(f"{subject} {period:%Y-%m}: jobs {counter.jobs_count} -> {values['jobs_count']}, "
+                                  f"seconds {counter.audio_duration_sec:.1f} -> {values['audio_duration_sec']:.1f}")
+            for field, value in values.items():
+                setattr(counter, field, value)
+            to_update.append(counter)
+
+        if not dry_run:
+            with transaction.atomic():
+                UsageCounter.objects.bulk_create(to_create, batch_size=chunk_size)
+                UsageCounter.objects.bulk_update(to_update, [*COUNTER_FIELDS, "jobs_count"], batch_size=chunk_size)
+                UsageCounter.objects.filter(pk__in=stale).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {rows} ledger rows: {len(to_create)} counters missing, {len(to_update)} differing, "
+            f"{len(stale)} stale{' (dry run)' if dry_run else ''}."
+        ))
@@ -0,0 +1,50 @@
+import time
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+
+from asr.utils.events import append_job_event, job_group, job_owner_group
+from asr.utils.publisher import get_publisher
+
+
+class _Job:
+    def __init__(self):
+        self.id = uuid.uuid4()
+        self.application_id = None
+        self.user_id = None
+        self.session_key = "bench"
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark job event publishing: per-event async_to_sync vs the batched publisher."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=2000)
+        parser.add_argument("--jobs", type=int, default=50)
+
+    def _legacy(self, jobs, n):
+        channel_layer = get_channel_layer()
+        for i in range(n):
+            job = jobs[i % len(jobs)]
+            data = {"status": "processing", "i": i}
+            seq = append_job_event(job.id, data)
+            data = {**data, "seq": seq}
+            for group in (job_group(job.id), job_owner_group(job)):
+                async_to_sync(channel_layer.group_send)(group, {"type": "job_event", "job_id": str(job.id), "data": data})
+
+    def _batched(self, jobs, n):
+        publisher = get_publisher()
+        for i in range(n):
+            publisher.publish(jobs[i % len(jobs)], {"status": "processing", "i": i})
+        publisher.flush(timeout=None)
+
+    def handle(self, *args, **options):
+        n = options["events"]
+        jobs = [_Job() for _ in range(options["jobs"])]
+        for name, run in (("async_to_sync per event", self._legacy), ("batched publisher", self._batched)):
+            t0 = time.perf_counter()
+            run(jobs, n)
+            elapsed = time.perf_counter() - t0
+            self.stdout.write(f"{name:<24} {n} events in {elapsed:.2f}s -> {n / elapsed:,.0f} events/s")
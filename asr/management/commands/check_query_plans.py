@@ -0,0 +1,220 @@
+import random
+import secrets
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from asr.models import ApiToken, Application, ASRJob, UsageLedger, UsageRollup
+from asr.utils.auth import hash_api_token
+from asr.utils.plan import get_or_create_plan
+from asr.utils.usage import rebuild_usage_rollups, rollup_bucket
+from asr.views.api import (
+    DashboardOverviewView,
+    HistoryView,
+    ResultView,
+    StatusView,
+    UsageByAppView,
+    UsageTimeseriesView,
+    UsageView,
+)
+from asr.views.app_api import AppResultView, AppStatusView
+from asr.views.apps import ApplicationListCreateView, ApplicationTokenListCreateView
+from asr.views.export import AppJobExportView, AppUsageExportView, JobExportView, UsageExportView
+
+# tables that grow with traffic; a full scan of any of them fails the check
+LARGE_TABLES = {model._meta.db_table for model in (ASRJob, UsageLedger, UsageRollup, ApiToken, Application, User)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a synthetic dataset, call the read API views against it and EXPLAIN every query "
+        "they run, failing if any query scans a large table. All rows are rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--jobs-per-user", type=int, default=50)
+        parser.add_argument("--sessions", type=int, default=100)
+        parser.add_argument("--days", type=int, default=60, help="Spread job creation times over this many days.")
+        parser.add_argument("--verbose-plans", action="store_true", help="Print the plan of every query.")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            raise CommandError(f"Query plans can only be checked on SQLite and PostgreSQL, not {connection.vendor}.")
+        self.verbose = options["verbose_plans"]
+        # no throttling, no cached reports: every view must reach the database
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            with transaction.atomic():
+                data = self._populate(options)
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+                failures = self._check_views(data)
+                transaction.set_rollback(True)
+        if failures:
+            for label, sql, plan in failures:
+                self.stderr.write(f"\n{label}\n  {sql}\n  " + "\n  ".join(plan))
+            raise CommandError(f"{len(failures)} queries scan a large table.")
+        self.stdout.write(self.style.SUCCESS("Every query uses an index."))
+
+    def _populate(self, options) -> dict:
+        rng = random.Random(0)
+        now = timezone.now()
+        plan = get_or_create_plan("free")
+        tag = uuid.uuid4().hex[:8]
+        User.objects.bulk_create(
+            [User(username=f"plancheck-{tag}-{i}") for i in range(options["users"])], batch_size=1000
+        )
+        users = list(User.objects.filter(username__startswith=f"plancheck-{tag}-"))
+        Application.objects.bulk_create(
+            [Application(owner=user, name=f"app {i}") for user in users for i in range(2)], batch_size=1000
+        )
+        apps_by_owner = {}
+        for app in Application.objects.filter(owner__in=users):
+            apps_by_owner.setdefault(app.owner_id, []).append(app)
+
+        jobs = []
+        for user in users:
+            for _ in range(options["jobs_per_user"]):
+                app = rng.choice(apps_by_owner[user.pk]) if rng.random() < 0.3 else None
+                jobs.append(ASRJob(user=user, application=app, status="done", words_count=1))
+        # the checked user always has two own jobs and one application job, whatever the sizes
+        checked = users[0]
+        recent = [ASRJob(user=checked, status="done", words_count=1) for _ in range(2)]
+        jobs += recent
+        jobs.append(ASRJob(user=checked, application=apps_by_owner[checked.pk][0], status="done", words_count=1))
+        sessions = [secrets.token_hex(16) for _ in range(max(options["sessions"], 1))]
+        for sid in sessions:
+            for _ in range(max(options["jobs_per_user"] // 5, 1)):
+                jobs.append(ASRJob(session_key=sid, status="done", words_count=1))
+        ASRJob.objects.bulk_create(jobs, batch_size=1000)
+        # created_at is auto_now_add, so spread it afterwards
+        for job in jobs:
+            job.created_at = now - timedelta(seconds=rng.randrange(options["days"] * 86400))
+        # and its two extra own jobs are recent, so its history has a second page whatever the retention
+        for minutes, job in enumerate(recent, start=1):
+            job.created_at = now - timedelta(minutes=minutes)
+        ASRJob.objects.bulk_update(jobs, ["created_at"], batch_size=1000)
+        UsageLedger.objects.bulk_create([
+            UsageLedger(job=job, user_id=job.user_id, application_id=job.application_id,
+                        session_key=job.session_key, plan_at_time=plan, audio_duration_sec=10, words_count=1)
+            for job in jobs
+        ], batch_size=1000)
+        ledger = list(UsageLedger.objects.filter(job__in=[job.pk for job in jobs]).select_related("job").only("pk", "job__created_at"))
+        for row in ledger:
+            row.created_at = row.job.created_at
+        UsageLedger.objects.bulk_update(ledger, ["created_at"], batch_size=1000)
+        end = rollup_bucket(now, UsageRollup.DAY) + timedelta(days=1)
+        start = end - timedelta(days=options["days"] + 1)
+        for granularity in (UsageRollup.HOUR, UsageRollup.DAY):
+            rebuild_usage_rollups(granularity, start, end)
+
+        ApiToken.objects.bulk_create([
+            ApiToken(application=app, token_hash=hash_api_token(secrets.token_urlsafe(32)), token_prefix="synthetic")
+            for apps in apps_by_owner.values() for app in apps
+        ], batch_size=1000)
+        user = users[0]
+        app = apps_by_owner[user.pk][0]
+        raw_token = secrets.token_urlsafe(32)
+        ApiToken.objects.create(application=app, token_hash=hash_api_token(raw_token), token_prefix=raw_token[:10])
+        return {
+            "user": user,
+            "app": app,
+            "raw_token": raw_token,
+            "sid": sessions[0],
+            "user_job": next(job for job in jobs if job.user_id == user.pk and not job.application_id),
+            "app_job": next(job for job in jobs if job.application_id == app.pk),
+        }
+
+    def _requests(self, data) -> list:
+        """(label, view, request, kwargs) for every read endpoint, as a user, an anonymous session and an application."""
+        factory = APIRequestFactory()
+        user, app = data["user"], data["app"]
+
+        def human(path, params=None, sid=None):
+            request = factory.get(path, params or {}, HTTP_AUTHORIZATION="Bearer check.query.plans")
+            if sid:
+                force_authenticate(request, token={"sid": sid, "token_type": "access"})
+            else:
+                force_authenticate(request, user=user, token={"user_id": user.pk, "token_type": "access"})
+            return request
+
+        def application(path):
+            return factory.get(path, HTTP_AUTHORIZATION=f"Api-Key {data['raw_token']}")
+
+        user_job, app_job = data["user_job"].pk, data["app_job"].pk
+        # small pages so the user's retention window still has a second one
+        cursor = HistoryView.as_view(throttle_classes=[])(human("/api/history/", {"page_size": 1})).data["next_cursor"]
+        requests = [
+            ("history", HistoryView, human("/api/history/"), {}),
+            ("history page 3", HistoryView, human("/api/history/", {"page": 3}), {}),
+        ]
+        if cursor is None:
+            self.stdout.write("history cursor             skipped: the user has no second history page")
+        else:
+            requests.append(
+                ("history cursor", HistoryView, human("/api/history/", {"cursor": cursor, "page_size": 1}), {})
+            )
+        return requests + [
+            ("history (session)", HistoryView, human("/api/history/", sid=data["sid"]), {}),
+            ("status", StatusView, human(f"/api/status/{user_job}/"), {"job_id": user_job}),
+            ("result", ResultView, human(f"/api/result/{user_job}/"), {"job_id": user_job}),
+            ("usage", UsageView, human("/api/usage/"), {}),
+            ("usage (session)", UsageView, human("/api/usage/", sid=data["sid"]), {}),
+            ("dashboard overview", DashboardOverviewView, human("/api/dashboard/overview/"), {}),
+            ("usage by app", UsageByAppView, human("/api/usage/by-app/"), {}),
+            ("timeseries hourly", UsageTimeseriesView, human("/api/usage/timeseries/", {"granularity": "hour"}), {}),
+            ("timeseries daily (app)", UsageTimeseriesView,
+             human("/api/usage/timeseries/", {"granularity": "day", "app_id": str(app.pk)}), {}),
+            ("applications", ApplicationListCreateView, human("/api/apps/"), {}),
+            ("application tokens", ApplicationTokenListCreateView, human(f"/api/apps/{app.pk}/tokens/"), {"app_id": app.pk}),
+            ("app job status", AppStatusView, application(f"/api/v1/asr/jobs/{app_job}/status/"), {"job_id": app_job}),
+            ("app job result", AppResultView, application(f"/api/v1/asr/jobs/{app_job}/"), {"job_id": app_job}),
+            ("export jobs", JobExportView, human("/api/export/jobs/", {"include_text": "true"}), {}),
+            ("export usage (app)", UsageExportView, human("/api/export/usage/", {"app_id": str(app.pk)}), {}),
+            ("app export jobs", AppJobExportView, application("/api/v1/asr/export/jobs/"), {}),
+            ("app export usage", AppUsageExportView, application("/api/v1/asr/export/usage/"), {}),
+        ]
+
+    def _check_views(self, data) -> list:
+        failures = []
+        for label, view_class, request, kwargs in self._requests(data):
+            view = view_class.as_view(throttle_classes=[])
+            with CaptureQueriesContext(connection) as queries:
+                response = view(request, **kwargs)
+                if response.streaming:
+                    # exports query as they are read
+                    for _ in response.streaming_content:
+                        pass
+            if response.status_code >= 400:
+                raise CommandError(f"{label}: view returned {response.status_code}: {getattr(response, 'data', '')}")
+            selects = [q["sql"] for q in queries.captured_queries if q["sql"].lstrip().upper().startswith("SELECT")]
+            for sql in selects:
+                plan, scans = self._explain(sql)
+                if self.verbose:
+                    self.stdout.write(f"{label}: {sql}\n  " + "\n  ".join(plan))
+                if scans:
+                    failures.append((label, sql, plan))
+            self.stdout.write(f"{label:<26} {len(selects)} queries")
+        return failures
+
+    def _explain(self, sql: str) -> tuple[list[str], bool]:
+        """The query's plan as text lines, and whether it reads a large table without an index."""
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("EXPLAIN " + sql)
+                plan = [row[0] for row in cursor.fetchall()]
+                scans = any("Seq Scan on " in line and line.split("Seq Scan on ")[1].split()[0] in LARGE_TABLES
+                            for line in plan)
+            else:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+                # "SCAN <table>" without "USING ... INDEX" is a full table scan
+                scans = any(line.startswith("SCAN ") and "INDEX" not in line and line.split()[1] in LARGE_TABLES
+                            for line in plan)
+        return plan, scans
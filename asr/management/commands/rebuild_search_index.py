@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from asr.models import ASRJob
+from asr.utils.search import index_transcript, search_available
+
+
+class Command(BaseCommand):
+    help = (
+        "Index the transcripts of finished user and session jobs for /api/search/, reading jobs in "
+        "primary-key chunks. Existing entries are refreshed, so it can be re-run at any time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, chunk_size=500, **options):
+        if not search_available():
+            raise CommandError("Transcript search needs PostgreSQL or SQLite.")
+        jobs = ASRJob.objects.filter(status="done", application__isnull=True).order_by("pk")
+        last_pk = None
+        indexed = 0
+        while True:
+            chunk = jobs if last_pk is None else jobs.filter(pk__gt=last_pk)
+            chunk = list(chunk.select_related("transcript")[:chunk_size])
+            if not chunk:
+                break
+            for job in chunk:
+                index_transcript(job)
+            indexed += len(chunk)
+            last_pk = chunk[-1].pk
+            self.stdout.write(f"{indexed} jobs indexed")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} jobs."))
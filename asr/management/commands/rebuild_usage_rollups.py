@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from asr.models import UsageRollup
+from asr.utils.usage import rebuild_usage_rollups, rollup_bucket
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute hourly and daily UsageRollup rows from UsageLedger, one day at a time. "
+        "Each day's buckets are replaced in a transaction, so the command can be re-run safely."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=400, help="How many days back to rebuild (default 400).")
+        parser.add_argument(
+            "--include-current", action="store_true",
+            help="Also rebuild the open hour and day; only while no jobs are being billed.",
+        )
+
+    def handle(self, *args, days=400, include_current=False, **options):
+        now = timezone.now()
+        end = rollup_bucket(now, UsageRollup.HOUR)
+        if include_current:
+            end += timedelta(hours=1)
+        day = rollup_bucket(now, UsageRollup.DAY) - timedelta(days=days)
+
+        hours = days_written = 0
+        while day < end:
+            next_day = day + timedelta(days=1)
+            hours += rebuild_usage_rollups(UsageRollup.HOUR, day, min(next_day, end))
+            if next_day <= end or include_current:
+                days_written += rebuild_usage_rollups(UsageRollup.DAY, day, next_day)
+            day = next_day
+        self.stdout.write(self.style.SUCCESS(f"Wrote {hours} hourly and {days_written} daily rollup rows."))
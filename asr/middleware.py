@@ -0,0 +1,44 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from asr.utils.ratelimit import release_request_slot
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Expose the budget left by PlanRateThrottle and free job slots no job claimed.
+    Sync and async capable, so under ASGI async views (long-poll, SSE) are not
+    pushed onto a thread per request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self._finish(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # release_request_slot talks to Redis with the sync client; it only does so if a slot was reserved
+        if getattr(request, "job_slot", None):
+            await sync_to_async(self._finish)(request, response)
+        else:
+            self._finish(request, response)
+        return response
+
+    def _finish(self, request, response) -> None:
+        rate_limit = getattr(request, "rate_limit", None)
+        if rate_limit:
+            response["X-RateLimit-Limit"] = str(rate_limit["limit"])
+            response["X-RateLimit-Remaining"] = str(rate_limit["remaining"])
+            response["X-RateLimit-Reset"] = str(rate_limit["reset"])
+        release_request_slot(request)
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-19 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asr', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=64)),
+                ('period', models.DateField(help_text='First day of the month.')),
+                ('audio_duration_sec', models.FloatField(default=0)),
+                ('words_count', models.BigIntegerField(default=0)),
+                ('chars_count', models.BigIntegerField(default=0)),
+                ('cost_units', models.FloatField(default=0)),
+                ('jobs_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='usagecounter',
+            constraint=models.UniqueConstraint(fields=('subject', 'period'), name='usage_counter_subject_period'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-19 10:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asr', '0002_usagecounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usagecounter',
+            name='reserved_seconds',
+            field=models.FloatField(default=0),
+        ),
+        migrations.CreateModel(
+            name='UsageReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=64)),
+                ('period', models.DateField()),
+                ('seconds', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='usage_reservation', to='asr.asrjob')),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-19 10:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asr', '0003_usagereservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=64)),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=8)),
+                ('bucket_start', models.DateTimeField()),
+                ('audio_duration_sec', models.FloatField(default=0)),
+                ('words_count', models.BigIntegerField(default=0)),
+                ('chars_count', models.BigIntegerField(default=0)),
+                ('cost_units', models.FloatField(default=0)),
+                ('jobs_count', models.IntegerField(default=0)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='usage_rollups', to='asr.plan')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='usagerollup',
+            constraint=models.UniqueConstraint(fields=('subject', 'granularity', 'bucket_start', 'plan'), name='usage_rollup_bucket'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-19 10:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asr', '0004_usagerollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asrjob',
+            index=models.Index(condition=models.Q(('application__isnull', True)), fields=['user', '-created_at', '-id'], name='asrjob_user_history'),
+        ),
+        migrations.AddIndex(
+            model_name='asrjob',
+            index=models.Index(condition=models.Q(('application__isnull', True)), fields=['session_key', '-created_at', '-id'], name='asrjob_session_history'),
+        ),
+    ]
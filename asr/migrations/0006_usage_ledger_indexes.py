@@ -0,0 +1,37 @@
+# Generated by Django 5.0.14 on 2026-10-19 10:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asr', '0005_asrjob_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usageledger',
+            name='application',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='usage_ledger', to='asr.application'),
+        ),
+        migrations.AddIndex(
+            model_name='usageledger',
+            index=models.Index(fields=['application', 'created_at'], name='usage_ledger_app_created'),
+        ),
+        migrations.AddIndex(
+            model_name='usageledger',
+            index=models.Index(condition=models.Q(('application__isnull', True)), fields=['user', 'created_at'], name='usage_ledger_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='usageledger',
+            index=models.Index(condition=models.Q(('application__isnull', True), ('session_key__isnull', False)), fields=['session_key', 'created_at'], name='usage_ledger_sid_created'),
+        ),
+        migrations.AddIndex(
+            model_name='usageledger',
+            index=models.Index(fields=['created_at'], name='usage_ledger_created'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asr', '0006_usage_ledger_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usageledger',
+            name='job',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='usage', to='asr.asrjob'),
+        ),
+    ]
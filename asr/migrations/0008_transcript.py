@@ -0,0 +1,22 @@
+# Generated by Django 5.0.14 on 2026-10-19 11:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asr', '0007_usage_ledger_keep_on_job_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transcript',
+            fields=[
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='transcript', serialize=False, to='asr.asrjob')),
+                ('codec', models.CharField(choices=[('plain', 'Plain UTF-8'), ('zlib', 'zlib')], default='plain', max_length=8)),
+                ('data', models.BinaryField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,65 @@
+import zlib
+
+from django.db import migrations, transaction
+
+CHUNK_SIZE = 1000
+
+
+def _pack(text):
+    raw = text.encode("utf-8")
+    packed = zlib.compress(raw, 6)
+    return ("zlib", packed) if len(packed) < len(raw) else ("plain", raw)
+
+
+def move_transcripts(apps, schema_editor):
+    ASRJob = apps.get_model("asr", "ASRJob")
+    Transcript = apps.get_model("asr", "Transcript")
+    jobs = ASRJob.objects.exclude(text__isnull=True).exclude(text="").order_by("pk")
+    last_pk = None
+    while True:
+        chunk = jobs if last_pk is None else jobs.filter(pk__gt=last_pk)
+        rows = list(chunk.values_list("pk", "text")[:CHUNK_SIZE])
+        if not rows:
+            break
+        with transaction.atomic():
+            # skip jobs copied by an earlier, interrupted run
+            done = set(Transcript.objects.filter(job_id__in=[pk for pk, _ in rows]).values_list("job_id", flat=True))
+            transcripts = []
+            for pk, text in rows:
+                if pk not in done:
+                    codec, data = _pack(text)
+                    transcripts.append(Transcript(job_id=pk, codec=codec, data=data))
+            Transcript.objects.bulk_create(transcripts)
+        last_pk = rows[-1][0]
+
+
+def restore_text(apps, schema_editor):
+    ASRJob = apps.get_model("asr", "ASRJob")
+    Transcript = apps.get_model("asr", "Transcript")
+    last_pk = None
+    while True:
+        chunk = Transcript.objects.order_by("pk")
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        rows = list(chunk[:CHUNK_SIZE])
+        if not rows:
+            break
+        with transaction.atomic():
+            for row in rows:
+                data = bytes(row.data)
+                text = (zlib.decompress(data) if row.codec == "zlib" else data).decode("utf-8")
+                ASRJob.objects.filter(pk=row.job_id).update(text=text)
+        last_pk = rows[-1].pk
+
+
+class Migration(migrations.Migration):
+    # each chunk commits on its own, so a large table is not copied in one transaction
+    atomic = False
+
+    dependencies = [
+        ('asr', '0008_transcript'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_transcripts, restore_text),
+    ]
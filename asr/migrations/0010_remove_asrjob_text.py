@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asr', '0009_move_transcripts'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='asrjob',
+            name='text',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-19 11:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asr', '0010_remove_asrjob_text'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(blank=True, max_length=40, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_entry', to='asr.asrjob')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at'], name='transcript_search_user'), models.Index(fields=['session_key', '-created_at'], name='transcript_search_session')],
+            },
+        ),
+    ]
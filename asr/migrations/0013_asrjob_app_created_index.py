@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-19 11:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asr', '0012_transcript_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='asrjob',
+            name='application',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='asr_jobs', to='asr.application'),
+        ),
+        migrations.AddIndex(
+            model_name='asrjob',
+            index=models.Index(fields=['application', 'created_at', 'id'], name='asrjob_app_created'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 import uuid
+import zlib
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 
@@ -40,13 +41,14 @@ class ASRJob(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     STATUS_CHOICES = [("queued","Queued"),("processing","Processing"),("done","Done"),("error","Error")]
     user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name="asr_jobs")
-    application = models.ForeignKey("Application", null=True, blank=True, on_delete=models.SET_NULL, related_name="asr_jobs")
+    # indexed by asrjob_app_created below
+    application = models.ForeignKey("Application", null=True, blank=True, on_delete=models.SET_NULL,
+                                    related_name="asr_jobs", db_index=False)
     session_key = models.CharField(max_length=40, null=True, blank=True)
     status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="queued")
     error_message = models.TextField(null=True, blank=True)
     error_code = models.CharField(max_length=64, null=True, blank=True)
     error_message_public = models.TextField(null=True, blank=True)
-    text = models.TextField(null=True, blank=True)
 
     audio_duration_sec = models.FloatField(null=True, blank=True)
     audio_sample_rate = models.IntegerField(null=True, blank=True)
@@ -62,11 +64,116 @@ class ASRJob(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @property
+    def text(self) -> str | None:
+        """The transcript. Stored compressed in Transcript and only loaded when read."""
+        if not hasattr(self, "_text"):
+            try:
+                self._text = self.transcript.get_text()
+            except Transcript.DoesNotExist:
+                self._text = None
+        return self._text
+
+    @text.setter
+    def text(self, value: str | None) -> None:
+        self._text = value
+        self._text_changed = True
+
+    def save(self, *args, **kwargs):
+        # "text" is not a column: it may still be named in update_fields and is written to Transcript
+        update_fields = kwargs.get("update_fields")
+        save_text = getattr(self, "_text_changed", False)
+        if update_fields is not None:
+            save_text = save_text and "text" in update_fields
+            kwargs["update_fields"] = [field for field in update_fields if field != "text"]
+        if not save_text:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            if kwargs.get("update_fields") != []:
+                super().save(*args, **kwargs)
+            if self._text:
+                transcript = Transcript(job=self)
+                transcript.set_text(self._text)
+                Transcript.objects.update_or_create(job=self, defaults={"codec": transcript.codec, "data": transcript.data})
+            else:
+                Transcript.objects.filter(job=self).delete()
+        self._text_changed = False
+
+    class Meta:
+        indexes = [
+            # job history is keyset-paged on (created_at, id) per owner, newest first
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                condition=models.Q(application__isnull=True),
+                name="asrjob_user_history",
+            ),
+            models.Index(
+                fields=["session_key", "-created_at", "-id"],
+                condition=models.Q(application__isnull=True),
+                name="asrjob_session_history",
+            ),
+            # application exports stream in (created_at, id) order
+            models.Index(fields=["application", "created_at", "id"], name="asrjob_app_created"),
+        ]
+
+class Transcript(models.Model):
+    """A job's transcript, kept out of the hot ASRJob row and zlib-compressed when that makes it smaller."""
+    PLAIN = "plain"
+    ZLIB = "zlib"
+    CODEC_CHOICES = [(PLAIN, "Plain UTF-8"), (ZLIB, "zlib")]
+    ZLIB_LEVEL = 6
+
+    job = models.OneToOneField(ASRJob, primary_key=True, on_delete=models.CASCADE, related_name="transcript")
+    codec = models.CharField(max_length=8, choices=CODEC_CHOICES, default=PLAIN)
+    data = models.BinaryField()
+
+    def set_text(self, text: str) -> None:
+        raw = text.encode("utf-8")
+        packed = zlib.compress(raw, self.ZLIB_LEVEL)
+        if len(packed) < len(raw):
+            self.codec, self.data = self.ZLIB, packed
+        else:
+            self.codec, self.data = self.PLAIN, raw
+
+    @classmethod
+    def decode(cls, codec: str, data) -> str:
+        data = bytes(data)
+        if codec == cls.ZLIB:
+            data = zlib.decompress(data)
+        return data.decode("utf-8")
+
+    def get_text(self) -> str:
+        return self.decode(self.codec, self.data)
+
+
+class TranscriptSearch(models.Model):
+    """
+    Full-text search entry for a finished job of a user or anonymous session.
+    The searchable document is not a model field: migration 0012 adds a
+    GIN-indexed tsvector column on PostgreSQL, or an FTS5 table keyed by this
+    row's id on SQLite. asr.utils.search writes and queries it.
+    """
+    job = models.OneToOneField(ASRJob, on_delete=models.CASCADE, related_name="search_entry")
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    session_key = models.CharField(max_length=40, null=True, blank=True)
+    # the job's created_at, so results page by (created_at, job) without a join
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="transcript_search_user"),
+            models.Index(fields=["session_key", "-created_at"], name="transcript_search_session"),
+        ]
+
+
 class UsageLedger(models.Model):
     user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name="usage_ledger")
-    application = models.ForeignKey("Application", null=True, blank=True, on_delete=models.CASCADE, related_name="usage_ledger")
+    # indexed by usage_ledger_app_created below
+    application = models.ForeignKey("Application", null=True, blank=True, on_delete=models.CASCADE,
+                                    related_name="usage_ledger", db_index=False)
     session_key = models.CharField(max_length=40, null=True, blank=True)
-    job = models.OneToOneField(ASRJob, on_delete=models.CASCADE, related_name="usage")
+    # billing rows outlive their job: the retention purge deletes jobs, not ledger rows
+    job = models.OneToOneField(ASRJob, null=True, blank=True, on_delete=models.SET_NULL, related_name="usage")
     plan_at_time = models.ForeignKey(Plan, on_delete=models.PROTECT, related_name="usage_entries")
     audio_duration_sec = models.FloatField()
     words_count = models.IntegerField(default=0)
@@ -74,6 +181,78 @@ class UsageLedger(models.Model):
     cost_units = models.FloatField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["application", "created_at"], name="usage_ledger_app_created"),
+            models.Index(
+                fields=["user", "created_at"],
+                condition=models.Q(application__isnull=True),
+                name="usage_ledger_user_created",
+            ),
+            models.Index(
+                fields=["session_key", "created_at"],
+                # excluding signed-in users' rows keeps SQLite's row estimates for a session honest
+                condition=models.Q(application__isnull=True, session_key__isnull=False),
+                name="usage_ledger_sid_created",
+            ),
+            # rollup rebuilds and backfills read the ledger by time range
+            models.Index(fields=["created_at"], name="usage_ledger_created"),
+        ]
+
+
+class UsageCounter(models.Model):
+    """Running monthly totals of UsageLedger per subject (`app:<id>`, `user:<id>` or `sid:<key>`)."""
+    subject = models.CharField(max_length=64)
+    period = models.DateField(help_text="First day of the month.")
+    audio_duration_sec = models.FloatField(default=0)
+    words_count = models.BigIntegerField(default=0)
+    chars_count = models.BigIntegerField(default=0)
+    cost_units = models.FloatField(default=0)
+    jobs_count = models.IntegerField(default=0)
+    # seconds held by accepted jobs that have not been billed yet
+    reserved_seconds = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["subject", "period"], name="usage_counter_subject_period"),
+        ]
+
+
+class UsageReservation(models.Model):
+    """Quota held for a job between upload and billing; settled on completion, refunded on failure or expiry."""
+    job = models.OneToOneField(ASRJob, on_delete=models.CASCADE, related_name="usage_reservation")
+    subject = models.CharField(max_length=64)
+    period = models.DateField()
+    seconds = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+
+class UsageRollup(models.Model):
+    """Ledger totals per subject and plan over one hour or one day (UTC), for usage charts."""
+    HOUR = "hour"
+    DAY = "day"
+    GRANULARITY_CHOICES = [(HOUR, "Hour"), (DAY, "Day")]
+
+    subject = models.CharField(max_length=64)
+    granularity = models.CharField(max_length=8, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    plan = models.ForeignKey(Plan, on_delete=models.PROTECT, related_name="usage_rollups")
+    audio_duration_sec = models.FloatField(default=0)
+    words_count = models.BigIntegerField(default=0)
+    chars_count = models.BigIntegerField(default=0)
+    cost_units = models.FloatField(default=0)
+    jobs_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["subject", "granularity", "bucket_start", "plan"],
+                name="usage_rollup_bucket",
+            ),
+        ]
+
 
 class Application(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -1,9 +1,11 @@
 from django.urls import re_path
-from .consumers import JobConsumer
+from .consumers import JobConsumer, JobStreamConsumer, TranscribeConsumer
 
 websocket_urlpatterns = [
     re_path(
         r"^ws/jobs/(?P<job_id>[0-9a-fA-F-]{36})/$",
         JobConsumer.as_asgi(),
     ),
+    re_path(r"^ws/stream/$", JobStreamConsumer.as_asgi()),
+    re_path(r"^ws/transcribe/$", TranscribeConsumer.as_asgi()),
 ]
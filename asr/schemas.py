@@ -41,9 +41,18 @@ class JobStatusSerializer(serializers.Serializer):
     status = serializers.CharField()
     processing_seconds = serializers.FloatField(allow_null=True)
     audio = AudioInfoSerializer()
+    queue_position = serializers.IntegerField(allow_null=True, help_text="1 = next to start, 0 = processing.")
+    eta_seconds = serializers.FloatField(allow_null=True, help_text="Estimated seconds until the job completes.")
+    estimated_completion_at = serializers.DateTimeField(allow_null=True)
     error = JobStatusErrorSerializer(required=False)
 
 
+class JobStatusPollSerializer(JobStatusSerializer):
+    seq = serializers.IntegerField(
+        allow_null=True, help_text="Job event log position; pass it back as `last_seq` on the next poll."
+    )
+
+
 class JobResultSerializer(serializers.Serializer):
     text = serializers.CharField()
     json_result = serializers.JSONField()
@@ -70,6 +79,30 @@ class ApplicationUsageSerializer(serializers.Serializer):
     total_words = serializers.IntegerField()
 
 
+class UsageTimeseriesQuerySerializer(serializers.Serializer):
+    granularity = serializers.ChoiceField(choices=["hour", "day"], default="day")
+    start = serializers.DateTimeField(required=False, help_text="Inclusive; defaults to 24 hours or 30 days before end.")
+    end = serializers.DateTimeField(required=False, help_text="Exclusive; defaults to the end of the current bucket.")
+    app_id = serializers.UUIDField(required=False, help_text="One of your applications; omit for your own jobs.")
+    plan = serializers.CharField(required=False, help_text="Only usage billed under this plan code.")
+
+
+class UsageTimeseriesPointSerializer(serializers.Serializer):
+    bucket_start = serializers.DateTimeField()
+    audio_duration_sec = serializers.FloatField()
+    words_count = serializers.IntegerField()
+    chars_count = serializers.IntegerField()
+    cost_units = serializers.FloatField()
+    jobs_count = serializers.IntegerField()
+
+
+class UsageTimeseriesSerializer(serializers.Serializer):
+    granularity = serializers.CharField()
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    results = UsageTimeseriesPointSerializer(many=True)
+
+
 class HistoryItemSerializer(serializers.Serializer):
     id = serializers.UUIDField()
     status = serializers.CharField()
@@ -80,12 +113,54 @@ class HistoryItemSerializer(serializers.Serializer):
 
 
 class PaginatedHistorySerializer(serializers.Serializer):
-    page = serializers.IntegerField()
+    page = serializers.IntegerField(allow_null=True, help_text="Null when paging by cursor.")
     page_size = serializers.IntegerField()
-    total = serializers.IntegerField()
+    total = serializers.IntegerField(help_text="Cached for a short time; may lag new uploads.")
+    next_cursor = serializers.CharField(allow_null=True, help_text="Pass as `cursor` for the next page; null on the last page.")
     results = HistoryItemSerializer(many=True)
 
 
+class TranscriptSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(min_length=2, max_length=200, help_text="Words to find; all must occur.")
+    cursor = serializers.CharField(required=False, help_text="`next_cursor` of the previous page")
+    page_size = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class TranscriptSearchHitSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    created_at = serializers.DateTimeField()
+    snippet = serializers.CharField(help_text="Excerpt of the normalized transcript around the first match.")
+
+
+class TranscriptSearchResultsSerializer(serializers.Serializer):
+    next_cursor = serializers.CharField(allow_null=True)
+    results = TranscriptSearchHitSerializer(many=True)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=["ndjson", "csv"], default="ndjson")
+    start = serializers.DateTimeField(required=False, help_text="Inclusive.")
+    end = serializers.DateTimeField(required=False, help_text="Exclusive.")
+    gzip = serializers.BooleanField(default=False, help_text="Send a gzip file instead of plain text.")
+
+    def validate(self, attrs):
+        if "start" in attrs and "end" in attrs and attrs["start"] >= attrs["end"]:
+            raise serializers.ValidationError({"start": ["Must be before end."]})
+        return attrs
+
+
+class JobExportQuerySerializer(ExportQuerySerializer):
+    include_text = serializers.BooleanField(default=False, help_text="Add each job's transcript as `text`.")
+
+
+class UserExportQuerySerializer(ExportQuerySerializer):
+    app_id = serializers.UUIDField(required=False, help_text="One of your applications; omit for your own jobs.")
+
+
+class UserJobExportQuerySerializer(UserExportQuerySerializer, JobExportQuerySerializer):
+    pass
+
+
 class DashboardOverviewSerializer(serializers.Serializer):
     total_cost_units = serializers.FloatField()
     total_audio_sec = serializers.FloatField()
@@ -1,24 +1,37 @@
 import time
 import tempfile
-import requests
+from datetime import timedelta
 from celery import shared_task
+from celery.signals import worker_process_shutdown
 from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
 from pydub import AudioSegment
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-
-from .models import ASRJob, UsageLedger
+from .models import ASRJob, UsageRollup
+from .utils.auth import flush_api_token_last_used
+from .utils.backend import transcribe
+from .utils.capacity import (
+    changed_positions, estimate_job, prune_waiting, record_finished, record_started, set_backlog, waiting_estimates,
+)
+from .utils.dispatch import release_dispatch_lease, renew_dispatch_lease
+from .utils.jobs import inline_text_fields
 from .utils.plan import get_or_create_plan
+from .utils.publisher import flush_publisher, get_publisher
+from .utils.ratelimit import release_job_slot
+from .utils.retention import purge_expired_jobs
+from .utils.search import index_transcript
+from .utils.usage import expire_usage_reservations, rebuild_usage_rollups, record_usage, refund_usage, rollup_bucket
 from .utils import map_exception, ASRTemporaryError
 
 
-def push_job(job_id: int, data: dict):
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"job_{job_id}",
-        {"type": "job_event", "data": data},
-    )
+def push_job(job: ASRJob, data: dict):
+    get_publisher().publish(job, data)
+
+
+@worker_process_shutdown.connect
+def _flush_job_events(**kwargs):
+    flush_publisher()
 
 
 def _extract_audio_metadata(audio_bytes: bytes):
@@ -39,8 +52,11 @@ def run_asr_job(self, job_id: int, audio_bytes: bytes, content_type: str, langua
     job.status = "processing"
     job.celery_task_id = self.request.id
     job.audio_mime = content_type
-    job.save(update_fields=["status", "celery_task_id", "audio_mime"])
-    push_job(job_id, {"status": "processing"})
+    # updated_at marks when processing started; estimate_job measures elapsed time from it
+    job.save(update_fields=["status", "celery_task_id", "audio_mime", "updated_at"])
+    record_started(job_id)
+    renew_dispatch_lease(job)
+    push_job(job, {"status": "processing", **estimate_job(job)})
 
     t0 = time.time()
     try:
@@ -50,11 +66,7 @@ def run_asr_job(self, job_id: int, audio_bytes: bytes, content_type: str, langua
         job.audio_channels = meta["channels"]
         job.save(update_fields=["audio_duration_sec", "audio_sample_rate", "audio_channels"])
 
-        files = {"file": ("audio", audio_bytes, content_type)}
-        data = {"language": language}
-        resp = requests.post(settings.ASR_FASTAPI_URL, files=files, data=data, timeout=settings.ASR_FASTAPI_TIMEOUT)
-        resp.raise_for_status()
-        payload = resp.json()
+        payload = transcribe(audio_bytes, content_type, language, job.audio_duration_sec)
 
         text = (payload.get("asr") or payload.get("text") or "").strip()
         job.text = text
@@ -66,26 +78,22 @@ def run_asr_job(self, job_id: int, audio_bytes: bytes, content_type: str, langua
         job.error_code = None
         job.error_message_public = None
         job.save()
+        index_transcript(job)
 
         cost_units = _calc_cost(job.audio_duration_sec, job.words_count)
         plan = get_or_create_plan(plan_code)
-        UsageLedger.objects.update_or_create(
-            job=job,
-            defaults={
-                "user": job.user,
-                "application": job.application,
-                "session_key": job.session_key,
-                "plan_at_time": plan,
-                "audio_duration_sec": float(job.audio_duration_sec or 0),
-                "words_count": job.words_count,
-                "chars_count": job.chars_count,
-                "cost_units": float(cost_units),
-            }
+        record_usage(
+            job,
+            plan,
+            audio_duration_sec=job.audio_duration_sec,
+            words_count=job.words_count,
+            chars_count=job.chars_count,
+            cost_units=cost_units,
         )
 
-        push_job(job_id, {
+        push_job(job, {
             "status": "done",
-            "text": job.text,
+            **inline_text_fields(job),
             "words_count": job.words_count,
             "chars_count": job.chars_count,
             "audio_duration_sec": job.audio_duration_sec,
@@ -93,6 +101,9 @@ def run_asr_job(self, job_id: int, audio_bytes: bytes, content_type: str, langua
             "cost_units": cost_units,
             "plan": plan.code,
         })
+        record_finished(job_id, job.audio_duration_sec)
+        release_job_slot(job)
+        release_dispatch_lease(job)
         return {"text": text}
 
 
@@ -106,12 +117,80 @@ def run_asr_job(self, job_id: int, audio_bytes: bytes, content_type: str, langua
         job.error_message_public = domain_error.public_message
         job.save(update_fields=["status", "processing_time_sec", "error_message", "error_code", "error_message_public"])
         # SAFE payload for UI
-        push_job(job_id, {
+        push_job(job, {
             "status": "error",
             "code": domain_error.error_code,
             "message": domain_error.public_message,
         })
+        if not isinstance(domain_error, ASRTemporaryError) or self.request.retries >= self.max_retries:
+            record_finished(job_id, job.audio_duration_sec)
+            release_job_slot(job)
+            release_dispatch_lease(job)
+            refund_usage(job)
         # retry only if temporary
         if isinstance(domain_error, ASRTemporaryError):
             raise self.retry(exc=e)
         return
+
+
+@shared_task
+def reconcile_queue_backlog():
+    """Reset the backlog and waiting set from the DB to undo drift from crashed workers."""
+    agg = ASRJob.objects.filter(status__in=["queued", "processing"]).aggregate(total_sec=Sum("audio_duration_sec"))
+    backlog = float(agg["total_sec"] or 0)
+    set_backlog(backlog)
+    pruned = prune_waiting(ASRJob.objects.filter(status="queued").values_list("id", flat=True))
+    return {"backlog_sec": backlog, "pruned": pruned}
+
+
+@shared_task
+def broadcast_queue_positions():
+    """Push the new position and ETA to every waiting job whose place in the queue moved."""
+    changed = changed_positions(waiting_estimates())
+    jobs = ASRJob.objects.filter(id__in=list(changed), status="queued").only(
+        "id", "user_id", "application_id", "session_key"
+    )
+    pushed = 0
+    for job in jobs:
+        push_job(job, {"status": "queued", **changed[str(job.id)]})
+        pushed += 1
+    return {"pushed": pushed}
+
+
+@shared_task
+def drain_pending_jobs():
+    """Start parked jobs whose tenant freed a lease without releasing it, e.g. a crashed worker."""
+    return {"dispatched": len(release_dispatch_lease())}
+
+
+@shared_task
+def expire_quota_reservations():
+    """Refund monthly quota still held by jobs that never finished."""
+    return {"refunded": expire_usage_reservations()}
+
+
+@shared_task
+def flush_api_token_usage():
+    """Persist the buffered ApiToken.last_used_at minutes in one batched UPDATE."""
+    return {"tokens": flush_api_token_last_used()}
+
+
+@shared_task
+def catch_up_usage_rollups():
+    """Re-derive recently closed rollup buckets from the ledger, repairing any increment the writer lost."""
+    now = timezone.now()
+    hour_end = rollup_bucket(now, UsageRollup.HOUR)
+    day_end = rollup_bucket(now, UsageRollup.DAY)
+    window = timedelta(hours=settings.ASR_ROLLUP_CATCHUP_HOURS)
+    return {
+        "hours": rebuild_usage_rollups(UsageRollup.HOUR, hour_end - window, hour_end),
+        "days": rebuild_usage_rollups(
+            UsageRollup.DAY, rollup_bucket(day_end - window, UsageRollup.DAY), day_end
+        ),
+    }
+
+
+@shared_task
+def purge_expired_history():
+    """Delete jobs past their plan's history retention, in bounded batches; ledger rows are kept."""
+    return purge_expired_jobs()
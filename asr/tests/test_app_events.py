@@ -0,0 +1,23 @@
+import asyncio
+import uuid
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+from drf_spectacular.generators import SchemaGenerator
+
+from asr.views import app_events
+
+
+class AppJobStatusTests(SimpleTestCase):
+    def test_unauthorized_long_poll_does_not_touch_the_event_log(self):
+        request = RequestFactory().get("/", {"wait": "5"})
+        with mock.patch.object(app_events, "current_seq") as current_seq:
+            response = asyncio.run(app_events.app_job_status(request, uuid.uuid4()))
+        self.assertIn(response.status_code, (401, 403))
+        current_seq.assert_not_called()
+
+    def test_async_endpoints_are_in_the_schema(self):
+        paths = SchemaGenerator().get_schema(public=True)["paths"]
+        status = paths["/api/v1/asr/jobs/{job_id}/status/"]["get"]
+        self.assertIn("wait", [parameter["name"] for parameter in status["parameters"]])
+        self.assertIn("/api/v1/asr/jobs/{job_id}/events/", paths)
@@ -0,0 +1,36 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from asr.models import ApiToken, Application
+from asr.utils import auth
+
+
+class LookupApiTokenTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(auth._api_tokens, "_bus", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        auth._api_tokens.clear()
+        self.addCleanup(auth._api_tokens.clear)
+        owner = get_user_model().objects.create_user(username="owner", password="x")
+        application = Application.objects.create(owner=owner, name="app")
+        self.token_hash = auth.hash_api_token("secret")
+        ApiToken.objects.create(application=application, token_hash=self.token_hash, token_prefix="sec")
+
+    def test_cache_hit_builds_fresh_instances(self):
+        first = auth.lookup_api_token(self.token_hash)
+        first.application.name = "changed by a request"
+        first.application.owner.username = "changed too"
+
+        with self.assertNumQueries(0):
+            second = auth.lookup_api_token(self.token_hash)
+            self.assertIsNot(second, first)
+            self.assertIsNot(second.application, first.application)
+            self.assertEqual(second.application.name, "app")
+            self.assertEqual(second.application.owner.username, "owner")
+
+    def test_unknown_token_is_not_cached(self):
+        self.assertIsNone(auth.lookup_api_token(auth.hash_api_token("nope")))
+        self.assertIsNone(auth._api_tokens.get(auth.hash_api_token("nope")))
@@ -0,0 +1,57 @@
+import uuid
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase
+
+from asr.utils import capacity
+
+try:
+    import fakeredis
+except ImportError:  # pragma: no cover
+    fakeredis = None
+
+
+@skipUnless(fakeredis, "fakeredis is not installed")
+class QueueEstimateTests(SimpleTestCase):
+    def setUp(self):
+        redis = fakeredis.FakeRedis()
+        stubs = {"get_redis": lambda: redis, "processing_speed": lambda: 2.0, "throughput": lambda queue=None: 1.0}
+        for name, value in stubs.items():
+            patcher = mock.patch.object(capacity, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.jobs = [SimpleNamespace(id=uuid.uuid4(), status="queued", audio_duration_sec=sec) for sec in (10, 20, 30)]
+        for job in self.jobs:
+            capacity.record_enqueued(job.id, job.audio_duration_sec)
+
+    def test_position_is_the_rank_among_waiting_jobs(self):
+        first, second, third = self.jobs
+        # the third job starts first, e.g. its tenant had a free lease
+        capacity.record_started(third.id)
+        estimate = capacity.estimate_job(second)
+        self.assertEqual(estimate["queue_position"], 2)
+        # 30s processing plus 10s waiting ahead, then its own 20s at 2x
+        self.assertEqual(estimate["eta_seconds"], 50.0)
+
+        capacity.record_finished(third.id, third.audio_duration_sec)
+        capacity.record_started(first.id)
+        estimate = capacity.estimate_job(second)
+        self.assertEqual(estimate["queue_position"], 1)
+        self.assertEqual(estimate["eta_seconds"], 20.0)
+
+    def test_waiting_estimates_match_estimate_job(self):
+        capacity.record_started(self.jobs[0].id)
+        estimates = capacity.waiting_estimates()
+        self.assertEqual(set(estimates), {str(job.id) for job in self.jobs[1:]})
+        for job in self.jobs[1:]:
+            expected = capacity.estimate_job(job)
+            self.assertEqual(estimates[str(job.id)]["queue_position"], expected["queue_position"])
+            self.assertEqual(estimates[str(job.id)]["eta_seconds"], expected["eta_seconds"])
+
+    def test_only_moved_jobs_are_broadcast(self):
+        self.assertEqual(len(capacity.changed_positions(capacity.waiting_estimates())), 3)
+        self.assertEqual(capacity.changed_positions(capacity.waiting_estimates()), {})
+        capacity.record_started(self.jobs[0].id)
+        changed = capacity.changed_positions(capacity.waiting_estimates())
+        self.assertEqual(set(changed), {str(job.id) for job in self.jobs[1:]})
@@ -0,0 +1,42 @@
+from unittest import mock, skipUnless
+
+from django.test import TestCase, override_settings
+
+from asr.models import ASRJob
+from asr.utils import dispatch
+
+try:
+    import fakeredis
+except ImportError:  # pragma: no cover
+    fakeredis = None
+
+
+@skipUnless(fakeredis, "fakeredis is not installed")
+@override_settings(ASR_DISPATCH_MAX_IN_FLIGHT={"free": 1}, ASR_DISPATCH_MAX_PENDING={"free": 2})
+class DispatchLeaseTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch.object(dispatch, "get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.job = ASRJob.objects.create(session_key="s1", status="queued", audio_duration_sec=3)
+        self.leases_key = dispatch.LEASES_KEY.format(tenant=dispatch.job_tenant(self.job))
+
+    def test_renew_retakes_an_expired_lease(self):
+        with mock.patch.object(dispatch, "_send"):
+            dispatch.dispatch_job(self.job, b"audio", "audio/wav", "fa", "free")
+        # the lease ran out while the task was still waiting in the Celery queue
+        self.redis.delete(self.leases_key)
+
+        dispatch.renew_dispatch_lease(self.job)
+
+        self.assertIsNotNone(self.redis.zscore(self.leases_key, str(self.job.id)))
+        self.assertGreater(self.redis.ttl(self.leases_key), 0)
+
+    def test_renewed_lease_holds_back_the_next_job(self):
+        with mock.patch.object(dispatch, "_send"):
+            dispatch.dispatch_job(self.job, b"audio", "audio/wav", "fa", "free")
+            self.redis.delete(self.leases_key)
+            dispatch.renew_dispatch_lease(self.job)
+            other = ASRJob.objects.create(session_key="s1", status="queued", audio_duration_sec=3)
+            self.assertIsNone(dispatch.dispatch_job(other, b"audio", "audio/wav", "fa", "free"))
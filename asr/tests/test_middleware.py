@@ -0,0 +1,35 @@
+import asyncio
+
+from asgiref.sync import SyncToAsync, iscoroutinefunction
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import SimpleTestCase
+
+from asr.middleware import RateLimitHeadersMiddleware
+
+
+class RateLimitHeadersMiddlewareTests(SimpleTestCase):
+    def test_asgi_chain_stays_async(self):
+        # a sync-only middleware would wrap the chain (and every async view) in SyncToAsync
+        self.assertNotIsInstance(ASGIHandler()._middleware_chain, SyncToAsync)
+
+    def test_async_path_sets_headers(self):
+        async def view(request):
+            request.rate_limit = {"limit": 10, "remaining": 4, "reset": 3}
+            return HttpResponse()
+
+        middleware = RateLimitHeadersMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = type("Request", (), {})()
+        response = asyncio.run(middleware(request))
+        self.assertEqual(response["X-RateLimit-Remaining"], "4")
+
+    def test_sync_path_sets_headers(self):
+        def view(request):
+            request.rate_limit = {"limit": 10, "remaining": 4, "reset": 3}
+            return HttpResponse()
+
+        middleware = RateLimitHeadersMiddleware(view)
+        self.assertFalse(iscoroutinefunction(middleware))
+        response = middleware(type("Request", (), {})())
+        self.assertEqual(response["X-RateLimit-Limit"], "10")
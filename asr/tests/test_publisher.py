@@ -0,0 +1,28 @@
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from asr.utils import publisher
+
+
+class _BrokenLayer:
+    async def group_send(self, group, message):
+        raise RuntimeError("channel layer down")
+
+
+class EventPublisherTests(SimpleTestCase):
+    def test_failed_deliveries_are_logged_with_their_size(self):
+        job = SimpleNamespace(id=uuid.uuid4(), application_id=None, user_id=7, session_key=None)
+        with mock.patch.object(publisher, "get_channel_layer", return_value=_BrokenLayer()), \
+                self.settings(REDIS_URL="redis://127.0.0.1:1/0"):
+            events = publisher.EventPublisher(linger_sec=0.05, max_batch=10)
+            with self.assertLogs("asr.utils.publisher") as logs:
+                for i in range(3):
+                    events.publish(job, {"status": "processing", "i": i})
+                events.flush()
+        output = "\n".join(logs.output)
+        self.assertIn("Could not log a batch of 3 job events", output)
+        self.assertIn(f"group job_{job.id} (3 in the batch)", output)
+        self.assertIn("group user_7 (3 in the batch)", output)
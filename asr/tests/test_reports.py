@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from asr.models import Application, ASRJob, Plan, UsageLedger
+from asr.utils.reports import dashboard_overview, usage_by_application
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class UsageReportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="u", password="x")
+        plan, _ = Plan.objects.get_or_create(code="free", defaults={"name": "Free"})
+        kept = ASRJob.objects.create(user=self.user, status="done")
+        UsageLedger.objects.create(user=self.user, job=kept, plan_at_time=plan, audio_duration_sec=10,
+                                   words_count=5, cost_units=1)
+        # a purged job leaves its ledger row behind with job_id null
+        UsageLedger.objects.create(user=self.user, plan_at_time=plan, audio_duration_sec=20, words_count=7,
+                                   cost_units=2)
+        for name in ("b", "a"):
+            application = Application.objects.create(owner=self.user, name=name)
+            UsageLedger.objects.create(user=self.user, application=application, plan_at_time=plan,
+                                       audio_duration_sec=30, cost_units=3)
+
+    def test_dashboard_overview_is_one_query(self):
+        with self.assertNumQueries(1):
+            overview = dashboard_overview(self.user)
+        self.assertEqual(overview["total_audio_sec"], 30)
+        self.assertEqual(overview["total_words"], 12)
+        self.assertEqual(overview["jobs_count"], 1)
+        with self.assertNumQueries(0):
+            dashboard_overview(self.user)
+
+    def test_usage_by_application_is_one_query(self):
+        with self.assertNumQueries(1):
+            rows = usage_by_application(self.user)
+        self.assertEqual([row["app_name"] for row in rows], ["a", "b"])
+        self.assertEqual(rows[0]["total_audio_sec"], 30)
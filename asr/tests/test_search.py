@@ -0,0 +1,34 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from asr.models import ASRJob, TranscriptSearch
+from asr.utils import search
+
+ZWNJ = "‌"
+
+
+class TranscriptSearchTests(TestCase):
+    def setUp(self):
+        if not search.search_available():
+            self.skipTest("no full-text search on this database")
+        self.user = get_user_model().objects.create_user(username="u", password="x")
+        job = ASRJob.objects.create(user=self.user, status="done", text=f"این کار انجام می{ZWNJ}شود")
+        search.index_transcript(job)
+
+    def _matches(self, query: str) -> int:
+        return search.search_transcripts(TranscriptSearch.objects.filter(user=self.user), query).count()
+
+    def test_zwnj_compound_matches_joined_and_split_queries(self):
+        self.assertEqual(self._matches(f"می{ZWNJ}شود"), 1)
+        self.assertEqual(self._matches("میشود"), 1)
+        self.assertEqual(self._matches("می شود"), 1)
+        self.assertEqual(self._matches("نمیشود"), 0)
+
+
+class SearchAvailableTests(TestCase):
+    def test_missing_fts_table_means_unavailable(self):
+        with mock.patch.object(search, "_fts_ready", False), \
+                mock.patch.object(search, "FTS_TABLE", "asr_no_such_fts"):
+            self.assertFalse(search.search_available())
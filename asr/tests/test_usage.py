@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from asr.models import ASRJob, Plan, UsageCounter, UsageReservation
+from asr.utils.usage import MonthlyLimitExceeded, record_usage, refund_usage, reserve_usage, top_up_usage
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class StreamingReservationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create_user(username="u", password="x")
+        self.plan, _ = Plan.objects.get_or_create(code="free", defaults={"name": "Free"})
+        self.job = ASRJob.objects.create(user=user, status="processing", audio_duration_sec=0)
+        self.subject = f"user:{user.pk}"
+
+    def _counter(self):
+        return UsageCounter.objects.get(subject=self.subject)
+
+    def _bill(self, seconds):
+        record_usage(self.job, self.plan, audio_duration_sec=seconds, words_count=1, chars_count=4,
+                     cost_units=seconds, accumulate=True)
+
+    def test_billing_draws_the_reservation_down_and_finish_releases_the_rest(self):
+        reserve_usage(self.job, 60, limit=100)
+        self._bill(10)
+        self.assertEqual(self._counter().reserved_seconds, 50)
+        self.assertEqual(UsageReservation.objects.get(job=self.job).seconds, 50)
+
+        top_up_usage(self.job, 30, limit=100)
+        self.assertEqual(self._counter().reserved_seconds, 80)
+
+        refund_usage(self.job)
+        counter = self._counter()
+        self.assertEqual((counter.audio_duration_sec, counter.reserved_seconds), (10, 0))
+        self.assertFalse(UsageReservation.objects.filter(job=self.job).exists())
+
+    def test_top_up_past_the_limit_is_refused(self):
+        reserve_usage(self.job, 60, limit=100)
+        self._bill(50)
+        with self.assertRaises(MonthlyLimitExceeded):
+            top_up_usage(self.job, 45, limit=100)
+        top_up_usage(self.job, 40, limit=100)
+        self.assertEqual(self._counter().reserved_seconds, 50)
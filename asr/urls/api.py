@@ -5,10 +5,14 @@ from asr.views.api import (
     HistoryView,
     ResultView,
     StatusView,
+    TranscriptSearchView,
     UploadView,
     UsageByAppView,
+    UsageTimeseriesView,
     UsageView,
 )
+from asr.views.export import JobExportView, UsageExportView
+from asr.views.metrics import QueueMetricsView
 from asr.views.apps import (
     ApplicationDetailView,
     ApplicationListCreateView,
@@ -23,8 +27,12 @@ urlpatterns = [
     path("result/<uuid:job_id>/", ResultView.as_view()),
     path("usage/", UsageView.as_view()),
     path("history/", HistoryView.as_view()),
+    path("search/", TranscriptSearchView.as_view()),
     path("dashboard/overview/", DashboardOverviewView.as_view()),
     path("usage/by-app/", UsageByAppView.as_view()),
+    path("usage/timeseries/", UsageTimeseriesView.as_view()),
+    path("export/jobs/", JobExportView.as_view()),
+    path("export/usage/", UsageExportView.as_view()),
     path("jobs/", HistoryView.as_view()),
     path("asr/test-upload/", UploadView.as_view()),
     path("asr/jobs/", HistoryView.as_view()),
@@ -33,4 +41,5 @@ urlpatterns = [
     path("apps/<uuid:app_id>/", ApplicationDetailView.as_view()),
     path("apps/<uuid:app_id>/tokens/", ApplicationTokenListCreateView.as_view()),
     path("apps/<uuid:app_id>/tokens/<uuid:token_id>/revoke/", ApplicationTokenRevokeView.as_view()),
+    path("metrics/", QueueMetricsView.as_view()),
 ]
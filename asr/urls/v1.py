@@ -1,13 +1,18 @@
 from django.urls import path
 
-from asr.views.app_api import AppHealthView, AppUploadView, AppStatusView, AppResultView
+from asr.views.app_api import AppHealthView, AppUploadView, AppResultView
+from asr.views.app_events import app_job_events, app_job_status
+from asr.views.export import AppJobExportView, AppUsageExportView
 from asr.views.profile import ChangePasswordView, CurrentUserProfileView, UpdateUserProfileView
 
 urlpatterns = [
     path("health/", AppHealthView.as_view()),
     path("asr/upload/", AppUploadView.as_view()),
     path("asr/jobs/<uuid:job_id>/", AppResultView.as_view()),
-    path("asr/jobs/<uuid:job_id>/status/", AppStatusView.as_view()),
+    path("asr/jobs/<uuid:job_id>/status/", app_job_status),
+    path("asr/jobs/<uuid:job_id>/events/", app_job_events),
+    path("asr/export/jobs/", AppJobExportView.as_view()),
+    path("asr/export/usage/", AppUsageExportView.as_view()),
 
     # user profile settings
     path("users/me/", CurrentUserProfileView.as_view()),
@@ -1,14 +1,32 @@
 import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
 
+import redis
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
-from django.utils import timezone
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Case, DateTimeField, Value, When
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed, ValidationError
 from rest_framework.permissions import BasePermission
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
-from asr.models import ApiToken
+from asr.models import ApiToken, Application, UserProfile
+from asr.utils.cache import bus
+from asr.utils.redis import get_redis
+
+# token id -> epoch minute it was last used, flushed to ApiToken.last_used_at by a beat task
+LAST_USED_KEY = "asr:api_token:last_used"
+LAST_USED_FLUSHING_KEY = "asr:api_token:last_used:flushing"
+
+# token hash -> (token row, application row, owner row) snapshots
+_api_tokens = bus.cache("api_token", settings.ASR_API_TOKEN_CACHE_SIZE, settings.ASR_API_TOKEN_CACHE_TTL_SEC)
+# user id -> (user row, profile row) snapshots for JWT authentication
+_auth_users = bus.cache("auth_user", settings.ASR_AUTH_USER_CACHE_SIZE, settings.ASR_AUTH_USER_CACHE_TTL_SEC)
+# token id -> last minute this process reported, so Redis sees one write per token per minute
+_touched = {}
 
 
 def _get_bearer_token(request) -> str | None:
@@ -28,6 +46,112 @@ def hash_api_token(token: str) -> str:
     return hashlib.sha256(token.encode("utf-8")).hexdigest()
 
 
+def lookup_api_token(token_hash: str) -> ApiToken | None:
+    """
+    Active token for `token_hash`, with its application and owner loaded.
+    Served from a per-process cache of row snapshots, rebuilt into fresh
+    instances on every hit as in load_auth_user(); revocation evicts it everywhere.
+    """
+    cached = _api_tokens.get(token_hash)
+    if cached is None:
+        token_obj = ApiToken.objects.select_related("application", "application__owner").filter(
+            token_hash=token_hash,
+            revoked_at__isnull=True,
+        ).first()
+        if token_obj:
+            application = token_obj.application
+            _api_tokens.set(token_hash, (_row(token_obj), _row(application), _row(application.owner)))
+        return token_obj
+    token_row, application_row, owner_row = cached
+    token_obj = _from_row(ApiToken, token_row)
+    application = _from_row(Application, application_row)
+    application.owner = _from_row(get_user_model(), owner_row)
+    token_obj.application = application
+    return token_obj
+
+
+def invalidate_api_token(token_hash: str) -> None:
+    _api_tokens.invalidate(token_hash)
+
+
+def _row(instance) -> tuple:
+    return tuple((f.attname, getattr(instance, f.attname)) for f in instance._meta.concrete_fields)
+
+
+def _from_row(model, row: tuple):
+    return model.from_db(DEFAULT_DB_ALIAS, [name for name, _ in row], [value for _, value in row])
+
+
+def load_auth_user(user_id):
+    """
+    User with its profile (active flag, token_version) attached, for JWT auth.
+    The cache holds row snapshots rather than instances, so every request gets
+    its own objects to mutate; saving a User or UserProfile evicts the entry in
+    all processes. Raises User.DoesNotExist.
+    """
+    user_model = get_user_model()
+    cached = _auth_users.get(str(user_id))
+    if cached is None:
+        user = user_model.objects.select_related("profile").get(pk=user_id)
+        try:
+            profile_row = _row(user.profile)
+        except UserProfile.DoesNotExist:
+            profile_row = None
+        _auth_users.set(str(user_id), (_row(user), profile_row))
+        return user
+    user_row, profile_row = cached
+    user = _from_row(user_model, user_row)
+    if profile_row is not None:
+        user.profile = _from_row(UserProfile, profile_row)
+    return user
+
+
+def invalidate_auth_user(user_id) -> None:
+    _auth_users.invalidate(str(user_id))
+
+
+def touch_api_token(token_obj: ApiToken) -> None:
+    """Record use of a token at minute precision; the DB is updated by flush_api_token_last_used()."""
+    minute = int(time.time() // 60)
+    token_id = str(token_obj.id)
+    if _touched.get(token_id) == minute:
+        return
+    try:
+        get_redis().hset(LAST_USED_KEY, token_id, minute)
+    except redis.RedisError:
+        return
+    if len(_touched) >= settings.ASR_API_TOKEN_CACHE_SIZE:
+        _touched.clear()
+    _touched[token_id] = minute
+
+
+def flush_api_token_last_used() -> int:
+    """Write buffered last-used minutes to the DB in one UPDATE; returns the number of tokens."""
+    r = get_redis()
+    try:
+        r.rename(LAST_USED_KEY, LAST_USED_FLUSHING_KEY)
+    except redis.ResponseError:
+        # nothing buffered since the last flush
+        return 0
+    pipe = r.pipeline()
+    pipe.hgetall(LAST_USED_FLUSHING_KEY)
+    pipe.delete(LAST_USED_FLUSHING_KEY)
+    buffered, _ = pipe.execute()
+    if not buffered:
+        return 0
+    last_used = {
+        token_id.decode(): datetime.fromtimestamp(int(minute) * 60, tz=dt_timezone.utc)
+        for token_id, minute in buffered.items()
+    }
+    ApiToken.objects.filter(id__in=list(last_used)).update(
+        last_used_at=Case(
+            *(When(id=token_id, then=Value(at)) for token_id, at in last_used.items()),
+            output_field=DateTimeField(),
+        )
+    )
+    return len(last_used)
+
+
 def enforce_bearer_token_only(request) -> None:
     if request.method in {"POST", "PUT", "PATCH", "DELETE"}:
         if "API_TOKEN" in request.data or "api_token" in request.data:
@@ -89,9 +213,12 @@ class HumanJWTAuthentication(JWTAuthentication):
             return AnonymousUser()
         user_model = get_user_model()
         try:
-            return user_model.objects.get(pk=user_id)
+            user = load_auth_user(user_id)
         except user_model.DoesNotExist as exc:
             raise AuthenticationFailed("User not found.") from exc
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive.")
+        return user
 
 
 class HumanTokenRequired(BasePermission):
@@ -110,15 +237,10 @@ class ApiTokenAuthentication(BaseAuthentication):
             return None
         if _is_jwt_like(raw_token):
             raise AuthenticationFailed("JWT is not allowed for this endpoint.")
-        token_hash = hash_api_token(raw_token)
-        token_obj = ApiToken.objects.select_related("application", "application__owner").filter(
-            token_hash=token_hash,
-            revoked_at__isnull=True,
-        ).first()
+        token_obj = lookup_api_token(hash_api_token(raw_token))
         if not token_obj:
             raise AuthenticationFailed("Invalid API token.")
-        token_obj.last_used_at = timezone.now()
-        token_obj.save(update_fields=["last_used_at"])
+        touch_api_token(token_obj)
         request.application = token_obj.application
         request.api_token = token_obj
         return token_obj.application.owner, token_obj
@@ -0,0 +1,163 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from urllib.parse import urlsplit
+
+import redis
+import requests
+from django.conf import settings
+
+from asr.utils.redis import get_redis
+
+LATENCY_KEY = "asr:backend:latency"
+BACKEND_LATENCY_KEY = "asr:backend:{backend}:latency"
+HEDGE_BUDGET_KEY = "asr:backend:hedge:{window}"
+
+# Grant a hedge only while hedges stay under `budget * requests` for the window.
+_ACQUIRE_HEDGE_LUA = """
+local requests = tonumber(redis.call('HGET', KEYS[1], 'requests') or '0')
+local hedges = tonumber(redis.call('HGET', KEYS[1], 'hedges') or '0')
+if hedges + 1 > requests * tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HINCRBY', KEYS[1], 'hedges', 1)
+return 1
+"""
+
+
+def _post(session, url: str, audio_bytes: bytes, content_type: str, language: str) -> dict:
+    files = {"file": ("audio", audio_bytes, content_type)}
+    data = {"language": language}
+    resp = session.post(url, files=files, data=data, timeout=settings.ASR_FASTAPI_TIMEOUT)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def _budget_key() -> str:
+    window = int(time.time() // settings.ASR_HEDGE_BUDGET_WINDOW_SEC)
+    return HEDGE_BUDGET_KEY.format(window=window)
+
+
+def backend_name(url: str) -> str:
+    return urlsplit(url).netloc or url
+
+
+def _record_latency(elapsed_sec: float, duration_sec: float | None, url: str) -> None:
+    if not duration_sec:
+        return
+    ratio = elapsed_sec / float(duration_sec)
+    try:
+        pipe = get_redis().pipeline()
+        for key in (LATENCY_KEY, BACKEND_LATENCY_KEY.format(backend=backend_name(url))):
+            pipe.lpush(key, ratio)
+            pipe.ltrim(key, 0, settings.ASR_HEDGE_LATENCY_WINDOW - 1)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def _latency_ratios(url: str | None = None) -> list[float]:
+    key = BACKEND_LATENCY_KEY.format(backend=backend_name(url)) if url else LATENCY_KEY
+    return sorted(float(r) for r in get_redis().lrange(key, 0, -1))
+
+
+def latency_p95() -> float | None:
+    """p95 of processing seconds per second of audio over the recent window."""
+    ratios = _latency_ratios()
+    if len(ratios) < settings.ASR_HEDGE_MIN_SAMPLES:
+        return None
+    return ratios[int(0.95 * (len(ratios) - 1))]
+
+
+def processing_speed(url: str | None = None) -> float | None:
+    """Median seconds of audio processed per second of wall time, for one backend or all."""
+    ratios = _latency_ratios(url)
+    if not ratios:
+        return None
+    median = ratios[len(ratios) // 2]
+    return 1.0 / median if median > 0 else None
+
+
+def _hedge_delay(duration_sec: float | None) -> float | None:
+    if not duration_sec:
+        return None
+    try:
+        p95 = latency_p95()
+    except redis.RedisError:
+        return None
+    if p95 is None:
+        return None
+    expected = p95 * float(duration_sec)
+    return max(settings.ASR_HEDGE_FACTOR * expected, settings.ASR_HEDGE_MIN_DELAY_SEC)
+
+
+def _register_request() -> None:
+    key = _budget_key()
+    try:
+        pipe = get_redis().pipeline()
+        pipe.hincrby(key, "requests", 1)
+        pipe.expire(key, settings.ASR_HEDGE_BUDGET_WINDOW_SEC * 2)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def _acquire_hedge() -> bool:
+    try:
+        return bool(get_redis().eval(_ACQUIRE_HEDGE_LUA, 1, _budget_key(), settings.ASR_HEDGE_BUDGET))
+    except redis.RedisError:
+        return False
+
+
+def _hedged_post(urls: list[str], delay: float, audio_bytes, content_type, language) -> tuple[str, dict]:
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="asr-hedge")
+    sessions = []
+    targets = {}
+
+    def submit(url):
+        session = requests.Session()
+        sessions.append(session)
+        fut = pool.submit(_post, session, url, audio_bytes, content_type, language)
+        targets[fut] = url
+        return fut
+
+    try:
+        futures = [submit(urls[0])]
+        done, _ = wait(futures, timeout=delay)
+        if not done and _acquire_hedge():
+            futures.append(submit(random.choice(urls[1:])))
+        first_error = None
+        for fut in as_completed(futures):
+            exc = fut.exception()
+            if exc is None:
+                return targets[fut], fut.result()
+            first_error = first_error or exc
+        raise first_error
+    finally:
+        # the loser is abandoned: its session is torn down and its response dropped
+        for session in sessions:
+            session.close()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def transcribe(audio_bytes: bytes, content_type: str, language: str = "fa", duration_sec: float | None = None) -> dict:
+    """
+    Send audio to the ASR core and return its JSON payload.
+
+    With ASR_HEDGE_ENABLED and more than one backend configured, a request that
+    has been in flight for ASR_HEDGE_FACTOR x the p95 expected time for its
+    duration is duplicated to another backend; the first response wins.
+    """
+    urls = list(settings.ASR_FASTAPI_URLS)
+    delay = None
+    if settings.ASR_HEDGE_ENABLED and len(urls) > 1:
+        _register_request()
+        delay = _hedge_delay(duration_sec)
+
+    t0 = time.monotonic()
+    if delay is None:
+        url, payload = urls[0], _post(requests, urls[0], audio_bytes, content_type, language)
+    else:
+        url, payload = _hedged_post(urls, delay, audio_bytes, content_type, language)
+    _record_latency(time.monotonic() - t0, duration_sec, url)
+    return payload
@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from django.conf import settings
+
+from asr.utils.redis import get_redis
+
+INVALIDATION_CHANNEL = "asr:cache:invalidate"
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after being set."""
+
+    def __init__(self, name: str, maxsize: int, ttl: float, bus=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._bus = bus
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        if self._bus is not None:
+            self._bus.ensure_listener()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def invalidate(self, key) -> None:
+        """Evict `key` here and in every other process subscribed to the bus."""
+        self.pop(key)
+        if self._bus is not None:
+            self._bus.publish(self.name, key)
+
+    def invalidate_all(self) -> None:
+        self.clear()
+        if self._bus is not None:
+            self._bus.publish(self.name, None)
+
+
+class InvalidationBus:
+    """
+    Cross-process cache eviction over Redis pub/sub. Each process runs one
+    listener thread (started lazily, restarted after fork) that evicts the
+    keys other processes invalidate. Anything published while the listener
+    was disconnected is lost, so caches are cleared on every (re)subscribe
+    and the TTL bounds staleness if Redis is unavailable.
+    """
+
+    def __init__(self, channel: str = INVALIDATION_CHANNEL):
+        self.channel = channel
+        self._caches = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def cache(self, name: str, maxsize: int, ttl: float) -> TTLCache:
+        cache = TTLCache(name, maxsize, ttl, bus=self)
+        self._caches[name] = cache
+        return cache
+
+    def ensure_listener(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            for cache in self._caches.values():
+                cache.clear()
+            threading.Thread(target=self._listen, name="asr-cache-invalidation", daemon=True).start()
+            self._pid = os.getpid()
+
+    def publish(self, name: str, key) -> None:
+        """Evict `key` from cache `name` in other processes; None clears the whole cache."""
+        try:
+            get_redis().publish(self.channel, json.dumps({"cache": name, "key": key}))
+        except redis.RedisError:
+            pass
+
+    def _evict(self, raw) -> None:
+        try:
+            message = json.loads(raw)
+            cache = self._caches[message["cache"]]
+            key = message["key"]
+        except (ValueError, KeyError, TypeError):
+            return
+        if key is None:
+            cache.clear()
+        else:
+            cache.pop(key)
+
+    def _listen(self):
+        backoff = 1.0
+        while True:
+            try:
+                pubsub = redis.Redis.from_url(settings.REDIS_URL).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for cache in self._caches.values():
+                    cache.clear()
+                backoff = 1.0
+                for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._evict(message["data"])
+            except redis.RedisError:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+
+bus = InvalidationBus()
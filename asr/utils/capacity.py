@@ -0,0 +1,245 @@
+import math
+import time
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import Throttled
+
+from asr.utils.backend import processing_speed
+from asr.utils.redis import get_redis
+
+# per-queue keys share the {queue} hash tag, so scripts and MGET can touch them together on a cluster
+BACKLOG_KEY = "asr:queue:{{{queue}}}:backlog"
+DONE_KEY = "asr:queue:{{{queue}}}:done:{bucket}"
+# jobs waiting for a worker, in enqueue order (scored by the cumulative audio enqueued up to them)
+WAITING_KEY = "asr:queue:{{{queue}}}:waiting"
+# waiting job id -> its audio seconds, and their sum
+WAITING_AUDIO_KEY = "asr:queue:{{{queue}}}:waiting_audio"
+WAITING_TOTAL_KEY = "asr:queue:{{{queue}}}:waiting_total"
+ENQUEUED_TOTAL_KEY = "asr:queue:{{{queue}}}:enqueued_total"
+# waiting job id -> the position last broadcast to it
+BROADCAST_KEY = "asr:queue:{{{queue}}}:broadcast"
+
+# KEYS: enqueued total, backlog, waiting, waiting audio, waiting total. ARGV: job id, audio seconds.
+_ENQUEUE_LUA = """
+local offset = redis.call('INCRBYFLOAT', KEYS[1], ARGV[2])
+redis.call('INCRBYFLOAT', KEYS[2], ARGV[2])
+redis.call('ZADD', KEYS[3], offset, ARGV[1])
+redis.call('HSET', KEYS[4], ARGV[1], ARGV[2])
+redis.call('INCRBYFLOAT', KEYS[5], ARGV[2])
+return offset
+"""
+
+# KEYS: waiting, waiting audio, waiting total. ARGV: job ids no longer waiting.
+_UNWAIT_LUA = """
+for _, job_id in ipairs(ARGV) do
+  redis.call('ZREM', KEYS[1], job_id)
+  local sec = redis.call('HGET', KEYS[2], job_id)
+  if sec then
+    redis.call('HDEL', KEYS[2], job_id)
+    redis.call('INCRBYFLOAT', KEYS[3], -tonumber(sec))
+  end
+end
+"""
+
+
+class QueueBacklogged(Throttled):
+    error_code = "QUEUE_BACKLOGGED"
+    public_message = "Transcription queue is busy. Please retry later."
+
+
+def default_queue() -> str:
+    return getattr(settings, "CELERY_TASK_DEFAULT_QUEUE", "celery")
+
+
+def _bucket(ts: float) -> int:
+    return int(ts // settings.ASR_THROUGHPUT_BUCKET_SEC)
+
+
+def _waiting_keys(queue: str) -> list[str]:
+    return [
+        WAITING_KEY.format(queue=queue),
+        WAITING_AUDIO_KEY.format(queue=queue),
+        WAITING_TOTAL_KEY.format(queue=queue),
+    ]
+
+
+def record_enqueued(job_id, duration_sec: float | None, queue: str | None = None) -> None:
+    queue = queue or default_queue()
+    keys = [
+        ENQUEUED_TOTAL_KEY.format(queue=queue),
+        BACKLOG_KEY.format(queue=queue),
+        *_waiting_keys(queue),
+    ]
+    try:
+        get_redis().eval(_ENQUEUE_LUA, len(keys), *keys, str(job_id), float(duration_sec or 0))
+    except redis.RedisError:
+        pass
+
+
+def record_started(job_id, queue: str | None = None) -> None:
+    keys = _waiting_keys(queue or default_queue())
+    try:
+        get_redis().eval(_UNWAIT_LUA, len(keys), *keys, str(job_id))
+    except redis.RedisError:
+        pass
+
+
+def record_finished(job_id, duration_sec: float | None, queue: str | None = None) -> None:
+    queue = queue or default_queue()
+    duration_sec = float(duration_sec or 0)
+    done_key = DONE_KEY.format(queue=queue, bucket=_bucket(time.time()))
+    keys = _waiting_keys(queue)
+    try:
+        pipe = get_redis().pipeline()
+        pipe.eval(_UNWAIT_LUA, len(keys), *keys, str(job_id))
+        pipe.incrbyfloat(BACKLOG_KEY.format(queue=queue), -duration_sec)
+        pipe.incrbyfloat(done_key, duration_sec)
+        pipe.expire(done_key, settings.ASR_THROUGHPUT_WINDOW_SEC * 2)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def prune_waiting(queued_ids, queue: str | None = None) -> int:
+    """Drop waiting entries for jobs that are no longer queued and recount the waiting audio."""
+    queue = queue or default_queue()
+    keys = _waiting_keys(queue)
+    r = get_redis()
+    keep = {str(job_id) for job_id in queued_ids}
+    stale = {m for m in r.zrange(keys[0], 0, -1) if m.decode() not in keep}
+    stale.update(m for m in r.hkeys(keys[1]) if m.decode() not in keep)
+    if stale:
+        r.eval(_UNWAIT_LUA, len(keys), *keys, *stale)
+    r.set(keys[2], sum(float(sec) for sec in r.hvals(keys[1])))
+    return len(stale)
+
+
+def set_backlog(backlog_sec: float, queue: str | None = None) -> None:
+    get_redis().set(BACKLOG_KEY.format(queue=queue or default_queue()), float(backlog_sec))
+
+
+def backlog_seconds(queue: str | None = None) -> float:
+    """Seconds of audio accepted but not yet finished on `queue`."""
+    raw = get_redis().get(BACKLOG_KEY.format(queue=queue or default_queue()))
+    return max(float(raw or 0), 0.0)
+
+
+def throughput(queue: str | None = None) -> float:
+    """Seconds of audio completed per wall-clock second, over the rolling window."""
+    queue = queue or default_queue()
+    now = _bucket(time.time())
+    n = max(settings.ASR_THROUGHPUT_WINDOW_SEC // settings.ASR_THROUGHPUT_BUCKET_SEC, 1)
+    keys = [DONE_KEY.format(queue=queue, bucket=b) for b in range(now - n + 1, now + 1)]
+    done = sum(float(v) for v in get_redis().mget(keys) if v)
+    if not done:
+        return settings.ASR_ASSUMED_THROUGHPUT
+    return done / (n * settings.ASR_THROUGHPUT_BUCKET_SEC)
+
+
+def estimated_wait_seconds(queue: str | None = None) -> float:
+    return backlog_seconds(queue) / max(throughput(queue), 1e-6)
+
+
+def _estimate(position: int, ahead_sec: float, own_sec: float, rate: float) -> dict:
+    eta = ahead_sec / max(rate, 1e-6) + own_sec
+    return {
+        "queue_position": position,
+        "eta_seconds": round(eta, 1),
+        "estimated_completion_at": (timezone.now() + timedelta(seconds=eta)).isoformat(),
+    }
+
+
+def _own_seconds(duration_sec: float) -> float:
+    return duration_sec / (processing_speed() or settings.ASR_ASSUMED_THROUGHPUT)
+
+
+def estimate_job(job, queue: str | None = None) -> dict:
+    """
+    Queue position (1 = next to start) and ETA for a pending job. Position is
+    the job's rank in the waiting set. ETA is the audio ahead of it (jobs still
+    processing plus the waiting jobs ranked before it) divided by queue
+    throughput, plus its own duration at the backends' median processing speed.
+    """
+    estimate = {"queue_position": None, "eta_seconds": None, "estimated_completion_at": None}
+    if job.status not in ("queued", "processing"):
+        return estimate
+    queue = queue or default_queue()
+    try:
+        own_sec = _own_seconds(float(job.audio_duration_sec or 0))
+        if job.status == "processing":
+            # run_asr_job stamps updated_at when it starts and leaves it alone until the job finishes
+            elapsed = (timezone.now() - job.updated_at).total_seconds()
+            return _estimate(0, 0.0, max(own_sec - elapsed, 0.0), 1.0)
+        waiting_key, audio_key, total_key = _waiting_keys(queue)
+        r = get_redis()
+        rank = r.zrank(waiting_key, str(job.id))
+        if rank is None:
+            return estimate
+        pipe = r.pipeline()
+        pipe.zrange(waiting_key, 0, rank)
+        pipe.get(BACKLOG_KEY.format(queue=queue))
+        pipe.get(total_key)
+        job_ids, backlog, waiting_total = pipe.execute()
+        # the last id is the job itself
+        ahead = r.hmget(audio_key, job_ids)[:-1]
+        processing_sec = max(float(backlog or 0) - float(waiting_total or 0), 0.0)
+        ahead_sec = processing_sec + sum(float(sec or 0) for sec in ahead)
+        return _estimate(rank + 1, ahead_sec, own_sec, throughput(queue))
+    except redis.RedisError:
+        return estimate
+
+
+def waiting_estimates(queue: str | None = None) -> dict[str, dict]:
+    """Position and ETA of every job waiting on `queue`, by job id, from one pass over the waiting set."""
+    queue = queue or default_queue()
+    waiting_key, audio_key, _ = _waiting_keys(queue)
+    pipe = get_redis().pipeline()
+    pipe.zrange(waiting_key, 0, -1)
+    pipe.hgetall(audio_key)
+    pipe.get(BACKLOG_KEY.format(queue=queue))
+    job_ids, audio, backlog = pipe.execute()
+    durations = [float(audio.get(job_id) or 0) for job_id in job_ids]
+    rate = throughput(queue)
+    ahead_sec = max(float(backlog or 0) - sum(float(sec) for sec in audio.values()), 0.0)
+    estimates = {}
+    for position, (job_id, duration_sec) in enumerate(zip(job_ids, durations), start=1):
+        estimates[job_id.decode()] = _estimate(position, ahead_sec, _own_seconds(duration_sec), rate)
+        ahead_sec += duration_sec
+    return estimates
+
+
+def changed_positions(estimates: dict[str, dict], queue: str | None = None) -> dict[str, dict]:
+    """
+    The subset of `estimates` whose queue position differs from the one last
+    broadcast, recording the new positions as broadcast.
+    """
+    key = BROADCAST_KEY.format(queue=queue or default_queue())
+    r = get_redis()
+    last = {job_id.decode(): int(position) for job_id, position in r.hgetall(key).items()}
+    changed = {job_id: e for job_id, e in estimates.items() if last.get(job_id) != e["queue_position"]}
+    pipe = r.pipeline()
+    pipe.delete(key)
+    if estimates:
+        pipe.hset(key, mapping={job_id: e["queue_position"] for job_id, e in estimates.items()})
+    pipe.execute()
+    return changed
+
+
+def check_admission(plan, queue: str | None = None) -> None:
+    """
+    Reject new work with 429 when the queue's estimated wait exceeds the
+    plan's threshold. Retry-After is the time needed to drain back under it.
+    Fails open if Redis is unavailable.
+    """
+    limit = settings.ASR_ADMISSION_MAX_WAIT_SEC.get(getattr(plan, "code", None))
+    if not limit:
+        return
+    try:
+        wait_sec = estimated_wait_seconds(queue)
+    except redis.RedisError:
+        return
+    if wait_sec > limit:
+        raise QueueBacklogged(wait=math.ceil(wait_sec - limit))
@@ -0,0 +1,250 @@
+import msgpack
+import redis
+from django.conf import settings
+from rest_framework.exceptions import Throttled
+
+from asr.models import ASRJob
+from asr.utils.capacity import record_finished
+from asr.utils.ratelimit import release_job_slot
+from asr.utils.redis import get_redis
+from asr.utils.usage import refund_usage
+
+# per-tenant keys share the {tenant} hash tag, so one script can touch them all on a cluster
+LEASES_KEY = "asr:dispatch:{{{tenant}}}:leases"
+PENDING_KEY = "asr:dispatch:{{{tenant}}}:pending"
+# the tenant's max in-flight jobs, recorded when its jobs are submitted and
+# kept as long as any of them can still be pending or leased
+CAP_KEY = "asr:dispatch:{{{tenant}}}:cap"
+ARGS_KEY = "asr:dispatch:args:{job_id}"
+# tenants with pending jobs, rotated for round-robin release
+RING_KEY = "asr:dispatch:ring"
+
+# KEYS: leases, pending, cap. ARGV: job id, cap, lease ttl, pending ttl, max pending.
+# Returns 1 if the job got a lease, 0 if it was queued behind the tenant's other jobs,
+# -1 if the tenant already has max pending jobs queued.
+_ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('SET', KEYS[3], ARGV[2], 'EX', math.ceil(math.max(tonumber(ARGV[3]), tonumber(ARGV[4]))))
+if redis.call('LLEN', KEYS[2]) == 0 and redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+  redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+  redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[3])))
+  return 1
+end
+if redis.call('LLEN', KEYS[2]) >= tonumber(ARGV[5]) then
+  return -1
+end
+redis.call('RPUSH', KEYS[2], ARGV[1])
+return 0
+"""
+
+# KEYS: leases, pending, cap. ARGV: lease ttl.
+# Gives the tenant's next pending job a lease if it is under its cap.
+# Returns {released job id or false, jobs still pending}.
+_PROMOTE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local cap = tonumber(redis.call('GET', KEYS[3]) or '1')
+local job_id = false
+if redis.call('ZCARD', KEYS[1]) < cap then
+  job_id = redis.call('LPOP', KEYS[2])
+  if job_id then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[1]), job_id)
+    redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[1])))
+  end
+end
+return {job_id, redis.call('LLEN', KEYS[2])}
+"""
+
+# KEYS: ring. ARGV: tenant.
+_RING_ADD_LUA = """
+if not redis.call('LPOS', KEYS[1], ARGV[1]) then
+  redis.call('RPUSH', KEYS[1], ARGV[1])
+end
+"""
+
+
+class PendingLimitExceeded(Throttled):
+    error_code = "TOO_MANY_PENDING"
+    public_message = "Too many uploads are waiting to start for your plan. Please retry when one finishes."
+
+
+def tenant_for(application_id=None, user_id=None, session_key=None) -> str:
+    if application_id:
+        return f"app:{application_id}"
+    if user_id:
+        return f"user:{user_id}"
+    return f"sid:{session_key}"
+
+
+def job_tenant(job) -> str:
+    return tenant_for(job.application_id, job.user_id, job.session_key)
+
+
+def _tenant_keys(tenant: str) -> list[str]:
+    return [LEASES_KEY.format(tenant=tenant), PENDING_KEY.format(tenant=tenant), CAP_KEY.format(tenant=tenant)]
+
+
+def max_in_flight(plan_code: str) -> int:
+    caps = settings.ASR_DISPATCH_MAX_IN_FLIGHT
+    return caps.get(plan_code) or caps["free"]
+
+
+def max_pending(plan_code: str) -> int:
+    limits = settings.ASR_DISPATCH_MAX_PENDING
+    return limits.get(plan_code, limits["free"])
+
+
+def check_pending_capacity(tenant: str, plan_code: str) -> None:
+    """
+    Reject an upload with 429 before its job is created if the tenant already
+    has as many jobs parked as its plan allows. dispatch_job enforces the same
+    limit atomically; this check just spares the common case a failed job.
+    Fails open if Redis is unavailable.
+    """
+    try:
+        pending = get_redis().llen(PENDING_KEY.format(tenant=tenant))
+    except redis.RedisError:
+        return
+    if pending >= max_pending(plan_code):
+        raise PendingLimitExceeded(wait=settings.ASR_CONCURRENCY_RETRY_SEC)
+
+
+def _reject_pending(job) -> None:
+    """Fail a job that found its tenant's pending list full and give back what its upload took."""
+    ASRJob.objects.filter(id=job.id, status="queued").update(
+        status="error",
+        error_code=PendingLimitExceeded.error_code,
+        error_message_public=PendingLimitExceeded.public_message,
+    )
+    record_finished(job.id, job.audio_duration_sec)
+    release_job_slot(job)
+    refund_usage(job)
+
+
+def _send(job_args: list):
+    from asr.tasks import run_asr_job
+
+    return run_asr_job.delay(*job_args)
+
+
+def dispatch_job(job, audio_bytes: bytes, content_type: str, language: str, plan_code: str):
+    """
+    Send the job to the workers if its tenant (application, user or anonymous
+    session) has a free in-flight lease, else park it in the tenant's pending
+    list until release_dispatch_lease() frees one. Returns the AsyncResult, or
+    None when the job was parked. Parked uploads are held in Redis for at most
+    ASR_DISPATCH_PENDING_TTL_SEC, and at most max_pending() per tenant: past
+    that the job is failed and PendingLimitExceeded raised. Dispatches directly
+    if Redis is unavailable.
+    """
+    job_args = [str(job.id), audio_bytes, content_type, language, plan_code]
+    tenant = job_tenant(job)
+    r = get_redis()
+    try:
+        # store the arguments first: a release elsewhere may pop the job as soon as it is queued
+        r.set(ARGS_KEY.format(job_id=job.id), msgpack.packb(job_args, use_bin_type=True),
+              ex=settings.ASR_DISPATCH_PENDING_TTL_SEC)
+        acquired = r.eval(_ACQUIRE_LUA, 3, *_tenant_keys(tenant), str(job.id),
+                          max_in_flight(plan_code), settings.ASR_DISPATCH_LEASE_SEC,
+                          settings.ASR_DISPATCH_PENDING_TTL_SEC, max_pending(plan_code))
+    except redis.RedisError:
+        return _send(job_args)
+    if acquired == -1:
+        r.delete(ARGS_KEY.format(job_id=job.id))
+        _reject_pending(job)
+        raise PendingLimitExceeded(wait=settings.ASR_CONCURRENCY_RETRY_SEC)
+    if not acquired:
+        # only once the job is queued: a release that drops the tenant from the ring re-checks its list after
+        try:
+            r.eval(_RING_ADD_LUA, 1, RING_KEY, tenant)
+        except redis.RedisError:
+            pass
+        return None
+    r.delete(ARGS_KEY.format(job_id=job.id))
+    return _send(job_args)
+
+
+def renew_dispatch_lease(job) -> None:
+    """
+    Extend a running job's lease so it outlives long transcriptions but not a
+    dead worker. The lease is (re)taken even if it expired while the job sat in
+    the Celery queue: the job is running either way, and it must count against
+    its tenant's cap until release_dispatch_lease().
+    """
+    try:
+        r = get_redis()
+        key = LEASES_KEY.format(tenant=job_tenant(job))
+        pipe = r.pipeline()
+        pipe.zadd(key, {str(job.id): r.time()[0] + settings.ASR_DISPATCH_LEASE_SEC})
+        pipe.expire(key, settings.ASR_DISPATCH_LEASE_SEC)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def _promote_pending(r) -> list[bytes]:
+    """
+    Hand out free leases one tenant at a time around the ring until no tenant
+    can start another job. Each step is a script over one tenant's keys, so the
+    ring itself is only ever touched by single-key commands.
+    """
+    released = []
+    progress = True
+    try:
+        while progress:
+            progress = False
+            for _ in range(r.llen(RING_KEY)):
+                tenant = r.lmove(RING_KEY, RING_KEY, "LEFT", "RIGHT")
+                if tenant is None:
+                    break
+                tenant = tenant.decode()
+                job_id, pending = r.eval(_PROMOTE_LUA, 3, *_tenant_keys(tenant), settings.ASR_DISPATCH_LEASE_SEC)
+                if job_id:
+                    released.append(job_id)
+                    progress = True
+                if not pending:
+                    r.lrem(RING_KEY, 0, tenant)
+                    # a job queued since the script ran must not be left off the ring
+                    if r.llen(PENDING_KEY.format(tenant=tenant)):
+                        r.eval(_RING_ADD_LUA, 1, RING_KEY, tenant)
+    except redis.RedisError:
+        # jobs already given a lease must still be sent
+        pass
+    return released
+
+
+def release_dispatch_lease(job=None) -> list[str]:
+    """
+    Free `job`'s lease (if given) and send every pending job that now fits
+    under its tenant's cap, round-robin across tenants. Returns the sent job ids.
+    """
+    r = get_redis()
+    if job is not None:
+        try:
+            r.zrem(LEASES_KEY.format(tenant=job_tenant(job)), str(job.id))
+        except redis.RedisError:
+            return []
+    released = _promote_pending(r)
+    sent = []
+    for job_id in released:
+        job_id = job_id.decode()
+        args_key = ARGS_KEY.format(job_id=job_id)
+        pipe = r.pipeline()
+        pipe.get(args_key)
+        pipe.delete(args_key)
+        packed, _ = pipe.execute()
+        if packed is None:
+            # held longer than ASR_DISPATCH_PENDING_TTL_SEC; the audio is gone
+            ASRJob.objects.filter(id=job_id, status="queued").update(
+                status="error",
+                error_code="QUEUE_EXPIRED",
+                error_message_public="Job waited too long to be scheduled. Please upload again.",
+            )
+            refund_usage(job_id)
+            continue
+        _send(msgpack.unpackb(packed, raw=False))
+        sent.append(job_id)
+    return sent
@@ -114,8 +114,8 @@ def exception_handler(exc, context):
     if isinstance(exc, PermissionDenied):
         return error_response(
             ErrorEnvelope(
-                code="FORBIDDEN",
-                message="You do not have permission to perform this action.",
+                code=getattr(exc, "error_code", "FORBIDDEN"),
+                message=getattr(exc, "public_message", "You do not have permission to perform this action."),
                 category=ErrorCategory.AUTH,
                 status_code=response.status_code,
             )
@@ -138,14 +138,17 @@ def exception_handler(exc, context):
     # Rate limit
     # -------------------------
     if isinstance(exc, Throttled):
-        return error_response(
+        throttled = error_response(
             ErrorEnvelope(
-                code="RATE_LIMITED",
-                message="Too many requests. Please try again later.",
+                code=getattr(exc, "error_code", "RATE_LIMITED"),
+                message=getattr(exc, "public_message", "Too many requests. Please try again later."),
                 category=ErrorCategory.TRANSIENT,
                 status_code=response.status_code,
             )
         )
+        if "Retry-After" in response:
+            throttled["Retry-After"] = response["Retry-After"]
+        return throttled
 
     # -------------------------
     # Any other DRF exception
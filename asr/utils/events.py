@@ -0,0 +1,86 @@
+import json
+
+import redis
+from django.conf import settings
+
+from asr.utils.redis import get_async_redis, get_redis
+
+# per-job event log; entry ids are "<seq>-0" so replay is a plain XRANGE
+EVENTS_KEY = "asr:job:{job_id}:events"
+SEQ_KEY = "asr:job:{job_id}:seq"
+
+APPEND_EVENT_LUA = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], seq .. '-0', 'data', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return seq
+"""
+
+
+def job_group(job_id) -> str:
+    return f"job_{job_id}"
+
+
+def owner_group(application_id=None, user_id=None, session_key=None) -> str | None:
+    """
+    Channel-layer group carrying every job event of one owner. Application
+    jobs go to the application's group only, mirroring the REST scoping.
+    """
+    if application_id:
+        return f"app_{application_id}"
+    if user_id:
+        return f"user_{user_id}"
+    if session_key:
+        return f"sid_{session_key}"
+    return None
+
+
+def job_owner_group(job) -> str | None:
+    return owner_group(
+        application_id=job.application_id,
+        user_id=job.user_id,
+        session_key=job.session_key,
+    )
+
+
+def append_event_call(job_id, data: dict) -> tuple[list, list]:
+    """KEYS and ARGV for APPEND_EVENT_LUA."""
+    keys = [SEQ_KEY.format(job_id=job_id), EVENTS_KEY.format(job_id=job_id)]
+    args = [json.dumps(data), settings.ASR_JOB_EVENTS_TTL_SEC, settings.ASR_JOB_EVENTS_MAXLEN]
+    return keys, args
+
+
+def append_job_event(job_id, data: dict) -> int | None:
+    """Append an event to the job's log and return its sequence number."""
+    keys, args = append_event_call(job_id, data)
+    try:
+        return int(get_redis().eval(APPEND_EVENT_LUA, len(keys), *keys, *args))
+    except redis.RedisError:
+        return None
+
+
+def _parse_entries(entries) -> list[dict]:
+    events = []
+    for entry_id, fields in entries:
+        data = json.loads(fields[b"data"])
+        data["seq"] = int(entry_id.split(b"-")[0])
+        events.append(data)
+    return events
+
+
+async def read_job_events(job_id, after_seq: int = 0) -> list[dict]:
+    """Events with seq > after_seq, oldest first, each carrying its `seq`."""
+    entries = await get_async_redis().xrange(EVENTS_KEY.format(job_id=job_id), min=f"{after_seq + 1}-0")
+    return _parse_entries(entries)
+
+
+async def current_seq(job_id) -> int:
+    return int(await get_async_redis().get(SEQ_KEY.format(job_id=job_id)) or 0)
+
+
+async def wait_job_events(job_id, after_seq: int, timeout_sec: float) -> list[dict]:
+    """Block until events after `after_seq` exist or the timeout passes."""
+    key = EVENTS_KEY.format(job_id=job_id)
+    result = await get_async_redis().xread({key: f"{after_seq}-0"}, block=max(int(timeout_sec * 1000), 1))
+    return _parse_entries(result[0][1]) if result else []
@@ -0,0 +1,123 @@
+import csv
+import io
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from asr.models import Transcript
+
+JOB_COLUMNS = (
+    "id", "created_at", "status", "application_id", "audio_duration_sec", "words_count", "chars_count",
+    "processing_time_sec", "error_code", "cost_units", "plan",
+)
+USAGE_COLUMNS = (
+    "id", "job_id", "created_at", "application_id", "plan", "audio_duration_sec", "words_count",
+    "chars_count", "cost_units",
+)
+
+
+def job_rows(qs, include_text: bool):
+    """Export rows for an ASRJob queryset, read through a chunked cursor; transcripts come in the same query."""
+    fields = [
+        "id", "created_at", "status", "application_id", "audio_duration_sec", "words_count", "chars_count",
+        "processing_time_sec", "error_code", "usage__cost_units", "usage__plan_at_time__code",
+    ]
+    if include_text:
+        fields += ["transcript__codec", "transcript__data"]
+    for row in qs.values(*fields).iterator(chunk_size=settings.ASR_EXPORT_CHUNK_SIZE):
+        row["cost_units"] = row.pop("usage__cost_units")
+        row["plan"] = row.pop("usage__plan_at_time__code")
+        if include_text:
+            codec, data = row.pop("transcript__codec"), row.pop("transcript__data")
+            row["text"] = Transcript.decode(codec, data) if data is not None else None
+        yield row
+
+
+def usage_rows(qs):
+    """Export rows for a UsageLedger queryset, read through a chunked cursor."""
+    fields = [
+        "id", "job_id", "created_at", "application_id", "plan_at_time__code", "audio_duration_sec",
+        "words_count", "chars_count", "cost_units",
+    ]
+    for row in qs.values(*fields).iterator(chunk_size=settings.ASR_EXPORT_CHUNK_SIZE):
+        row["plan"] = row.pop("plan_at_time__code")
+        yield row
+
+
+def _ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+def _csv(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            key: value.isoformat() if hasattr(value, "isoformat") else value
+            for key, value in row.items()
+        })
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _buffered(lines, size: int = 64 * 1024):
+    """Join lines into chunks of about `size` bytes so each write to the client is worth it."""
+    parts, pending = [], 0
+    for line in lines:
+        data = line.encode("utf-8")
+        parts.append(data)
+        pending += len(data)
+        if pending >= size:
+            yield b"".join(parts)
+            parts, pending = [], 0
+    if parts:
+        yield b"".join(parts)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def _async_chunks(chunks):
+    # one sync thread for the whole export, so the DB cursor stays on the thread that opened it
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def export_response(request, rows, *, output: str, columns, filename: str, gzip: bool = False) -> StreamingHttpResponse:
+    """
+    Stream `rows` as NDJSON or CSV (optionally gzipped) without holding them in
+    memory. Under ASGI the rows are pulled through an async iterator, as Django
+    would otherwise buffer a sync iterator whole before sending it.
+    """
+    if output == "csv":
+        lines, content_type, filename = _csv(rows, columns), "text/csv; charset=utf-8", f"{filename}.csv"
+    else:
+        lines, content_type, filename = _ndjson(rows), "application/x-ndjson; charset=utf-8", f"{filename}.ndjson"
+    chunks = _buffered(lines)
+    if gzip:
+        chunks, content_type, filename = _gzipped(chunks), "application/gzip", f"{filename}.gz"
+    if isinstance(getattr(request, "_request", request), ASGIRequest):
+        chunks = _async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["X-Accel-Buffering"] = "no"
+    return response
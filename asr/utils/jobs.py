@@ -0,0 +1,46 @@
+from django.conf import settings
+
+from asr.models import ASRJob
+from asr.utils.capacity import estimate_job
+
+
+def job_status_payload(job: ASRJob) -> dict:
+    payload = {
+        "id": str(job.id),
+        "status": job.status,
+        "processing_seconds": job.processing_time_sec,
+        "audio": {
+            "duration_sec": job.audio_duration_sec,
+            "sample_rate": job.audio_sample_rate,
+            "channels": job.audio_channels,
+            "mime": job.audio_mime,
+        },
+        **estimate_job(job),
+    }
+    if job.status == "error":
+        payload["error"] = {
+            "code": job.error_code or "PROCESSING_FAILED",
+            "message": job.error_message_public or "Processing failed.",
+        }
+    return payload
+
+
+def job_result_url(job: ASRJob) -> str:
+    if job.application_id:
+        return f"/api/v1/asr/jobs/{job.id}/"
+    return f"/api/result/{job.id}/"
+
+
+def inline_text_fields(job: ASRJob) -> dict:
+    """
+    Transcript fields for pushed events. Long transcripts are not inlined:
+    the event carries a preview and the URL to fetch the full result from.
+    """
+    text = job.text or ""
+    if len(text) <= settings.ASR_WS_INLINE_TEXT_MAX_CHARS:
+        return {"text": text}
+    return {
+        "text_truncated": True,
+        "text_preview": text[:settings.ASR_WS_TEXT_PREVIEW_CHARS],
+        "result_url": job_result_url(job),
+    }
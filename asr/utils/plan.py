@@ -1,7 +1,16 @@
 from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
-from asr.models import Plan
+from asr.models import Plan, Subscription, UserProfile
+from asr.utils.cache import bus
+
+# every Plan row, by code and by id; small and read on every upload
+_plans = bus.cache("plans", 1, settings.ASR_PLAN_CACHE_TTL_SEC)
+# user id -> (plan id, valid until); a subscription plan is only valid until its ends_at
+_user_plans = bus.cache("user_plan", settings.ASR_USER_PLAN_CACHE_SIZE, settings.ASR_PLAN_CACHE_TTL_SEC)
 
 
 def _plan_defaults(code: str) -> dict:
@@ -14,25 +23,83 @@ def _plan_defaults(code: str) -> dict:
     }
 
 
+def _registry() -> dict:
+    registry = _plans.get("all")
+    if registry is None:
+        plans = list(Plan.objects.all())
+        registry = {
+            "by_code": {plan.code: plan for plan in plans},
+            "by_id": {plan.id: plan for plan in plans},
+        }
+        _plans.set("all", registry)
+    return registry
+
+
+def invalidate_plans() -> None:
+    _plans.invalidate_all()
+    _user_plans.invalidate_all()
+
+
+def invalidate_user_plan(user_id) -> None:
+    _user_plans.invalidate(str(user_id))
+
+
 def get_or_create_plan(code: str) -> Plan:
-    plan, _ = Plan.objects.get_or_create(code=code, defaults=_plan_defaults(code))
+    plan = _registry()["by_code"].get(code)
+    if plan is None:
+        plan, _ = Plan.objects.get_or_create(code=code, defaults=_plan_defaults(code))
     return plan
 
 
+def get_plan(code: str) -> Plan | None:
+    """The plan with this code, or None if there is none."""
+    return _registry()["by_code"].get(code)
+
+
 def resolve_plan_from_code(code: str, fallback: str = "anon") -> Plan:
     if not code:
         return get_or_create_plan(fallback)
-    plan = Plan.objects.filter(code=code).first()
+    plan = _registry()["by_code"].get(code)
     return plan if plan else get_or_create_plan(fallback)
 
 
+def _effective_plan(user_id) -> tuple:
+    """(plan id or None for free, datetime the answer stops being valid or None)."""
+    now = timezone.now()
+    sub = Subscription.objects.filter(user_id=user_id).values("plan_id", "is_active", "ends_at").first()
+    if sub and sub["is_active"] and sub["plan_id"]:
+        if sub["ends_at"] and sub["ends_at"] < now:
+            return None, None
+        return sub["plan_id"], sub["ends_at"]
+    profile_plan_id = UserProfile.objects.filter(user_id=user_id).values_list("plan_id", flat=True).first()
+    return profile_plan_id, None
+
+
+def users_on_plan(plan: Plan):
+    """
+    Ids of the users whose effective plan is `plan`, as a subquery. Mirrors
+    _effective_plan in SQL, for batch work that must not resolve users one by one.
+    """
+    free_id = get_or_create_plan("free").pk
+    now = timezone.now()
+    effective = Case(
+        When(
+            Q(subscription__is_active=True, subscription__plan__isnull=False)
+            & (Q(subscription__ends_at__isnull=True) | Q(subscription__ends_at__gte=now)),
+            then=F("subscription__plan_id"),
+        ),
+        When(subscription__is_active=True, subscription__plan__isnull=False, then=Value(free_id)),
+        default=Coalesce(F("profile__plan_id"), Value(free_id)),
+    )
+    return User.objects.annotate(effective_plan_id=effective).filter(effective_plan_id=plan.pk).values("pk")
+
+
 def resolve_user_plan(user) -> Plan:
-    sub = getattr(user, "subscription", None)
-    if sub and sub.is_active and sub.plan:
-        if sub.ends_at and sub.ends_at < timezone.now():
-            return get_or_create_plan("free")
-        return sub.plan
-    prof = getattr(user, "profile", None)
-    if prof and prof.plan:
-        return prof.plan
-    return get_or_create_plan("free")
+    key = str(user.pk)
+    cached = _user_plans.get(key)
+    if cached is None or (cached[1] is not None and cached[1] < timezone.now()):
+        cached = _effective_plan(user.pk)
+        _user_plans.set(key, cached)
+    plan_id, _ = cached
+    plan = _registry()["by_id"].get(plan_id) if plan_id else None
+    return plan if plan else get_or_create_plan("free")
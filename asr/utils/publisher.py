@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import defaultdict
+
+import redis
+import redis.asyncio as aioredis
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from asr.utils.events import APPEND_EVENT_LUA, append_event_call, job_group, job_owner_group
+
+logger = logging.getLogger(__name__)
+
+_publisher = None
+_publisher_pid = None
+_publisher_lock = threading.Lock()
+
+
+class EventPublisher:
+    """
+    Publishes job events from a worker process without an event-loop bridge
+    per event. Events are handed to a long-lived loop on a daemon thread that
+    owns its Redis connection; events emitted within ASR_EVENT_PUBLISH_LINGER_MS
+    of each other are appended to their logs in one pipeline and then fanned
+    out to the channel layer, in order per group.
+    """
+
+    def __init__(self, linger_sec: float, max_batch: int):
+        self.linger_sec = linger_sec
+        self.max_batch = max_batch
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="asr-event-publisher", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._inbox = asyncio.Queue()
+        self._redis = aioredis.Redis.from_url(settings.REDIS_URL)
+        self._append = self._redis.register_script(APPEND_EVENT_LUA)
+        self._channel_layer = get_channel_layer()
+        self._loop.create_task(self._consume())
+        self._ready.set()
+        self._loop.run_forever()
+
+    def publish(self, job, data: dict) -> None:
+        groups = [g for g in (job_group(job.id), job_owner_group(job)) if g]
+        self._loop.call_soon_threadsafe(self._inbox.put_nowait, (str(job.id), groups, data))
+
+    def flush(self, timeout: float | None = 5.0) -> None:
+        """Block until every event published so far has been delivered."""
+        asyncio.run_coroutine_threadsafe(self._inbox.join(), self._loop).result(timeout)
+
+    async def _consume(self):
+        while True:
+            batch = [await self._inbox.get()]
+            deadline = self._loop.time() + self.linger_sec
+            while len(batch) < self.max_batch:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._inbox.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._deliver(batch)
+            except Exception:
+                # a lost batch must not kill the publisher thread
+                logger.exception("Dropped a batch of %d job events", len(batch))
+            finally:
+                for _ in batch:
+                    self._inbox.task_done()
+
+    async def _deliver(self, batch):
+        seqs = [None] * len(batch)
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for job_id, _, data in batch:
+                keys, args = append_event_call(job_id, data)
+                await self._append(keys=keys, args=args, client=pipe)
+            seqs = await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Could not log a batch of %d job events; sending them without seq", len(batch), exc_info=True)
+
+        by_group = defaultdict(list)
+        for (job_id, groups, data), seq in zip(batch, seqs):
+            if seq is not None:
+                data = {**data, "seq": int(seq)}
+            message = {"type": "job_event", "job_id": job_id, "data": data}
+            for group in groups:
+                by_group[group].append(message)
+        results = await asyncio.gather(
+            *(self._send_group(g, messages) for g, messages in by_group.items()), return_exceptions=True
+        )
+        for (group, messages), result in zip(by_group.items(), results):
+            if isinstance(result, BaseException):
+                logger.error("Failed to send job events to group %s (%d in the batch)", group, len(messages),
+                             exc_info=result)
+
+    async def _send_group(self, group, messages):
+        for message in messages:
+            await self._channel_layer.group_send(group, message)
+
+
+def get_publisher() -> EventPublisher:
+    """Per-process publisher; recreated after fork so prefork children get their own thread."""
+    global _publisher, _publisher_pid
+    with _publisher_lock:
+        if _publisher is None or _publisher_pid != os.getpid():
+            _publisher = EventPublisher(
+                linger_sec=settings.ASR_EVENT_PUBLISH_LINGER_MS / 1000.0,
+                max_batch=settings.ASR_EVENT_PUBLISH_MAX_BATCH,
+            )
+            _publisher_pid = os.getpid()
+        return _publisher
+
+
+def flush_publisher(timeout: float | None = 5.0) -> None:
+    if _publisher is not None and _publisher_pid == os.getpid():
+        _publisher.flush(timeout)
@@ -0,0 +1,191 @@
+import uuid
+
+import redis
+from django.conf import settings
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from asr.utils.auth import get_request_sid
+from asr.utils.plan import resolve_user_plan
+from asr.utils.redis import get_redis
+
+BUCKET_KEY = "asr:ratelimit:{subject}"
+# members are job ids (or a request nonce until the job exists), scored by expiry time
+SLOTS_KEY = "asr:jobslots:{subject}"
+
+# KEYS: n bucket keys, then n slot keys.
+# ARGV: n, reserve ('1'/'0'), nonce, reserve ttl, job slot ttl, then per subject: rate/sec, burst, concurrent jobs.
+# Returns {allowed, limit, remaining, reset ms, retry ms, reason}.
+_RATE_LIMIT_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local n = tonumber(ARGV[1])
+local reserve = ARGV[2] == '1'
+local tokens = {}
+local limit, remaining, reset, retry = 0, -1, 0, 0
+for i = 1, n do
+  local rate = tonumber(ARGV[3 + i * 3])
+  local burst = tonumber(ARGV[4 + i * 3])
+  local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+  local level = tonumber(state[1]) or burst
+  local ts = tonumber(state[2]) or now
+  level = math.min(burst, level + math.max(now - ts, 0) * rate)
+  tokens[i] = level
+  if level < 1 then
+    retry = math.max(retry, (1 - level) / rate)
+  end
+  if remaining < 0 or level - 1 < remaining then
+    limit = burst
+    remaining = math.max(level - 1, 0)
+    reset = (burst - level + 1) / rate
+  end
+end
+if retry > 0 then
+  return {0, limit, 0, math.ceil(reset * 1000), math.ceil(retry * 1000), 'rate'}
+end
+if reserve then
+  for i = 1, n do
+    local cap = tonumber(ARGV[5 + i * 3])
+    redis.call('ZREMRANGEBYSCORE', KEYS[n + i], '-inf', now)
+    if cap > 0 and redis.call('ZCARD', KEYS[n + i]) >= cap then
+      return {0, limit, math.floor(remaining), math.ceil(reset * 1000), 0, 'concurrency'}
+    end
+  end
+  for i = 1, n do
+    redis.call('ZADD', KEYS[n + i], now + tonumber(ARGV[4]), ARGV[3])
+    redis.call('EXPIRE', KEYS[n + i], math.ceil(tonumber(ARGV[5])))
+  end
+end
+for i = 1, n do
+  local rate = tonumber(ARGV[3 + i * 3])
+  local burst = tonumber(ARGV[4 + i * 3])
+  redis.call('HSET', KEYS[i], 'tokens', tostring(tokens[i] - 1), 'ts', tostring(now))
+  redis.call('EXPIRE', KEYS[i], math.ceil(burst / rate) + 1)
+end
+return {1, limit, math.floor(remaining), math.ceil(reset * 1000), 0, ''}
+"""
+
+_CLAIM_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+for i = 1, #KEYS do
+  redis.call('ZREM', KEYS[i], ARGV[1])
+  redis.call('ZADD', KEYS[i], now + tonumber(ARGV[3]), ARGV[2])
+end
+return 1
+"""
+
+
+class ConcurrencyLimited(Throttled):
+    error_code = "CONCURRENCY_LIMITED"
+    public_message = "Too many jobs in progress for your plan. Please retry when one finishes."
+
+
+def _limits(plan_code: str) -> dict:
+    limits = settings.ASR_RATE_LIMITS
+    return limits.get(plan_code) or limits["free"]
+
+
+def request_subjects(request) -> list[str]:
+    """Rate-limit subjects for a request: the application and its owner, the user, or the anonymous session."""
+    application = getattr(request, "application", None)
+    if application is not None:
+        return [f"app:{application.id}", f"user:{application.owner_id}"]
+    if request.user and request.user.is_authenticated:
+        return [f"user:{request.user.pk}"]
+    sid = get_request_sid(request)
+    if sid:
+        return [f"sid:{sid}"]
+    return [f"ip:{request.META.get('REMOTE_ADDR', '')}"]
+
+
+def job_subjects(job) -> list[str]:
+    if job.application_id:
+        return [f"app:{job.application_id}", f"user:{job.user_id}"]
+    if job.user_id:
+        return [f"user:{job.user_id}"]
+    return [f"sid:{job.session_key}"]
+
+
+class PlanRateThrottle(BaseThrottle):
+    """
+    Token bucket per subject with the rate and burst of the caller's plan,
+    checked and consumed for all subjects in one Lua call. Views that set
+    `reserves_job_slot = True` also take one of the plan's concurrent-job
+    slots on POST, in the same call; the view hands it to the created job
+    with claim_job_slot() and the worker frees it with release_job_slot().
+    Fails open if Redis is unavailable.
+    """
+
+    def allow_request(self, request, view):
+        application = getattr(request, "application", None)
+        if application is not None:
+            plan_code = resolve_user_plan(application.owner).code
+        elif request.user and request.user.is_authenticated:
+            plan_code = resolve_user_plan(request.user).code
+        else:
+            plan_code = "anon"
+        limits = _limits(plan_code)
+        subjects = request_subjects(request)
+        reserve = getattr(view, "reserves_job_slot", False) and request.method == "POST"
+        nonce = uuid.uuid4().hex
+
+        keys = [BUCKET_KEY.format(subject=s) for s in subjects] + [SLOTS_KEY.format(subject=s) for s in subjects]
+        args = [len(subjects), "1" if reserve else "0", nonce,
+                settings.ASR_JOB_SLOT_RESERVE_SEC, settings.ASR_JOB_SLOT_TTL_SEC]
+        for _ in subjects:
+            args += [limits["requests_per_min"] / 60.0, limits["burst"], limits["concurrent_jobs"]]
+        try:
+            allowed, limit, remaining, reset_ms, retry_ms, reason = get_redis().eval(
+                _RATE_LIMIT_LUA, len(keys), *keys, *args
+            )
+        except redis.RedisError:
+            return True
+
+        request._request.rate_limit = {"limit": limit, "remaining": remaining, "reset": -(-reset_ms // 1000)}
+        if reason == b"concurrency":
+            raise ConcurrencyLimited(wait=settings.ASR_CONCURRENCY_RETRY_SEC)
+        if reserve and allowed:
+            request._request.job_slot = {"keys": keys[len(subjects):], "nonce": nonce}
+        self.retry_sec = retry_ms / 1000.0
+        return bool(allowed)
+
+    def wait(self):
+        return self.retry_sec
+
+
+def claim_job_slot(request, job_id) -> None:
+    """Turn the slot reserved by PlanRateThrottle into one held by `job_id`."""
+    slot = getattr(request._request, "job_slot", None)
+    if not slot:
+        return
+    try:
+        get_redis().eval(_CLAIM_LUA, len(slot["keys"]), *slot["keys"],
+                         slot["nonce"], str(job_id), settings.ASR_JOB_SLOT_TTL_SEC)
+    except redis.RedisError:
+        pass
+    slot["claimed"] = True
+
+
+def release_request_slot(request) -> None:
+    """Free a reserved slot that no job claimed, e.g. when the upload was rejected."""
+    slot = getattr(request, "job_slot", None)
+    if not slot or slot.get("claimed"):
+        return
+    try:
+        pipe = get_redis().pipeline()
+        for key in slot["keys"]:
+            pipe.zrem(key, slot["nonce"])
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def release_job_slot(job) -> None:
+    try:
+        pipe = get_redis().pipeline()
+        for subject in job_subjects(job):
+            pipe.zrem(SLOTS_KEY.format(subject=subject), str(job.id))
+        pipe.execute()
+    except redis.RedisError:
+        pass
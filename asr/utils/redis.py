@@ -0,0 +1,36 @@
+import asyncio
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+_client = None
+# one async client per event loop: its connections only work on the loop that opened them
+_async_clients = {}
+
+
+def get_redis() -> redis.Redis:
+    """
+    Shared Redis client for gateway bookkeeping (metrics, budgets, caches).
+
+    redis-py pools are fork-aware, so the client is safe to create lazily in
+    both web processes and prefork Celery workers.
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Redis client for async consumers and views, bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        # drop the clients of finished loops (e.g. from async_to_sync) so their pools are freed
+        # with the loop, instead of replacing a client another live loop may still be using
+        for other in list(_async_clients):
+            if other.is_closed():
+                _async_clients.pop(other, None)
+        client = _async_clients[loop] = aioredis.Redis.from_url(settings.REDIS_URL)
+    return client
@@ -0,0 +1,147 @@
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from asr.models import Application, UsageLedger, UsageRollup
+
+OVERVIEW_KEY = "asr:usage:overview:user:{user_id}"
+SUMMARY_KEY = "asr:usage:summary:{subject}"
+BY_APP_KEY = "asr:usage:apps:user:{user_id}"
+HISTORY_TOTAL_KEY = "asr:history:total:{subject}"
+
+
+def _cached(key: str, compute):
+    try:
+        value = cache.get(key)
+    except redis.RedisError:
+        return compute()
+    if value is None:
+        value = compute()
+        try:
+            cache.set(key, value, settings.ASR_USAGE_REPORT_CACHE_SEC)
+        except redis.RedisError:
+            pass
+    return value
+
+
+def _totals(agg: dict) -> dict:
+    return {
+        "total_cost_units": float(agg["total_cost"] or 0),
+        "total_audio_sec": float(agg["total_sec"] or 0),
+        "total_words": int(agg["total_words"] or 0),
+    }
+
+
+def dashboard_overview(user) -> dict:
+    """
+    Totals of the user's own (non-application) usage, one query on the ledger,
+    which outlives purged jobs; jobs_count counts the billed jobs still kept.
+    """
+    def compute():
+        agg = UsageLedger.objects.filter(user=user, application__isnull=True).aggregate(
+            total_cost=Sum("cost_units"),
+            total_sec=Sum("audio_duration_sec"),
+            total_words=Sum("words_count"),
+            jobs_count=Count("job_id"),
+        )
+        return {**_totals(agg), "jobs_count": agg["jobs_count"]}
+    return _cached(OVERVIEW_KEY.format(user_id=user.pk), compute)
+
+
+def usage_summary(user=None, session_key=None) -> dict:
+    """Ledger totals and row count for a user or anonymous session, one query."""
+    if user is not None:
+        subject, qs = f"user:{user.pk}", UsageLedger.objects.filter(user=user, application__isnull=True)
+    else:
+        subject, qs = f"sid:{session_key}", UsageLedger.objects.filter(session_key=session_key, application__isnull=True)
+
+    def compute():
+        agg = qs.aggregate(
+            total_cost=Sum("cost_units"),
+            total_sec=Sum("audio_duration_sec"),
+            total_words=Sum("words_count"),
+            count=Count("id"),
+        )
+        return {**_totals(agg), "count": agg["count"]}
+    return _cached(SUMMARY_KEY.format(subject=subject), compute)
+
+
+def usage_by_application(user) -> list[dict]:
+    """Totals for every application the user owns, grouped in one query."""
+    def compute():
+        rows = (
+            Application.objects.filter(owner=user)
+            .annotate(
+                total_cost=Sum("usage_ledger__cost_units"),
+                total_sec=Sum("usage_ledger__audio_duration_sec"),
+                total_words=Sum("usage_ledger__words_count"),
+            )
+            .order_by("name")
+            .values("id", "name", "total_cost", "total_sec", "total_words")
+        )
+        return [{"app_id": str(row["id"]), "app_name": row["name"], **_totals(row)} for row in rows]
+    return _cached(BY_APP_KEY.format(user_id=user.pk), compute)
+
+
+def history_total(subject: str, qs) -> int:
+    """Row count of a history queryset, cached so paging does not COUNT the whole history each time."""
+    return _cached(HISTORY_TOTAL_KEY.format(subject=subject), qs.count)
+
+
+def usage_timeseries(subject: str, granularity: str, start, end, plan_id=None) -> list[dict]:
+    """
+    Usage per hour or day bucket in [start, end), summed over plans (or for
+    one plan), from the pre-aggregated rollups with empty buckets filled in.
+    `start` and `end` must be bucket boundaries. One query on the rollup key.
+    """
+    qs = UsageRollup.objects.filter(
+        subject=subject, granularity=granularity, bucket_start__gte=start, bucket_start__lt=end
+    )
+    if plan_id is not None:
+        qs = qs.filter(plan_id=plan_id)
+    rows = {
+        row["bucket_start"]: row
+        for row in qs.values("bucket_start").annotate(
+            total_sec=Sum("audio_duration_sec"),
+            total_words=Sum("words_count"),
+            total_chars=Sum("chars_count"),
+            total_cost=Sum("cost_units"),
+            total_jobs=Sum("jobs_count"),
+        ).order_by()
+    }
+    step = timedelta(days=1) if granularity == UsageRollup.DAY else timedelta(hours=1)
+    points = []
+    bucket = start
+    while bucket < end:
+        row = rows.get(bucket, {})
+        points.append({
+            "bucket_start": bucket,
+            "audio_duration_sec": float(row.get("total_sec") or 0),
+            "words_count": int(row.get("total_words") or 0),
+            "chars_count": int(row.get("total_chars") or 0),
+            "cost_units": float(row.get("total_cost") or 0),
+            "jobs_count": int(row.get("total_jobs") or 0),
+        })
+        bucket += step
+    return points
+
+
+def invalidate_usage_reports(user_id=None, application_id=None, session_key=None) -> None:
+    """Drop the cached reports a ledger write for this job owner changes."""
+    keys = []
+    if user_id and application_id:
+        keys.append(BY_APP_KEY.format(user_id=user_id))
+    elif user_id:
+        keys += [OVERVIEW_KEY.format(user_id=user_id), SUMMARY_KEY.format(subject=f"user:{user_id}"),
+                 HISTORY_TOTAL_KEY.format(subject=f"user:{user_id}")]
+    elif session_key:
+        keys += [SUMMARY_KEY.format(subject=f"sid:{session_key}"), HISTORY_TOTAL_KEY.format(subject=f"sid:{session_key}")]
+    if not keys:
+        return
+    try:
+        cache.delete_many(keys)
+    except redis.RedisError:
+        pass
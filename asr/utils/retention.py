@@ -0,0 +1,99 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from asr.models import ASRJob, Plan, Transcript
+from asr.utils.plan import get_or_create_plan, users_on_plan
+from asr.utils.reports import invalidate_usage_reports
+
+FINISHED_STATUSES = ("done", "error")
+
+
+def _cutoff(retention_days, now):
+    return now - timedelta(days=retention_days) if retention_days else None
+
+
+def _archive_file(archive_dir: str, now):
+    os.makedirs(archive_dir, exist_ok=True)
+    return gzip.open(os.path.join(archive_dir, f"asrjob-{now:%Y%m%dT%H%M%S}.ndjson.gz"), "at", encoding="utf-8")
+
+
+def _expired_querysets(now) -> list:
+    """One queryset of expired jobs per plan with a retention limit, plus one for anonymous sessions."""
+    base = ASRJob.objects.filter(application__isnull=True, status__in=FINISHED_STATUSES)
+    querysets = [
+        base.filter(user__in=users_on_plan(plan), created_at__lt=_cutoff(plan.history_retention_days, now))
+        for plan in Plan.objects.filter(history_retention_days__gt=0)
+    ]
+    anon_cutoff = _cutoff(get_or_create_plan("anon").history_retention_days, now)
+    if anon_cutoff:
+        querysets.append(base.filter(user__isnull=True, session_key__isnull=False, created_at__lt=anon_cutoff))
+    return querysets
+
+
+def purge_expired_jobs(batch_size: int | None = None, max_seconds: float | None = None,
+                       pause_sec: float | None = None, archive_dir: str | None = None) -> dict:
+    """
+    Delete finished jobs that history already hides: a user's own jobs older
+    than their current plan's history_retention_days, and anonymous-session
+    jobs older than the anon plan's. Application jobs are left alone.
+
+    Expired jobs are selected in SQL, one pass per plan, so jobs that are
+    kept are never read. Each pass deletes primary-key batches, each in its
+    own short transaction with a pause after it, until nothing is left or
+    `max_seconds` have passed (the next run carries on). Ledger rows are kept
+    for billing, their job set to null. With `archive_dir` each batch is
+    first appended to a gzipped NDJSON file there.
+    """
+    batch_size = batch_size or settings.ASR_RETENTION_PURGE_BATCH_SIZE
+    max_seconds = settings.ASR_RETENTION_PURGE_MAX_SEC if max_seconds is None else max_seconds
+    pause_sec = settings.ASR_RETENTION_PURGE_PAUSE_SEC if pause_sec is None else pause_sec
+    archive_dir = settings.ASR_RETENTION_ARCHIVE_DIR if archive_dir is None else archive_dir
+
+    started = time.monotonic()
+    now = timezone.now()
+    stats = {"deleted": 0, "archived": 0, "batches": 0, "complete": True}
+    archive = None
+    try:
+        for expired in _expired_querysets(now):
+            expired = expired.order_by("pk")
+            last_pk = None
+            while True:
+                if time.monotonic() - started >= max_seconds:
+                    stats["complete"] = False
+                    return {**stats, "seconds": round(time.monotonic() - started, 3)}
+                batch = expired if last_pk is None else expired.filter(pk__gt=last_pk)
+                rows = list(batch.values("pk", "user_id", "session_key")[:batch_size])
+                if not rows:
+                    break
+                last_pk = rows[-1]["pk"]
+                ids = [row["pk"] for row in rows]
+                with transaction.atomic():
+                    if archive_dir:
+                        archive = archive or _archive_file(archive_dir, now)
+                        texts = {t.job_id: t.get_text() for t in Transcript.objects.filter(job_id__in=ids)}
+                        for job in ASRJob.objects.filter(pk__in=ids).values():
+                            job["text"] = texts.get(job["id"])
+                            archive.write(json.dumps(job, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n")
+                            stats["archived"] += 1
+                        archive.flush()
+                    ASRJob.objects.filter(pk__in=ids).delete()
+                stats["deleted"] += len(ids)
+                stats["batches"] += 1
+                for user_id, session_key in {(row["user_id"], row["session_key"]) for row in rows}:
+                    invalidate_usage_reports(user_id, session_key=session_key)
+                if len(rows) < batch_size:
+                    break
+                # let other writers in between batches
+                time.sleep(pause_sec)
+    finally:
+        if archive is not None:
+            archive.close()
+    return {**stats, "seconds": round(time.monotonic() - started, 3)}
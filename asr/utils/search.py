@@ -0,0 +1,131 @@
+import re
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import APIException
+
+from asr.models import Transcript, TranscriptSearch
+
+FTS_TABLE = "asr_transcriptsearch_fts"
+SNIPPET_CHARS = 160
+
+_CHAR_MAP = str.maketrans({
+    "\u064a": "\u06cc",  # Arabic yeh -> Persian yeh
+    "\u0649": "\u06cc",  # alef maksura -> Persian yeh
+    "\u0643": "\u06a9",  # Arabic kaf -> keheh
+    "\u200c": "",  # ZWNJ: mi<ZWNJ>shavad and the unjoined mishavad are one word
+    **{chr(0x06f0 + d): str(d) for d in range(10)},  # Persian digits
+    **{chr(0x0660 + d): str(d) for d in range(10)},  # Arabic-Indic digits
+})
+# harakat, superscript alef and tatweel carry no meaning for search
+_STRIP = re.compile("[\u064b-\u065f\u0670\u0640]")
+
+
+def normalize_persian(text: str) -> str:
+    """Fold the Persian/Arabic spelling variants that users type interchangeably, for indexing and querying alike."""
+    return _STRIP.sub("", text.translate(_CHAR_MAP)).lower()
+
+
+class SearchUnavailable(APIException):
+    status_code = 503
+    default_detail = "Transcript search is not available on this server."
+    default_code = "search_unavailable"
+
+
+def search_document(text: str) -> str:
+    """
+    Indexed form of a transcript: its normalized text, followed by the parts of
+    every ZWNJ compound, so "mi<ZWNJ>shavad" matches both "mishavad" and "mi shavad".
+    """
+    parts = " ".join(word.replace("\u200c", " ") for word in text.split() if "\u200c" in word)
+    return f"{normalize_persian(text)} {normalize_persian(parts)}".strip()
+
+
+_fts_ready = False
+
+
+def search_available() -> bool:
+    """
+    True if transcripts can be indexed and searched: always on PostgreSQL; on
+    SQLite only if the FTS5 index table exists and the FTS5 module can read it
+    (the migration skips the table on builds without FTS5).
+    """
+    global _fts_ready
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor != "sqlite":
+        return False
+    if not _fts_ready:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT rowid FROM {FTS_TABLE} LIMIT 0")
+        except DatabaseError:
+            return False
+        _fts_ready = True
+    return True
+
+
+def _write_document(entry_id: int, document: str) -> None:
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"UPDATE {TranscriptSearch._meta.db_table} SET document = to_tsvector('simple', %s) WHERE id = %s",
+                [document, entry_id],
+            )
+        else:
+            # delete first: a row left behind by a deleted entry may hold this id
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [entry_id])
+            cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, document) VALUES (%s, %s)", [entry_id, document])
+
+
+def index_transcript(job) -> None:
+    """
+    Add or refresh the search entry of a finished user or session job. Call it
+    when the job completes. Indexing is best effort: a failure leaves the job
+    unsearchable until `manage.py rebuild_search_index`, never fails the job.
+    """
+    if not search_available() or job.application_id or job.status != "done":
+        return
+    document = search_document(job.text or "")
+    try:
+        with transaction.atomic():
+            if not document:
+                TranscriptSearch.objects.filter(job=job).delete()
+                return
+            entry, _ = TranscriptSearch.objects.update_or_create(job=job, defaults={
+                "user_id": job.user_id,
+                "session_key": job.session_key,
+                "created_at": job.created_at,
+            })
+            _write_document(entry.pk, document)
+    except DatabaseError:
+        pass
+
+
+def search_transcripts(qs, query: str):
+    """Narrow a TranscriptSearch queryset to entries containing every word of `query`."""
+    terms = normalize_persian(query).split()
+    if not terms:
+        return qs.none()
+    if connection.vendor == "postgresql":
+        return qs.filter(RawSQL(
+            f"{TranscriptSearch._meta.db_table}.document @@ plainto_tsquery('simple', %s)",
+            [" ".join(terms)],
+            output_field=BooleanField(),
+        ))
+    match = " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+    return qs.filter(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+
+
+def transcript_snippets(job_ids, query: str) -> dict:
+    """job id -> a short excerpt of its normalized transcript around the first query word."""
+    terms = normalize_persian(query).split()
+    snippets = {}
+    for transcript in Transcript.objects.filter(job_id__in=job_ids):
+        text = " ".join(normalize_persian(transcript.get_text()).split())
+        hits = [pos for pos in (text.find(term) for term in terms) if pos >= 0]
+        start = max(min(hits, default=0) - SNIPPET_CHARS // 3, 0)
+        snippet = text[start:start + SNIPPET_CHARS]
+        snippets[transcript.job_id] = ("…" if start else "") + snippet + ("…" if start + SNIPPET_CHARS < len(text) else "")
+    return snippets
@@ -1,9 +1,61 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from asr.models import UserProfile, Profile
+from asr.models import ApiToken, Application, ASRJob, Plan, Subscription, UserProfile, Profile
+from asr.utils.auth import invalidate_api_token, invalidate_auth_user
+from asr.utils.plan import invalidate_plans, invalidate_user_plan
+from asr.utils.reports import invalidate_usage_reports
 
 @receiver(post_save, sender=User)
 def ensure_profile(sender, instance, created, **kwargs):
     UserProfile.objects.get_or_create(user=instance)
     Profile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_auth_user(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_auth_user(instance.pk))
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def evict_auth_profile(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_auth_user(instance.user_id))
+    transaction.on_commit(lambda: invalidate_user_plan(instance.user_id))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def evict_user_plan(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_user_plan(instance.user_id))
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def evict_plans(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_plans)
+
+
+@receiver(post_save, sender=ApiToken)
+def evict_revoked_api_token(sender, instance, **kwargs):
+    if instance.revoked_at is not None:
+        transaction.on_commit(lambda: invalidate_api_token(instance.token_hash))
+
+
+@receiver(post_delete, sender=ApiToken)
+def evict_deleted_api_token(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_api_token(instance.token_hash))
+
+
+@receiver(post_save, sender=Application)
+@receiver(post_delete, sender=Application)
+def evict_usage_by_application(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_usage_reports(instance.owner_id, instance.pk))
+
+
+@receiver(post_save, sender=ASRJob)
+def evict_dashboard_overview(sender, instance, created, **kwargs):
+    if created and not instance.application_id and (instance.user_id or instance.session_key):
+        transaction.on_commit(lambda: invalidate_usage_reports(instance.user_id, session_key=instance.session_key))
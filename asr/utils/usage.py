@@ -0,0 +1,268 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied
+
+from asr.models import UsageCounter, UsageLedger, UsageReservation, UsageRollup
+from asr.utils.reports import invalidate_usage_reports
+
+COUNTER_FIELDS = ("audio_duration_sec", "words_count", "chars_count", "cost_units")
+
+
+def usage_subject(user_id=None, application_id=None, session_key=None) -> str | None:
+    """Counter subject matching how quotas are scoped: per application, else per user, else per anonymous session."""
+    if application_id:
+        return f"app:{application_id}"
+    if user_id:
+        return f"user:{user_id}"
+    if session_key:
+        return f"sid:{session_key}"
+    return None
+
+
+def usage_period(at=None) -> date:
+    return (at or timezone.now()).date().replace(day=1)
+
+
+def monthly_usage_seconds(subject: str | None) -> float:
+    """Audio seconds billed or reserved for `subject` this month; one lookup on the (subject, period) key."""
+    if not subject:
+        return 0.0
+    used = UsageCounter.objects.filter(subject=subject, period=usage_period()).values_list(
+        F("audio_duration_sec") + F("reserved_seconds"), flat=True
+    ).first()
+    return float(used or 0)
+
+
+def _upsert_add(model, lookup: dict, deltas: dict) -> None:
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # created concurrently by another ledger write
+        model.objects.filter(**lookup).update(**updates)
+
+
+def _increment_counter(subject: str, period: date, deltas: dict) -> None:
+    _upsert_add(UsageCounter, {"subject": subject, "period": period}, deltas)
+
+
+def rollup_bucket(at: datetime, granularity: str) -> datetime:
+    """Start of the UTC hour or day containing `at`."""
+    at = at.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0) if granularity == UsageRollup.DAY else at
+
+
+def _increment_rollups(subject: str, plan_id, at: datetime, deltas: dict) -> None:
+    for granularity in (UsageRollup.HOUR, UsageRollup.DAY):
+        _upsert_add(UsageRollup, {
+            "subject": subject,
+            "granularity": granularity,
+            "bucket_start": rollup_bucket(at, granularity),
+            "plan_id": plan_id,
+        }, deltas)
+
+
+def record_usage(job, plan, *, audio_duration_sec: float, words_count: int, chars_count: int,
+                 cost_units: float, accumulate: bool = False) -> None:
+    """
+    Write the job's UsageLedger row and apply the same change to its monthly
+    UsageCounter and hourly/daily UsageRollup rows in one transaction. By default the values replace what the
+    ledger row held (a retried job is not billed twice); with `accumulate`
+    they are added to it, as streaming sessions bill utterance by utterance.
+    Any quota reserved for the job is released in the same transaction: all of
+    it, or with `accumulate` just the seconds billed.
+    """
+    values = {
+        "audio_duration_sec": float(audio_duration_sec or 0),
+        "words_count": int(words_count or 0),
+        "chars_count": int(chars_count or 0),
+        "cost_units": float(cost_units or 0),
+    }
+    with transaction.atomic():
+        ledger = UsageLedger.objects.select_for_update().filter(job=job).first()
+        if ledger is None:
+            ledger = UsageLedger.objects.create(
+                job=job,
+                user_id=job.user_id,
+                application_id=job.application_id,
+                session_key=job.session_key,
+                plan_at_time=plan,
+                **values,
+            )
+            deltas = {**values, "jobs_count": 1}
+            rollups = [(plan.pk, deltas)]
+        elif accumulate:
+            UsageLedger.objects.filter(pk=ledger.pk).update(
+                **{field: F(field) + value for field, value in values.items()}
+            )
+            deltas = values
+            rollups = [(ledger.plan_at_time_id, deltas)]
+        else:
+            deltas = {field: value - getattr(ledger, field) for field, value in values.items()}
+            if ledger.plan_at_time_id == plan.pk:
+                rollups = [(plan.pk, deltas)]
+            else:
+                # rebilled under another plan: move the job between the plans' buckets
+                rollups = [
+                    (ledger.plan_at_time_id, {**{field: -getattr(ledger, field) for field in values}, "jobs_count": -1}),
+                    (plan.pk, {**values, "jobs_count": 1}),
+                ]
+            for field, value in values.items():
+                setattr(ledger, field, value)
+            ledger.plan_at_time = plan
+            ledger.save(update_fields=[*values, "plan_at_time"])
+
+        subject = usage_subject(ledger.user_id, ledger.application_id, ledger.session_key)
+        if subject:
+            _increment_counter(subject, usage_period(ledger.created_at), deltas)
+            for plan_id, rollup_deltas in rollups:
+                _increment_rollups(subject, plan_id, ledger.created_at, rollup_deltas)
+        _release_reservation(job, values["audio_duration_sec"] if accumulate else None)
+        transaction.on_commit(
+            lambda: invalidate_usage_reports(ledger.user_id, ledger.application_id, ledger.session_key)
+        )
+
+
+class MonthlyLimitExceeded(PermissionDenied):
+    error_code = "MONTHLY_LIMIT_EXCEEDED"
+    public_message = "Monthly seconds limit reached for your plan."
+
+
+def _hold_quota(subject: str, period: date, seconds: float, limit: float) -> bool:
+    return bool(UsageCounter.objects.filter(
+        subject=subject,
+        period=period,
+        audio_duration_sec__lte=float(limit) - seconds - F("reserved_seconds"),
+    ).update(reserved_seconds=F("reserved_seconds") + seconds))
+
+
+def reserve_usage(job, seconds: float, limit: float) -> None:
+    """
+    Hold `seconds` of the job's monthly quota until it is billed or refunded.
+    The check and the hold are one conditional UPDATE on the period counter,
+    so concurrent uploads cannot overshoot `limit` together. Call it in the
+    transaction that creates the job; raises MonthlyLimitExceeded.
+    """
+    subject = usage_subject(job.user_id, job.application_id, job.session_key)
+    if not subject:
+        return
+    period = usage_period()
+    seconds = float(seconds)
+
+    if not _hold_quota(subject, period, seconds, limit):
+        # maybe the first use this period: make sure the counter exists and try once more.
+        # A concurrent upload may have created it first, so the retry decides either way.
+        UsageCounter.objects.get_or_create(subject=subject, period=period)
+        if not _hold_quota(subject, period, seconds, limit):
+            raise MonthlyLimitExceeded()
+    UsageReservation.objects.create(
+        job=job,
+        subject=subject,
+        period=period,
+        seconds=seconds,
+        expires_at=timezone.now() + timedelta(seconds=settings.ASR_USAGE_RESERVATION_TTL_SEC),
+    )
+
+
+def top_up_usage(job, seconds: float, limit: float) -> None:
+    """
+    Hold `seconds` more of the job's monthly quota on top of its reservation,
+    as streaming sessions do while they run (their billing draws the
+    reservation down utterance by utterance). Raises MonthlyLimitExceeded.
+    """
+    seconds = float(seconds)
+    with transaction.atomic():
+        reservation = UsageReservation.objects.select_for_update().filter(job=job).first()
+        if reservation is None:
+            reserve_usage(job, seconds, limit)
+            return
+        if not _hold_quota(reservation.subject, reservation.period, seconds, limit):
+            raise MonthlyLimitExceeded()
+        UsageReservation.objects.filter(pk=reservation.pk).update(seconds=F("seconds") + seconds)
+
+
+def _release_reservation(job, seconds: float | None = None) -> None:
+    """Release the job's reservation, or only `seconds` of it."""
+    reservation = UsageReservation.objects.select_for_update().filter(job=job).first()
+    if reservation is None:
+        return
+    if seconds is not None and seconds < reservation.seconds:
+        UsageCounter.objects.filter(subject=reservation.subject, period=reservation.period).update(
+            reserved_seconds=F("reserved_seconds") - seconds
+        )
+        UsageReservation.objects.filter(pk=reservation.pk).update(seconds=F("seconds") - seconds)
+        return
+    UsageCounter.objects.filter(subject=reservation.subject, period=reservation.period).update(
+        reserved_seconds=F("reserved_seconds") - reservation.seconds
+    )
+    reservation.delete()
+
+
+def refund_usage(job) -> None:
+    """Give back the quota held for a job that failed or will never run."""
+    with transaction.atomic():
+        _release_reservation(job)
+
+
+def expire_usage_reservations(batch_size: int = 500) -> int:
+    """Refund reservations held past their expiry, e.g. by jobs lost with a crashed worker."""
+    expired = 0
+    while True:
+        job_ids = list(UsageReservation.objects.filter(expires_at__lt=timezone.now())
+                       .values_list("job_id", flat=True)[:batch_size])
+        for job_id in job_ids:
+            with transaction.atomic():
+                _release_reservation(job_id)
+        expired += len(job_ids)
+        if len(job_ids) < batch_size:
+            return expired
+
+
+def rebuild_usage_rollups(granularity: str, start: datetime, end: datetime) -> int:
+    """
+    Recompute the `granularity` rollups whose buckets start in [start, end)
+    from the ledger and replace the stored rows, so running it again (or
+    over buckets the ledger writer already maintains) changes nothing.
+    `start` and `end` should be bucket boundaries. Returns the rows written.
+    """
+    trunc = TruncDay if granularity == UsageRollup.DAY else TruncHour
+    rows = (
+        UsageLedger.objects.filter(created_at__gte=start, created_at__lt=end)
+        .annotate(bucket=trunc("created_at", tzinfo=dt_timezone.utc))
+        .values("bucket", "user_id", "application_id", "session_key", "plan_at_time_id")
+        .annotate(
+            audio_duration_sec=Sum("audio_duration_sec"),
+            words_count=Sum("words_count"),
+            chars_count=Sum("chars_count"),
+            cost_units=Sum("cost_units"),
+            jobs_count=Count("id"),
+        )
+        .order_by()
+    )
+    buckets = {}
+    for row in rows:
+        subject = usage_subject(row["user_id"], row["application_id"], row["session_key"])
+        if not subject:
+            continue
+        key = (subject, row["bucket"], row["plan_at_time_id"])
+        totals = buckets.setdefault(key, dict.fromkeys((*COUNTER_FIELDS, "jobs_count"), 0))
+        for field in totals:
+            totals[field] += row[field] or 0
+
+    with transaction.atomic():
+        UsageRollup.objects.filter(
+            granularity=granularity, bucket_start__gte=start, bucket_start__lt=end
+        ).delete()
+        UsageRollup.objects.bulk_create([
+            UsageRollup(subject=subject, granularity=granularity, bucket_start=bucket, plan_id=plan_id, **totals)
+            for (subject, bucket, plan_id), totals in buckets.items()
+        ], batch_size=1000)
+    return len(buckets)
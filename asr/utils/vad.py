@@ -0,0 +1,122 @@
+import io
+import math
+import sys
+import warnings
+import wave
+from array import array
+from collections import deque
+from dataclasses import dataclass
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop  # C implementation; pydub depends on it too
+    except ImportError:  # Python 3.13+ without audioop-lts
+        audioop = None
+
+SAMPLE_WIDTH = 2  # 16-bit PCM
+
+
+@dataclass
+class Utterance:
+    pcm: bytes
+    start_sec: float
+    end_sec: float
+
+    @property
+    def duration_sec(self) -> float:
+        return self.end_sec - self.start_sec
+
+
+def _rms(frame: bytes) -> float:
+    if audioop is not None:
+        if sys.byteorder == "big":
+            frame = audioop.byteswap(frame, SAMPLE_WIDTH)
+        return float(audioop.rms(frame, SAMPLE_WIDTH))
+    samples = array("h", frame)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buf.getvalue()
+
+
+class UtteranceSegmenter:
+    """
+    Energy-based VAD over mono 16-bit little-endian PCM. Speech starts when a
+    frame's RMS exceeds `threshold`; an utterance closes after `silence_ms` of
+    quiet or once it reaches `max_utterance_sec`. A short pre-roll keeps the
+    onset that preceded the first loud frame.
+    """
+
+    def __init__(self, sample_rate: int, threshold: float, silence_ms: int = 600,
+                 max_utterance_sec: float = 15.0, frame_ms: int = 30, preroll_ms: int = 300):
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.frame_bytes = int(sample_rate * frame_ms / 1000) * SAMPLE_WIDTH
+        self.silence_frames = max(silence_ms // frame_ms, 1)
+        self.max_frames = int(max_utterance_sec * 1000 / frame_ms)
+        self._preroll = deque(maxlen=max(preroll_ms // frame_ms, 0))
+        self._buffer = b""
+        self._frames = []
+        self._quiet = 0
+        self._start_frame = 0
+        self._frame_index = 0
+
+    @property
+    def received_sec(self) -> float:
+        return self._seconds(self._frame_index)
+
+    def _seconds(self, frame_index: int) -> float:
+        return frame_index * self.frame_bytes / SAMPLE_WIDTH / self.sample_rate
+
+    def _close(self) -> Utterance:
+        # drop the trailing silence that closed the utterance
+        frames = self._frames[:len(self._frames) - self._quiet] if self._quiet else self._frames
+        end = self._start_frame + len(frames)
+        utterance = Utterance(b"".join(frames), self._seconds(self._start_frame), self._seconds(end))
+        self._frames = []
+        self._quiet = 0
+        return utterance
+
+    def feed(self, pcm: bytes) -> list[Utterance]:
+        """Consume audio and return the utterances it closed, oldest first."""
+        closed = []
+        data = self._buffer + pcm
+        offset = 0
+        while len(data) - offset >= self.frame_bytes:
+            frame = data[offset:offset + self.frame_bytes]
+            offset += self.frame_bytes
+            loud = _rms(frame) >= self.threshold
+            if not self._frames:
+                if loud:
+                    self._start_frame = self._frame_index - len(self._preroll)
+                    self._frames = [*self._preroll, frame]
+                    self._preroll.clear()
+                else:
+                    self._preroll.append(frame)
+            else:
+                self._frames.append(frame)
+                self._quiet = 0 if loud else self._quiet + 1
+                if self._quiet >= self.silence_frames or len(self._frames) >= self.max_frames:
+                    closed.append(self._close())
+            self._frame_index += 1
+        self._buffer = data[offset:]
+        return closed
+
+    def flush(self) -> Utterance | None:
+        """Close whatever speech is buffered, e.g. when the client stops."""
+        if not self._frames:
+            return None
+        utterance = self._close()
+        return utterance if utterance.pcm else None
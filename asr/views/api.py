@@ -1,22 +1,32 @@
+import base64
 import tempfile
 import uuid
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from pydub import AudioSegment
-from django.db.models import Sum
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 
 from asr import schemas
-from asr.models import UsageLedger, ASRJob, Application
+from asr.models import Application, ASRJob, TranscriptSearch, UsageRollup
+from asr.utils.capacity import check_admission, record_enqueued
+from asr.utils.dispatch import check_pending_capacity, dispatch_job, tenant_for
 from asr.utils.ownership import get_job_for_request
-from asr.utils.plan import resolve_user_plan, resolve_plan_from_code
+from asr.utils.ratelimit import claim_job_slot
+from asr.utils.reports import dashboard_overview, history_total, usage_by_application, usage_summary, usage_timeseries
+from asr.utils.search import SearchUnavailable, search_available, search_transcripts, transcript_snippets
+from asr.utils.usage import reserve_usage, rollup_bucket
+from asr.utils.plan import get_plan, resolve_user_plan, resolve_plan_from_code
 from asr.utils.errors import error_response
+from asr.utils.jobs import job_status_payload
 from asr.utils.auth import enforce_bearer_token_only, get_request_sid, HumanJWTAuthentication, HumanTokenRequired
-from asr.tasks import run_asr_job
 
 def _get_plan(request):
     auth = getattr(request, "auth", None)
@@ -32,36 +42,50 @@ def _get_plan(request):
     return resolve_plan_from_code("anon")
 
 
-def _get_history_queryset(request, plan):
+def _history_owner(request) -> tuple:
+    """(subject, filter kwargs) for the caller's own jobs, or (None, None) without a user or session."""
     if request.user and request.user.is_authenticated:
-        qs = ASRJob.objects.filter(user=request.user, application__isnull=True)
-    else:
-        sid = get_request_sid(request)
-        if not sid:
-            return ASRJob.objects.none()
-        qs = ASRJob.objects.filter(session_key=sid, application__isnull=True)
+        return f"user:{request.user.pk}", {"user": request.user}
+    sid = get_request_sid(request)
+    if not sid:
+        return None, None
+    return f"sid:{sid}", {"session_key": sid}
+
+
+def _retention_cutoff(plan):
     if plan and plan.history_retention_days:
-        cutoff = timezone.now() - timedelta(days=plan.history_retention_days)
+        return timezone.now() - timedelta(days=plan.history_retention_days)
+    return None
+
+
+def _get_history_queryset(request, plan):
+    """(subject, queryset) of the caller's own jobs within the plan's retention window."""
+    subject, owner = _history_owner(request)
+    if subject is None:
+        return None, ASRJob.objects.none()
+    qs = ASRJob.objects.filter(application__isnull=True, **owner)
+    cutoff = _retention_cutoff(plan)
+    if cutoff:
         qs = qs.filter(created_at__gte=cutoff)
-    return qs
+    return subject, qs
 
 
-def _get_month_start():
-    now = timezone.now()
-    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+HISTORY_FIELDS = ("id", "status", "created_at", "audio_duration_sec", "words_count", "chars_count")
 
 
-def _monthly_usage_seconds(request):
-    if request.user and request.user.is_authenticated:
-        qs = UsageLedger.objects.filter(user=request.user, application__isnull=True)
-    else:
-        sid = get_request_sid(request)
-        if not sid:
-            return 0.0
-        qs = UsageLedger.objects.filter(session_key=sid, application__isnull=True)
-    qs = qs.filter(created_at__gte=_get_month_start())
-    agg = qs.aggregate(total_sec=Sum("audio_duration_sec"))
-    return float(agg["total_sec"] or 0)
+def _encode_cursor(row: dict) -> str:
+    raw = f"{row['created_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, job_id = raw.split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(job_id)
+    except ValueError:
+        raise ValidationError({"cursor": ["Invalid cursor."]})
+
 
 def _extract_duration(audio_bytes: bytes) -> float:
     with tempfile.NamedTemporaryFile(suffix=".tmp") as tmp:
@@ -93,22 +117,12 @@ class DashboardOverviewView(APIView):
         responses=schemas.DashboardOverviewSerializer,
     )
     def get(self, request):
-        usage = UsageLedger.objects.filter(user=request.user, application__isnull=True).aggregate(
-            total_cost=Sum("cost_units"),
-            total_sec=Sum("audio_duration_sec"),
-            total_words=Sum("words_count"),
-        )
-        jobs_count = ASRJob.objects.filter(user=request.user, application__isnull=True).count()
-        return Response({
-            "total_cost_units": float(usage["total_cost"] or 0),
-            "total_audio_sec": float(usage["total_sec"] or 0),
-            "total_words": int(usage["total_words"] or 0),
-            "jobs_count": jobs_count,
-        })
+        return Response(dashboard_overview(request.user))
 
 class UploadView(APIView):
     authentication_classes = [HumanJWTAuthentication]
     permission_classes = [HumanTokenRequired]
+    reserves_job_slot = True
 
     @extend_schema(
         tags=["User ASR"],
@@ -119,6 +133,7 @@ class UploadView(APIView):
             200: schemas.UploadResponseSerializer,
             400: schemas.ErrorResponseSerializer,
             403: schemas.ErrorResponseSerializer,
+            429: schemas.ErrorResponseSerializer,
         },
     )
     def post(self, request):
@@ -134,14 +149,6 @@ class UploadView(APIView):
         duration_sec = None
         try:
             duration_sec = _extract_duration(audio_bytes)
-            if plan and plan.monthly_seconds_limit:
-                used = _monthly_usage_seconds(request)
-                if duration_sec and used + duration_sec > float(plan.monthly_seconds_limit):
-                    return error_response(
-                        "MONTHLY_LIMIT_EXCEEDED",
-                        "Monthly seconds limit reached for your plan.",
-                        status_code=403,
-                    )
         except Exception:
             duration_sec = None
         if plan and plan.max_file_size_mb:
@@ -153,6 +160,8 @@ class UploadView(APIView):
                     status_code=403,
                 )
 
+        check_admission(plan)
+
         if request.user and request.user.is_authenticated:
             user = request.user
             session_key = None
@@ -165,21 +174,22 @@ class UploadView(APIView):
                     "Anonymous token missing session.",
                     status_code=403,
                 )
+        check_pending_capacity(tenant_for(user_id=user and user.id, session_key=session_key), plan.code)
 
-        job = ASRJob.objects.create(
-            user=user, session_key=session_key, status="queued",
-            audio_mime=audio.content_type, audio_duration_sec=duration_sec
-        )
+        with transaction.atomic():
+            job = ASRJob.objects.create(
+                user=user, session_key=session_key, status="queued",
+                audio_mime=audio.content_type, audio_duration_sec=duration_sec
+            )
+            if plan and plan.monthly_seconds_limit and duration_sec:
+                reserve_usage(job, duration_sec, plan.monthly_seconds_limit)
 
-        async_result = run_asr_job.delay(
-            job.id,
-            audio_bytes,
-            audio.content_type,
-            request.data.get("language", "fa"),
-            plan.code,
-        )
-        job.celery_task_id = async_result.id
-        job.save(update_fields=["celery_task_id"])
+        claim_job_slot(request, job.id)
+        record_enqueued(job.id, duration_sec)
+        async_result = dispatch_job(job, audio_bytes, audio.content_type, request.data.get("language", "fa"), plan.code)
+        if async_result is not None:
+            job.celery_task_id = async_result.id
+            job.save(update_fields=["celery_task_id"])
 
         return Response({"job_id": str(job.id), "status": job.status})
 
@@ -200,23 +210,7 @@ class StatusView(APIView):
     )
     def get(self, request, job_id: uuid.UUID):
         job = get_job_for_request(request, job_id)
-        payload = {
-            "id": str(job.id),
-            "status": job.status,
-            "processing_seconds": job.processing_time_sec,
-            "audio": {
-                "duration_sec": job.audio_duration_sec,
-                "sample_rate": job.audio_sample_rate,
-                "channels": job.audio_channels,
-                "mime": job.audio_mime,
-            }
-        }
-        if job.status == "error":
-            payload["error"] = {
-                "code": job.error_code or "PROCESSING_FAILED",
-                "message": job.error_message_public or "Processing failed.",
-            }
-        return Response(payload)
+        return Response(job_status_payload(job))
 
 class ResultView(APIView):
     authentication_classes = [HumanJWTAuthentication]
@@ -280,29 +274,16 @@ class UsageView(APIView):
 
     def _handle(self, request):
         if request.user and request.user.is_authenticated:
-            qs = UsageLedger.objects.filter(user=request.user, application__isnull=True)
-        else:
-            sid = get_request_sid(request)
-            if not sid:
-                return Response({
-                    "total_cost_units": 0.0,
-                    "total_audio_sec": 0.0,
-                    "total_words": 0,
-                    "count": 0,
-                })
-            qs = UsageLedger.objects.filter(session_key=sid, application__isnull=True)
-
-        agg = qs.aggregate(
-            total_cost=Sum("cost_units"),
-            total_sec=Sum("audio_duration_sec"),
-            total_words=Sum("words_count"),
-        )
-        return Response({
-            "total_cost_units": float(agg["total_cost"] or 0),
-            "total_audio_sec": float(agg["total_sec"] or 0),
-            "total_words": int(agg["total_words"] or 0),
-            "count": qs.count(),
-        })
+            return Response(usage_summary(user=request.user))
+        sid = get_request_sid(request)
+        if not sid:
+            return Response({
+                "total_cost_units": 0.0,
+                "total_audio_sec": 0.0,
+                "total_words": 0,
+                "count": 0,
+            })
+        return Response(usage_summary(session_key=sid))
 
 
 class UsageByAppView(APIView):
@@ -315,22 +296,107 @@ class UsageByAppView(APIView):
         responses=schemas.ApplicationUsageSerializer(many=True),
     )
     def get(self, request):
-        apps = Application.objects.filter(owner=request.user).order_by("name")
-        results = []
-        for app in apps:
-            agg = UsageLedger.objects.filter(application=app).aggregate(
-                total_cost=Sum("cost_units"),
-                total_sec=Sum("audio_duration_sec"),
-                total_words=Sum("words_count"),
-            )
-            results.append({
-                "app_id": str(app.id),
-                "app_name": app.name,
-                "total_cost_units": float(agg["total_cost"] or 0),
-                "total_audio_sec": float(agg["total_sec"] or 0),
-                "total_words": int(agg["total_words"] or 0),
-            })
-        return Response(results)
+        return Response(usage_by_application(request.user))
+
+
+class UsageTimeseriesView(APIView):
+    authentication_classes = [HumanJWTAuthentication]
+    permission_classes = [HumanTokenRequired, IsAuthenticated]
+
+    @extend_schema(
+        tags=["User ASR"],
+        summary="Usage over time",
+        description="Hourly or daily usage of your own jobs or one of your applications, read from pre-aggregated rollups.",
+        parameters=[schemas.UsageTimeseriesQuerySerializer],
+        responses=schemas.UsageTimeseriesSerializer,
+    )
+    def get(self, request):
+        query = schemas.UsageTimeseriesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        granularity = params["granularity"]
+        if granularity == UsageRollup.DAY:
+            step, max_buckets, default_buckets = timedelta(days=1), settings.ASR_TIMESERIES_MAX_DAYS, 30
+        else:
+            step, max_buckets, default_buckets = timedelta(hours=1), settings.ASR_TIMESERIES_MAX_HOURS, 24
+
+        # widen to whole buckets: start rounds down, end rounds up
+        end = params.get("end") or timezone.now()
+        end_bucket = rollup_bucket(end, granularity)
+        end = end_bucket if end_bucket == end else end_bucket + step
+        start = rollup_bucket(params["start"], granularity) if "start" in params else end - default_buckets * step
+        if start >= end:
+            raise ValidationError({"start": ["Must be before end."]})
+        if end - start > max_buckets * step:
+            raise ValidationError({"start": [f"Range is limited to {max_buckets} {granularity}s."]})
+
+        if "app_id" in params:
+            if not Application.objects.filter(id=params["app_id"], owner=request.user).exists():
+                raise PermissionDenied("Application not found.")
+            subject = f"app:{params['app_id']}"
+        else:
+            subject = f"user:{request.user.pk}"
+        plan_id = None
+        if "plan" in params:
+            plan = get_plan(params["plan"])
+            if plan is None:
+                raise ValidationError({"plan": ["Unknown plan."]})
+            plan_id = plan.pk
+
+        return Response({
+            "granularity": granularity,
+            "start": start,
+            "end": end,
+            "results": usage_timeseries(subject, granularity, start, end, plan_id),
+        })
+
+
+class TranscriptSearchView(APIView):
+    authentication_classes = [HumanJWTAuthentication]
+    permission_classes = [HumanTokenRequired]
+
+    @extend_schema(
+        tags=["User ASR"],
+        summary="Search transcripts",
+        description=(
+            "Full-text search over the caller's own finished jobs, newest first. Persian spelling "
+            "variants (yeh/kaf forms, ZWNJ, Persian and Arabic digits) match each other."
+        ),
+        parameters=[schemas.TranscriptSearchQuerySerializer],
+        responses=schemas.TranscriptSearchResultsSerializer,
+    )
+    def get(self, request):
+        query = schemas.TranscriptSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        if not search_available():
+            raise SearchUnavailable()
+        subject, owner = _history_owner(request)
+        if subject is None:
+            return Response({"next_cursor": None, "results": []})
+
+        qs = TranscriptSearch.objects.filter(**owner)
+        cutoff = _retention_cutoff(_get_plan(request))
+        if cutoff:
+            qs = qs.filter(created_at__gte=cutoff)
+        if "cursor" in params:
+            created_at, job_id = _decode_cursor(params["cursor"])
+            qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, job_id__lt=job_id))
+        page_size = params["page_size"]
+        rows = list(
+            search_transcripts(qs, params["q"]).order_by("-created_at", "-job_id")
+            .values("job_id", "created_at")[:page_size + 1]
+        )
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        snippets = transcript_snippets([row["job_id"] for row in rows], params["q"])
+        return Response({
+            "next_cursor": _encode_cursor({"id": rows[-1]["job_id"], "created_at": rows[-1]["created_at"]}) if has_more else None,
+            "results": [
+                {"id": str(row["job_id"]), "created_at": row["created_at"].isoformat(), "snippet": snippets.get(row["job_id"], "")}
+                for row in rows
+            ],
+        })
 
 
 class HistoryView(APIView):
@@ -340,34 +406,45 @@ class HistoryView(APIView):
     @extend_schema(
         tags=["User ASR"],
         summary="List transcription jobs",
+        description=(
+            "Newest first. Follow `next_cursor` to page at constant cost; `page` still works for "
+            "shallow pages. `total` is cached briefly and may lag new uploads."
+        ),
         parameters=[
-            OpenApiParameter("page", type=int, location=OpenApiParameter.QUERY, required=False, description="Page number (default 1)"),
+            OpenApiParameter("cursor", type=str, location=OpenApiParameter.QUERY, required=False, description="`next_cursor` of the previous page"),
+            OpenApiParameter("page", type=int, location=OpenApiParameter.QUERY, required=False, description="Page number (default 1); ignored with cursor"),
             OpenApiParameter("page_size", type=int, location=OpenApiParameter.QUERY, required=False, description="Items per page (default 10, max 50)"),
         ],
         responses=schemas.PaginatedHistorySerializer,
     )
     def get(self, request):
         plan = _get_plan(request)
-        page = max(int(request.query_params.get("page", 1)), 1)
         page_size = min(max(int(request.query_params.get("page_size", 10)), 1), 50)
-        qs = _get_history_queryset(request, plan).order_by("-created_at")
-        total = qs.count()
-        offset = (page - 1) * page_size
-        items = []
-        for job in qs[offset: offset + page_size]:
-            items.append({
-                "id": str(job.id),
-                "status": job.status,
-                "created_at": job.created_at.isoformat(),
-                "audio_duration_sec": job.audio_duration_sec,
-                "words_count": job.words_count,
-                "chars_count": job.chars_count,
-            })
+        subject, qs = _get_history_queryset(request, plan)
+        cursor = request.query_params.get("cursor")
+        # the (created_at, id) order matches the history indexes, so a cursor page is one index range scan
+        page_qs = qs.order_by("-created_at", "-id").values(*HISTORY_FIELDS)
+        if cursor:
+            created_at, job_id = _decode_cursor(cursor)
+            page = None
+            rows = list(page_qs.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=job_id)
+            )[:page_size + 1])
+        else:
+            page = max(int(request.query_params.get("page", 1)), 1)
+            offset = (page - 1) * page_size
+            rows = list(page_qs[offset: offset + page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
         return Response({
             "page": page,
             "page_size": page_size,
-            "total": total,
-            "results": items,
+            "total": history_total(subject, qs) if subject else 0,
+            "next_cursor": _encode_cursor(rows[-1]) if has_more else None,
+            "results": [
+                {**row, "id": str(row["id"]), "created_at": row["created_at"].isoformat()}
+                for row in rows
+            ],
         })
 
     @extend_schema(
@@ -1,25 +1,23 @@
 import tempfile
 import uuid
 
+from django.db import transaction
 from drf_spectacular.utils import OpenApiParameter, extend_schema
-from django.db.models import Sum
-from django.utils import timezone
 from pydub import AudioSegment
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from asr import schemas
-from asr.models import ASRJob, UsageLedger
-from asr.tasks import run_asr_job
+from asr.models import ASRJob
 from asr.utils.auth import ApiTokenAuthentication, ApiTokenRequired, enforce_bearer_token_only
+from asr.utils.capacity import check_admission, record_enqueued
+from asr.utils.dispatch import check_pending_capacity, dispatch_job, tenant_for
 from asr.utils.errors import error_response
+from asr.utils.jobs import job_status_payload
 from asr.utils.ownership import get_app_job_for_request
 from asr.utils.plan import resolve_user_plan
-
-
-def _get_month_start():
-    now = timezone.now()
-    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+from asr.utils.ratelimit import claim_job_slot
+from asr.utils.usage import reserve_usage
 
 
 def _extract_duration(audio_bytes: bytes) -> float:
@@ -30,12 +28,6 @@ def _extract_duration(audio_bytes: bytes) -> float:
         return len(audio) / 1000.0
 
 
-def _monthly_usage_seconds(application):
-    qs = UsageLedger.objects.filter(application=application, created_at__gte=_get_month_start())
-    agg = qs.aggregate(total_sec=Sum("audio_duration_sec"))
-    return float(agg["total_sec"] or 0)
-
-
 class AppHealthView(APIView):
     authentication_classes = [ApiTokenAuthentication]
     permission_classes = [ApiTokenRequired]
@@ -52,6 +44,7 @@ class AppHealthView(APIView):
 class AppUploadView(APIView):
     authentication_classes = [ApiTokenAuthentication]
     permission_classes = [ApiTokenRequired]
+    reserves_job_slot = True
 
     @extend_schema(
         tags=["Application API"],
@@ -61,6 +54,7 @@ class AppUploadView(APIView):
             200: schemas.UploadResponseSerializer,
             400: schemas.ErrorResponseSerializer,
             403: schemas.ErrorResponseSerializer,
+            429: schemas.ErrorResponseSerializer,
         },
     )
     def post(self, request):
@@ -78,14 +72,6 @@ class AppUploadView(APIView):
         duration_sec = None
         try:
             duration_sec = _extract_duration(audio_bytes)
-            if plan and plan.monthly_seconds_limit:
-                used = _monthly_usage_seconds(application)
-                if duration_sec and used + duration_sec > float(plan.monthly_seconds_limit):
-                    return error_response(
-                        "MONTHLY_LIMIT_EXCEEDED",
-                        "Monthly seconds limit reached for your plan.",
-                        status_code=403,
-                    )
         except Exception:
             duration_sec = None
         if plan and plan.max_file_size_mb:
@@ -97,23 +83,26 @@ class AppUploadView(APIView):
                     status_code=403,
                 )
 
-        job = ASRJob.objects.create(
-            user=owner,
-            application=application,
-            status="queued",
-            audio_mime=audio.content_type,
-            audio_duration_sec=duration_sec,
-        )
-
-        async_result = run_asr_job.delay(
-            job.id,
-            audio_bytes,
-            audio.content_type,
-            request.data.get("language", "fa"),
-            plan.code,
-        )
-        job.celery_task_id = async_result.id
-        job.save(update_fields=["celery_task_id"])
+        check_admission(plan)
+        check_pending_capacity(tenant_for(application_id=application.id), plan.code)
+
+        with transaction.atomic():
+            job = ASRJob.objects.create(
+                user=owner,
+                application=application,
+                status="queued",
+                audio_mime=audio.content_type,
+                audio_duration_sec=duration_sec,
+            )
+            if plan and plan.monthly_seconds_limit and duration_sec:
+                reserve_usage(job, duration_sec, plan.monthly_seconds_limit)
+
+        claim_job_slot(request, job.id)
+        record_enqueued(job.id, duration_sec)
+        async_result = dispatch_job(job, audio_bytes, audio.content_type, request.data.get("language", "fa"), plan.code)
+        if async_result is not None:
+            job.celery_task_id = async_result.id
+            job.save(update_fields=["celery_task_id"])
 
         return Response({"job_id": str(job.id), "status": job.status})
 
@@ -135,23 +124,7 @@ class AppStatusView(APIView):
     )
     def get(self, request, job_id: uuid.UUID):
         job = get_app_job_for_request(request, job_id)
-        payload = {
-            "id": str(job.id),
-            "status": job.status,
-            "processing_seconds": job.processing_time_sec,
-            "audio": {
-                "duration_sec": job.audio_duration_sec,
-                "sample_rate": job.audio_sample_rate,
-                "channels": job.audio_channels,
-                "mime": job.audio_mime,
-            },
-        }
-        if job.status == "error":
-            payload["error"] = {
-                "code": job.error_code or "PROCESSING_FAILED",
-                "message": job.error_message_public or "Processing failed.",
-            }
-        return Response(payload)
+        return Response(job_status_payload(job))
 
 
 class AppResultView(APIView):
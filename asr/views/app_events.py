@@ -0,0 +1,214 @@
+import json
+import time
+import uuid
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema
+from rest_framework.exceptions import APIException, AuthenticationFailed, Throttled
+from rest_framework.request import Request
+from rest_framework.views import APIView
+
+from asr import schemas
+from asr.utils.auth import ApiTokenAuthentication, ApiTokenRequired, enforce_bearer_token_only
+from asr.utils.errors import exception_handler
+from asr.utils.events import current_seq, read_job_events, wait_job_events
+from asr.utils.jobs import job_status_payload
+from asr.utils.ownership import get_app_job_for_request
+from asr.utils.ratelimit import PlanRateThrottle
+from asr.views.app_api import AppStatusView
+
+TERMINAL_STATUSES = ("done", "error")
+
+_app_status_view = AppStatusView.as_view()
+
+JOB_ID_PARAMETER = OpenApiParameter("job_id", type=str, location=OpenApiParameter.PATH, description="ASR job id")
+
+
+class AppJobStatusView(AppStatusView):
+    """Schema of app_job_status: AppStatusView plus the long-poll parameters."""
+
+    @extend_schema(
+        tags=["Application API"],
+        summary="Get application job status",
+        description=(
+            "With `wait` this long-polls: it returns as soon as the job changes state, or with the "
+            "unchanged status once the wait expires, and adds `seq` to the response."
+        ),
+        parameters=[
+            JOB_ID_PARAMETER,
+            OpenApiParameter("wait", type=float, description="Seconds to wait for a change (capped by the server)."),
+            OpenApiParameter("last_seq", type=int, description="`seq` of the previous poll."),
+        ],
+        responses={
+            200: schemas.JobStatusPollSerializer,
+            404: schemas.ErrorResponseSerializer,
+            429: schemas.ErrorResponseSerializer,
+        },
+    )
+    def get(self, request, job_id: uuid.UUID):
+        return super().get(request, job_id)
+
+
+class AppJobEventsView(APIView):
+    """Schema of app_job_events, which is served by the async function itself."""
+
+    authentication_classes = [ApiTokenAuthentication]
+    permission_classes = [ApiTokenRequired]
+
+    @extend_schema(
+        tags=["Application API"],
+        summary="Stream application job events",
+        description=(
+            "Server-Sent Events: a `status` event with the current state, then every `job` event "
+            "until the job finishes. Reconnects resume from the `Last-Event-ID` header or `last_seq`."
+        ),
+        parameters=[
+            JOB_ID_PARAMETER,
+            OpenApiParameter("last_seq", type=int, description="Resume after this event."),
+        ],
+        responses={
+            (200, "text/event-stream"): OpenApiResponse(OpenApiTypes.STR),
+            404: schemas.ErrorResponseSerializer,
+            429: schemas.ErrorResponseSerializer,
+        },
+    )
+    def get(self, request, job_id: uuid.UUID):
+        raise NotImplementedError
+
+
+def _documented_by(view_class):
+    """
+    Let the schema generator document an async function view through the
+    APIView that describes it, the way APIView.as_view() tags its own views.
+    """
+    def decorate(func):
+        func.cls = view_class
+        func.initkwargs = {}
+        return func
+    return decorate
+
+
+def _error(exc: APIException) -> JsonResponse:
+    response = exception_handler(exc, {})
+    error = JsonResponse(response.data, status=response.status_code)
+    if "Retry-After" in response:
+        error["Retry-After"] = response["Retry-After"]
+    return error
+
+
+@sync_to_async
+def _authorized_job(request, job_id: uuid.UUID):
+    """Authenticate and rate-limit the request as the class-based app views do, then load the job."""
+    if ApiTokenAuthentication().authenticate(request) is None:
+        raise AuthenticationFailed("API token required.")
+    drf_request = Request(request)
+    enforce_bearer_token_only(drf_request)
+    throttle = PlanRateThrottle()
+    if not throttle.allow_request(drf_request, None):
+        raise Throttled(wait=throttle.wait())
+    return get_app_job_for_request(request, job_id)
+
+
+@sync_to_async
+def _status_payload(request, job_id: uuid.UUID) -> dict:
+    return job_status_payload(get_app_job_for_request(request, job_id))
+
+
+@_documented_by(AppJobStatusView)
+async def app_job_status(request, job_id: uuid.UUID):
+    """
+    Application job status. With ?wait=<sec> this long-polls: it blocks on the
+    job's event log (not the DB) and returns as soon as the job changes state,
+    or with the unchanged status once the wait expires. Pass the returned
+    `seq` back as ?last_seq= to avoid missing a change between polls.
+    """
+    if "wait" not in request.GET:
+        return await sync_to_async(_app_status_view)(request, job_id=job_id)
+
+    try:
+        wait_sec = min(max(float(request.GET["wait"]), 0), settings.ASR_LONGPOLL_MAX_WAIT_SEC)
+        last_seq = int(request.GET["last_seq"]) if request.GET.get("last_seq") else None
+    except ValueError:
+        return JsonResponse({"code": "INVALID_REQUEST", "message": "wait and last_seq must be numbers."}, status=400)
+
+    try:
+        job = await _authorized_job(request, job_id)
+        seq = last_seq
+        if seq is None:
+            # read the log position, then the status again, so a change in between wakes the wait
+            try:
+                seq = await current_seq(job_id)
+            except redis.RedisError:
+                seq = None
+            job = await sync_to_async(get_app_job_for_request)(request, job_id)
+        payload = await sync_to_async(job_status_payload)(job)
+        if seq is not None and wait_sec and job.status not in TERMINAL_STATUSES:
+            try:
+                events = await wait_job_events(job_id, seq, wait_sec)
+            except redis.RedisError:
+                events = []
+            if events:
+                seq = events[-1]["seq"]
+                payload = await _status_payload(request, job_id)
+    except APIException as exc:
+        return _error(exc)
+    payload["seq"] = seq
+    return JsonResponse(payload)
+
+
+def _sse(event: str, data: dict, event_id=None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def _event_stream(job_id, payload: dict, last_seq: int):
+    yield _sse("status", payload)
+    if payload["status"] in TERMINAL_STATUSES:
+        return
+    deadline = time.monotonic() + settings.ASR_SSE_MAX_DURATION_SEC
+    try:
+        events = await read_job_events(job_id, last_seq)
+        while True:
+            for data in events:
+                last_seq = data["seq"]
+                yield _sse("job", data, event_id=last_seq)
+                if data.get("status") in TERMINAL_STATUSES:
+                    return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            events = await wait_job_events(job_id, last_seq, min(settings.ASR_SSE_KEEPALIVE_SEC, remaining))
+            if not events:
+                yield ": keepalive\n\n"
+    except redis.RedisError:
+        return
+
+
+@_documented_by(AppJobEventsView)
+async def app_job_events(request, job_id: uuid.UUID):
+    """
+    Server-Sent Events stream of one application job: a `status` event with the
+    current state, then every `job` event until the job finishes. Reconnects
+    resume from the Last-Event-ID header (or ?last_seq=).
+    """
+    try:
+        last_seq = int(request.headers.get("Last-Event-ID") or request.GET.get("last_seq") or 0)
+    except ValueError:
+        last_seq = 0
+    try:
+        job = await _authorized_job(request, job_id)
+        payload = await sync_to_async(job_status_payload)(job)
+    except APIException as exc:
+        return _error(exc)
+
+    response = StreamingHttpResponse(_event_stream(job_id, payload, last_seq), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,148 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiResponse, extend_schema
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from asr import schemas
+from asr.models import Application, ASRJob, UsageLedger
+from asr.utils.auth import ApiTokenAuthentication, ApiTokenRequired, HumanJWTAuthentication, HumanTokenRequired
+from asr.utils.export import JOB_COLUMNS, USAGE_COLUMNS, export_response, job_rows, usage_rows
+from asr.utils.plan import resolve_user_plan
+from asr.views.api import _retention_cutoff
+
+EXPORT_RESPONSE = OpenApiResponse(
+    OpenApiTypes.BINARY,
+    description="NDJSON (one object per line) or CSV with a header row, gzipped with `gzip=true`.",
+)
+
+
+def _date_range(qs, params):
+    if "start" in params:
+        qs = qs.filter(created_at__gte=params["start"])
+    if "end" in params:
+        qs = qs.filter(created_at__lt=params["end"])
+    return qs
+
+
+def _export_jobs(request, qs, params, filename):
+    include_text = params["include_text"]
+    qs = _date_range(qs, params).order_by("created_at", "id")
+    return export_response(
+        request,
+        job_rows(qs, include_text),
+        output=params["output"],
+        columns=JOB_COLUMNS + ("text",) if include_text else JOB_COLUMNS,
+        filename=filename,
+        gzip=params["gzip"],
+    )
+
+
+def _export_usage(request, qs, params, filename):
+    qs = _date_range(qs, params).order_by("created_at", "id")
+    return export_response(
+        request, usage_rows(qs), output=params["output"], columns=USAGE_COLUMNS, filename=filename, gzip=params["gzip"]
+    )
+
+
+def _owned_application(request, params):
+    if "app_id" not in params:
+        return None
+    application = Application.objects.filter(id=params["app_id"], owner=request.user).first()
+    if application is None:
+        raise PermissionDenied("Application not found.")
+    return application
+
+
+class JobExportView(APIView):
+    authentication_classes = [HumanJWTAuthentication]
+    permission_classes = [HumanTokenRequired, IsAuthenticated]
+
+    @extend_schema(
+        tags=["User ASR"],
+        summary="Export jobs",
+        description=(
+            "Streams every job of yours (within your plan's history retention) or of one of your "
+            "applications, oldest first, in one response."
+        ),
+        parameters=[schemas.UserJobExportQuerySerializer],
+        responses=EXPORT_RESPONSE,
+    )
+    def get(self, request):
+        query = schemas.UserJobExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        application = _owned_application(request, params)
+        if application:
+            return _export_jobs(request, ASRJob.objects.filter(application=application), params, f"jobs-{application.pk}")
+        qs = ASRJob.objects.filter(user=request.user, application__isnull=True)
+        cutoff = _retention_cutoff(resolve_user_plan(request.user))
+        if cutoff:
+            qs = qs.filter(created_at__gte=cutoff)
+        return _export_jobs(request, qs, params, "jobs")
+
+
+class UsageExportView(APIView):
+    authentication_classes = [HumanJWTAuthentication]
+    permission_classes = [HumanTokenRequired, IsAuthenticated]
+
+    @extend_schema(
+        tags=["User ASR"],
+        summary="Export usage",
+        description=(
+            "Streams the billing ledger of your own jobs or of one of your applications, oldest "
+            "first. Ledger rows outlive purged jobs, so `job_id` may be null."
+        ),
+        parameters=[schemas.UserExportQuerySerializer],
+        responses=EXPORT_RESPONSE,
+    )
+    def get(self, request):
+        query = schemas.UserExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        application = _owned_application(request, params)
+        if application:
+            qs, filename = UsageLedger.objects.filter(application=application), f"usage-{application.pk}"
+        else:
+            qs, filename = UsageLedger.objects.filter(user=request.user, application__isnull=True), "usage"
+        return _export_usage(request, qs, params, filename)
+
+
+class AppJobExportView(APIView):
+    authentication_classes = [ApiTokenAuthentication]
+    permission_classes = [ApiTokenRequired]
+
+    @extend_schema(
+        tags=["Application API"],
+        summary="Export jobs (application token)",
+        description="Streams every job of the token's application, oldest first, in one response.",
+        parameters=[schemas.JobExportQuerySerializer],
+        responses=EXPORT_RESPONSE,
+    )
+    def get(self, request):
+        query = schemas.JobExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        application = request.application
+        return _export_jobs(
+            request, ASRJob.objects.filter(application=application), query.validated_data, f"jobs-{application.pk}"
+        )
+
+
+class AppUsageExportView(APIView):
+    authentication_classes = [ApiTokenAuthentication]
+    permission_classes = [ApiTokenRequired]
+
+    @extend_schema(
+        tags=["Application API"],
+        summary="Export usage (application token)",
+        description="Streams the billing ledger of the token's application, oldest first. `job_id` may be null for purged jobs.",
+        parameters=[schemas.ExportQuerySerializer],
+        responses=EXPORT_RESPONSE,
+    )
+    def get(self, request):
+        query = schemas.ExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        application = request.application
+        return _export_usage(
+            request, UsageLedger.objects.filter(application=application), query.validated_data, f"usage-{application.pk}"
+        )
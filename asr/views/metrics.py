@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.http import HttpResponse
+from drf_spectacular.utils import extend_schema
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
+
+from asr.utils.backend import backend_name, processing_speed
+from asr.utils.capacity import backlog_seconds, default_queue, throughput
+
+
+class QueueMetricsView(APIView):
+    """Prometheus text exposition of queue backlog, for worker autoscaling."""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+
+    @extend_schema(exclude=True)
+    def get(self, request):
+        if settings.ASR_METRICS_TOKEN:
+            header = request.META.get("HTTP_AUTHORIZATION", "")
+            if header != f"Bearer {settings.ASR_METRICS_TOKEN}":
+                raise AuthenticationFailed("Metrics token required.")
+        queue = default_queue()
+        backlog = backlog_seconds(queue)
+        rate = throughput(queue)
+        lines = [
+            "# TYPE asr_queue_backlog_audio_seconds gauge",
+            f'asr_queue_backlog_audio_seconds{{queue="{queue}"}} {backlog:.3f}',
+            "# TYPE asr_queue_throughput_audio_seconds_per_second gauge",
+            f'asr_queue_throughput_audio_seconds_per_second{{queue="{queue}"}} {rate:.3f}',
+            "# TYPE asr_queue_estimated_wait_seconds gauge",
+            f'asr_queue_estimated_wait_seconds{{queue="{queue}"}} {backlog / max(rate, 1e-6):.3f}',
+            "# TYPE asr_backend_speed_audio_seconds_per_second gauge",
+        ]
+        for url in settings.ASR_FASTAPI_URLS:
+            speed = processing_speed(url)
+            if speed is not None:
+                lines.append(f'asr_backend_speed_audio_seconds_per_second{{backend="{backend_name(url)}"}} {speed:.3f}')
+        return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4")
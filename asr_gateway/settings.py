@@ -43,6 +43,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "asr.middleware.RateLimitHeadersMiddleware",
 ]
 
 ROOT_URLCONF = "asr_gateway.urls"
@@ -104,6 +105,16 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 ASR_FASTAPI_URL = os.getenv("ASR_FASTAPI_URL", "http://127.0.0.1:8025/api/upload/")
 ASR_FASTAPI_TIMEOUT = int(os.getenv("ASR_FASTAPI_TIMEOUT", "300"))
+# comma-separated; the first entry is the primary backend, the rest are hedge targets
+ASR_FASTAPI_URLS = [u.strip() for u in os.getenv("ASR_FASTAPI_URLS", ASR_FASTAPI_URL).split(",") if u.strip()]
+
+ASR_HEDGE_ENABLED = os.getenv("ASR_HEDGE_ENABLED", "0") == "1"
+ASR_HEDGE_FACTOR = float(os.getenv("ASR_HEDGE_FACTOR", "2.0"))
+ASR_HEDGE_BUDGET = float(os.getenv("ASR_HEDGE_BUDGET", "0.05"))
+ASR_HEDGE_BUDGET_WINDOW_SEC = int(os.getenv("ASR_HEDGE_BUDGET_WINDOW_SEC", "600"))
+ASR_HEDGE_MIN_DELAY_SEC = float(os.getenv("ASR_HEDGE_MIN_DELAY_SEC", "5"))
+ASR_HEDGE_MIN_SAMPLES = int(os.getenv("ASR_HEDGE_MIN_SAMPLES", "20"))
+ASR_HEDGE_LATENCY_WINDOW = int(os.getenv("ASR_HEDGE_LATENCY_WINDOW", "500"))
 
 WORD_COST = float(os.getenv("WORD_COST", "0.05"))
 
@@ -140,6 +151,155 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    "reconcile-queue-backlog": {
+        "task": "asr.tasks.reconcile_queue_backlog",
+        "schedule": float(os.getenv("ASR_BACKLOG_RECONCILE_SEC", "300")),
+    },
+    "broadcast-queue-positions": {
+        "task": "asr.tasks.broadcast_queue_positions",
+        "schedule": float(os.getenv("ASR_QUEUE_BROADCAST_SEC", "10")),
+    },
+    "drain-pending-jobs": {
+        "task": "asr.tasks.drain_pending_jobs",
+        "schedule": float(os.getenv("ASR_DISPATCH_DRAIN_SEC", "30")),
+    },
+    "expire-quota-reservations": {
+        "task": "asr.tasks.expire_quota_reservations",
+        "schedule": float(os.getenv("ASR_RESERVATION_EXPIRY_CHECK_SEC", "600")),
+    },
+    "flush-api-token-usage": {
+        "task": "asr.tasks.flush_api_token_usage",
+        "schedule": float(os.getenv("ASR_TOKEN_USAGE_FLUSH_SEC", "60")),
+    },
+    "catch-up-usage-rollups": {
+        "task": "asr.tasks.catch_up_usage_rollups",
+        "schedule": float(os.getenv("ASR_ROLLUP_CATCHUP_SEC", "3600")),
+    },
+    "purge-expired-history": {
+        "task": "asr.tasks.purge_expired_history",
+        "schedule": float(os.getenv("ASR_RETENTION_PURGE_SEC", "3600")),
+    },
+}
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/3")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_REDIS_URL", REDIS_URL),
+    }
+}
+# usage reports are cached briefly and dropped whenever the ledger changes
+ASR_USAGE_REPORT_CACHE_SEC = int(os.getenv("ASR_USAGE_REPORT_CACHE_SEC", "60"))
+# closed rollup buckets re-derived from the ledger on each catch-up run
+ASR_ROLLUP_CATCHUP_HOURS = int(os.getenv("ASR_ROLLUP_CATCHUP_HOURS", "48"))
+# widest range one /api/usage/timeseries/ request may cover, per granularity
+ASR_TIMESERIES_MAX_HOURS = int(os.getenv("ASR_TIMESERIES_MAX_HOURS", "744"))
+ASR_TIMESERIES_MAX_DAYS = int(os.getenv("ASR_TIMESERIES_MAX_DAYS", "366"))
+# jobs past their plan's history_retention_days are deleted in batches of this size,
+# pausing between batches, for at most ASR_RETENTION_PURGE_MAX_SEC per run
+ASR_RETENTION_PURGE_BATCH_SIZE = int(os.getenv("ASR_RETENTION_PURGE_BATCH_SIZE", "500"))
+ASR_RETENTION_PURGE_PAUSE_SEC = float(os.getenv("ASR_RETENTION_PURGE_PAUSE_SEC", "0.2"))
+ASR_RETENTION_PURGE_MAX_SEC = float(os.getenv("ASR_RETENTION_PURGE_MAX_SEC", "600"))
+# if set, purged jobs are first appended to gzipped NDJSON files in this directory
+ASR_RETENTION_ARCHIVE_DIR = os.getenv("ASR_RETENTION_ARCHIVE_DIR", "")
+# rows fetched per round trip by the streaming export endpoints
+ASR_EXPORT_CHUNK_SIZE = int(os.getenv("ASR_EXPORT_CHUNK_SIZE", "2000"))
+
+# admission control: live throughput in seconds of audio per second, per queue
+ASR_THROUGHPUT_BUCKET_SEC = int(os.getenv("ASR_THROUGHPUT_BUCKET_SEC", "10"))
+ASR_THROUGHPUT_WINDOW_SEC = int(os.getenv("ASR_THROUGHPUT_WINDOW_SEC", "300"))
+# used until the first completions are observed
+ASR_ASSUMED_THROUGHPUT = float(os.getenv("ASR_ASSUMED_THROUGHPUT", "2.0"))
+# reject uploads with 429 once the estimated queue wait exceeds these (seconds)
+ASR_ADMISSION_MAX_WAIT_SEC = {
+    "anon": int(os.getenv("ANON_MAX_QUEUE_WAIT_SEC", "60")),
+    "free": int(os.getenv("FREE_MAX_QUEUE_WAIT_SEC", "300")),
+    "plus": int(os.getenv("PLUS_MAX_QUEUE_WAIT_SEC", "900")),
+    "pro": int(os.getenv("PRO_MAX_QUEUE_WAIT_SEC", "1800")),
+}
+ASR_METRICS_TOKEN = os.getenv("ASR_METRICS_TOKEN", "")
+
+# per-process API token cache; revocations are broadcast over REDIS_URL pub/sub
+ASR_API_TOKEN_CACHE_SIZE = int(os.getenv("ASR_API_TOKEN_CACHE_SIZE", "10000"))
+ASR_API_TOKEN_CACHE_TTL_SEC = float(os.getenv("ASR_API_TOKEN_CACHE_TTL_SEC", "60"))
+# per-process cache of users/token_version for JWT auth, evicted the same way
+ASR_AUTH_USER_CACHE_SIZE = int(os.getenv("ASR_AUTH_USER_CACHE_SIZE", "10000"))
+ASR_AUTH_USER_CACHE_TTL_SEC = float(os.getenv("ASR_AUTH_USER_CACHE_TTL_SEC", "30"))
+# Plan rows and each user's effective plan, evicted on Plan/Subscription/UserProfile saves
+ASR_PLAN_CACHE_TTL_SEC = float(os.getenv("ASR_PLAN_CACHE_TTL_SEC", "300"))
+ASR_USER_PLAN_CACHE_SIZE = int(os.getenv("ASR_USER_PLAN_CACHE_SIZE", "10000"))
+
+# token-bucket request rate, burst and concurrent jobs per application/user/session, by plan
+ASR_RATE_LIMITS = {
+    "anon": {
+        "requests_per_min": float(os.getenv("ANON_REQUESTS_PER_MIN", "10")),
+        "burst": int(os.getenv("ANON_REQUEST_BURST", "10")),
+        "concurrent_jobs": int(os.getenv("ANON_CONCURRENT_JOBS", "1")),
+    },
+    "free": {
+        "requests_per_min": float(os.getenv("FREE_REQUESTS_PER_MIN", "60")),
+        "burst": int(os.getenv("FREE_REQUEST_BURST", "30")),
+        "concurrent_jobs": int(os.getenv("FREE_CONCURRENT_JOBS", "2")),
+    },
+    "plus": {
+        "requests_per_min": float(os.getenv("PLUS_REQUESTS_PER_MIN", "300")),
+        "burst": int(os.getenv("PLUS_REQUEST_BURST", "100")),
+        "concurrent_jobs": int(os.getenv("PLUS_CONCURRENT_JOBS", "5")),
+    },
+    "pro": {
+        "requests_per_min": float(os.getenv("PRO_REQUESTS_PER_MIN", "1200")),
+        "burst": int(os.getenv("PRO_REQUEST_BURST", "300")),
+        "concurrent_jobs": int(os.getenv("PRO_CONCURRENT_JOBS", "20")),
+    },
+}
+# an upload's slot is held this long before its job exists, and at most this long by a job
+ASR_JOB_SLOT_RESERVE_SEC = int(os.getenv("ASR_JOB_SLOT_RESERVE_SEC", "120"))
+ASR_JOB_SLOT_TTL_SEC = int(os.getenv("ASR_JOB_SLOT_TTL_SEC", "3600"))
+ASR_CONCURRENCY_RETRY_SEC = int(os.getenv("ASR_CONCURRENCY_RETRY_SEC", "5"))
+# jobs a tenant may have on the workers at once, by plan; the rest wait in its pending list
+ASR_DISPATCH_MAX_IN_FLIGHT = {
+    "anon": int(os.getenv("ANON_MAX_IN_FLIGHT", "1")),
+    "free": int(os.getenv("FREE_MAX_IN_FLIGHT", "1")),
+    "plus": int(os.getenv("PLUS_MAX_IN_FLIGHT", "3")),
+    "pro": int(os.getenv("PRO_MAX_IN_FLIGHT", "10")),
+}
+# a lease outlives a dead worker by at most this long; running jobs renew it when they start
+ASR_DISPATCH_LEASE_SEC = int(os.getenv("ASR_DISPATCH_LEASE_SEC", "900"))
+# a parked job's upload waits in Redis for at most this long, and a tenant may park
+# at most this many jobs (by plan); further uploads get 429 until one starts
+ASR_DISPATCH_PENDING_TTL_SEC = int(os.getenv("ASR_DISPATCH_PENDING_TTL_SEC", "900"))
+ASR_DISPATCH_MAX_PENDING = {
+    "anon": int(os.getenv("ANON_MAX_PENDING", "1")),
+    "free": int(os.getenv("FREE_MAX_PENDING", "2")),
+    "plus": int(os.getenv("PLUS_MAX_PENDING", "6")),
+    "pro": int(os.getenv("PRO_MAX_PENDING", "20")),
+}
+# quota reserved at upload is refunded if the job is not billed within this long;
+# keep it above ASR_DISPATCH_PENDING_TTL_SEC + ASR_DISPATCH_LEASE_SEC
+ASR_USAGE_RESERVATION_TTL_SEC = int(os.getenv("ASR_USAGE_RESERVATION_TTL_SEC", "90000"))
+
+# per-job event log used to replay missed WebSocket events
+ASR_JOB_EVENTS_TTL_SEC = int(os.getenv("ASR_JOB_EVENTS_TTL_SEC", "3600"))
+ASR_JOB_EVENTS_MAXLEN = int(os.getenv("ASR_JOB_EVENTS_MAXLEN", "100"))
+# workers batch job events emitted within this window into one Redis pipeline
+ASR_EVENT_PUBLISH_LINGER_MS = float(os.getenv("ASR_EVENT_PUBLISH_LINGER_MS", "5"))
+ASR_EVENT_PUBLISH_MAX_BATCH = int(os.getenv("ASR_EVENT_PUBLISH_MAX_BATCH", "200"))
+# longer transcripts are pushed as a preview plus result_url instead of inline
+ASR_WS_INLINE_TEXT_MAX_CHARS = int(os.getenv("ASR_WS_INLINE_TEXT_MAX_CHARS", "4000"))
+ASR_WS_TEXT_PREVIEW_CHARS = int(os.getenv("ASR_WS_TEXT_PREVIEW_CHARS", "500"))
+# live transcription over /ws/transcribe/
+ASR_STREAM_DEFAULT_SAMPLE_RATE = int(os.getenv("ASR_STREAM_DEFAULT_SAMPLE_RATE", "16000"))
+ASR_STREAM_VAD_THRESHOLD = float(os.getenv("ASR_STREAM_VAD_THRESHOLD", "500"))
+ASR_STREAM_SILENCE_MS = int(os.getenv("ASR_STREAM_SILENCE_MS", "600"))
+ASR_STREAM_MAX_UTTERANCE_SEC = float(os.getenv("ASR_STREAM_MAX_UTTERANCE_SEC", "15"))
+ASR_STREAM_MAX_SESSION_SEC = float(os.getenv("ASR_STREAM_MAX_SESSION_SEC", "3600"))
+# quota a session reserves at a time; billing draws it down and the rest is released when it ends
+ASR_STREAM_QUOTA_CHUNK_SEC = float(os.getenv("ASR_STREAM_QUOTA_CHUNK_SEC", "60"))
+ASR_LONGPOLL_MAX_WAIT_SEC = float(os.getenv("ASR_LONGPOLL_MAX_WAIT_SEC", "30"))
+ASR_SSE_KEEPALIVE_SEC = float(os.getenv("ASR_SSE_KEEPALIVE_SEC", "15"))
+ASR_SSE_MAX_DURATION_SEC = float(os.getenv("ASR_SSE_MAX_DURATION_SEC", "900"))
 
 CHANNEL_LAYERS = {
     "default": {
@@ -157,13 +317,8 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.AllowAny",
     ],
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "asr.utils.ratelimit.PlanRateThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {
-        "anon": os.getenv("THROTTLE_ANON", "10/hour"),
-        "user": os.getenv("THROTTLE_USER", "5000/day"),
-    },
     "EXCEPTION_HANDLER": "asr.utils.errors.exception_handler",
 }
 